@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+长期记忆检索基准
+
+在临时数据库中写入 N 轮合成对话（词频按 Zipf 分布，混合中英文），测量（超出预算时退出码为 1）：
+  - 每轮写入记忆的耗时（对话结束时同步执行）
+  - 每轮检索 + 排版注入文本的耗时（p50 / p95 / max，计入每轮对话的延迟）
+  - 注入文本的 token 数不超过 max_tokens
+
+使用方法:
+    python benchmarks/memory_bench.py
+    python benchmarks/memory_bench.py --turns 50000 --record benchmarks/memory.jsonl
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+WORDS = (
+    "数据库 索引 查询 优化 部署 缓存 配置 日志 线程 进程 内存 网络 接口 测试 文件 目录 权限 "
+    "容器 镜像 版本 依赖 编译 错误 异常 超时 重试 并发 事务 备份 迁移 监控 告警 证书 域名 "
+    "python rust docker kubernetes postgres redis nginx kafka grpc http json yaml sqlite "
+    "pandas numpy react vue webpack git github ci pipeline terraform ansible prometheus"
+).split()
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choices(WORDS, weights=[1 / (i + 1) for i in range(len(WORDS))], k=length))
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kortix 长期记忆检索基准")
+    parser.add_argument("--turns", type=int, default=20000, help="写入的历史对话轮数")
+    parser.add_argument("--queries", type=int, default=200, help="检索次数")
+    parser.add_argument("--max-tokens", type=int, default=400, help="注入文本的 token 上限")
+    parser.add_argument("--budget-search-ms", type=float, default=20, help="检索 p95 耗时预算（毫秒）")
+    parser.add_argument("--budget-write-ms", type=float, default=5, help="单轮写入耗时预算（毫秒）")
+    parser.add_argument("--record", help="把结果追加到 JSONL 文件，用于跟踪趋势")
+    args = parser.parse_args()
+    
+    from core.llm import Message
+    from core.memory import MemoryIndex, format_memories
+    from core.utils.tokens import estimate_tokens
+    
+    rng = random.Random(42)
+    workdir = Path(tempfile.mkdtemp(prefix="kortix-memory-bench-"))
+    memory = MemoryIndex(str(workdir / "sessions.db"))
+    
+    started = time.perf_counter()
+    for turn in range(args.turns):
+        messages = [
+            Message("user", sentence(rng, rng.randint(5, 20))),
+            Message("assistant", sentence(rng, rng.randint(30, 120))),
+        ]
+        memory.add_turn(f"session-{turn // 10}", messages)
+    write_ms = (time.perf_counter() - started) / args.turns * 1000
+    
+    latencies, max_injected = [], 0
+    for _ in range(args.queries):
+        query = sentence(rng, rng.randint(2, 12))
+        started = time.perf_counter()
+        text = format_memories(memory.search(query, exclude_session="current"), args.max_tokens)
+        latencies.append((time.perf_counter() - started) * 1000)
+        max_injected = max(max_injected, estimate_tokens(text))
+    memory.close()
+    
+    search = {
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "max": max(latencies),
+    }
+    print(f"{args.turns} 轮历史对话，{args.queries} 次检索:")
+    print(f"  写入   {write_ms:>8.2f} ms / 轮")
+    print(f"  检索   p50 {search['p50']:.2f} ms · p95 {search['p95']:.2f} ms · max {search['max']:.2f} ms")
+    print(f"  注入   最多 {max_injected} tokens")
+    print()
+    
+    results = [
+        ("检索耗时 p95", search["p95"], args.budget_search_ms, "ms"),
+        ("单轮写入耗时", write_ms, args.budget_write_ms, "ms"),
+        ("注入 token 数", max_injected, args.max_tokens, "tokens"),
+    ]
+    over_budget = False
+    for label, value, budget, unit in results:
+        ok = value <= budget
+        over_budget |= not ok
+        print(f"{'✅' if ok else '❌'} {label:<12} {value:>8.2f} {unit}  (预算 {budget:.0f} {unit})")
+    
+    if args.record:
+        record = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "turns": args.turns,
+            "write_ms": round(write_ms, 3),
+            "search_ms": {key: round(value, 2) for key, value in search.items()},
+            "max_injected_tokens": max_injected,
+        }
+        with open(args.record, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+会话构建开销基准
+
+对比两种创建 N 个会话的方式（超出预算时退出码为 1）：
+  1. 独立 Agent()：每个会话各自构建 LLM 客户端、工具注册表、系统提示词、工具检索索引
+  2. AgentFactory.create()：共享组件只构建一次，会话只持有消息历史和筛选状态
+
+每种方式测量：单个会话的构建耗时、首轮工具筛选耗时（会触发检索索引构建）、
+会话占用的内存（tracemalloc，统计构建后仍存活的分配）。
+最后用工厂会话调用一次计算器的数学函数作为冒烟检查（失败时退出码同样为 1）。
+
+使用方法:
+    python benchmarks/session_bench.py
+    python benchmarks/session_bench.py --sessions 500 --record benchmarks/sessions.jsonl
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def make_config(workdir: Path) -> Path:
+    """复制 config.yaml：关闭历史保存、日志文件和沙箱预热，避免基准运行产生副作用"""
+    import yaml
+    with open(ROOT / "config.yaml", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    config.setdefault("history", {})["save_to_file"] = False
+    config.setdefault("logging", {})["save_to_file"] = False
+    config.setdefault("tools", {}).setdefault("code_executor", {})["warm"] = False
+    config.setdefault("tools", {}).setdefault("file_manager", {})["workspace_dir"] = str(workdir / "workspace")
+    config.setdefault("cache", {})["dir"] = str(workdir / "cache")
+    path = workdir / "config.yaml"
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+
+def measure(create, sessions: int) -> dict:
+    """创建 sessions 个会话并执行一次工具筛选，返回单会话耗时和内存"""
+    from core.llm import Message
+    
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    agents = [create() for _ in range(sessions)]
+    build_s = time.perf_counter() - started
+    
+    query = [Message("user", "读取 data.csv 并统计每列的平均值")]
+    started = time.perf_counter()
+    for agent in agents:
+        agent._get_tool_functions(query)
+    select_s = time.perf_counter() - started
+    
+    gc.collect()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    for agent in agents:
+        agent.cleanup()
+    return {
+        "build_us": build_s / sessions * 1e6,
+        "first_select_us": select_s / sessions * 1e6,
+        "memory_kb": memory / sessions / 1024,
+    }
+
+
+def smoke_check(create) -> bool:
+    """冒烟检查：按需构建的插件工具能正常调用（数学函数走计算器的函数表）"""
+    agent = create()
+    try:
+        for expression, expected in (("sqrt(16)", "4"), ("sin(pi/2)", "1")):
+            result = agent.tool_registry.execute("calculate", expression=expression)
+            if not result.success or result.output != f"{expression} = {expected}":
+                print(f"❌ 冒烟检查失败: calculate({expression!r}) -> {result.output or result.error}")
+                return False
+        return True
+    finally:
+        agent.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kortix 会话构建开销基准")
+    parser.add_argument("--sessions", type=int, default=100, help="每种方式创建的会话数")
+    parser.add_argument("--budget-build-us", type=float, default=200, help="工厂模式单会话构建耗时预算（微秒）")
+    parser.add_argument("--budget-memory-kb", type=float, default=32, help="工厂模式单会话内存预算（KB）")
+    parser.add_argument("--record", help="把结果追加到 JSONL 文件，用于跟踪趋势")
+    args = parser.parse_args()
+    
+    os.environ.setdefault("DASHSCOPE_API_KEY", "bench-placeholder")
+    workdir = Path(tempfile.mkdtemp(prefix="kortix-session-bench-"))
+    
+    from core.utils import init_config, setup_logging
+    init_config(str(make_config(workdir)))
+    setup_logging(level="WARNING")
+    
+    from core.agent import Agent
+    from core.factory import AgentFactory
+    
+    standalone = measure(Agent, args.sessions)
+    factory = AgentFactory()
+    if factory.tool_catalog is not None:
+        factory.tool_catalog.refresh()  # 共享检索索引只构建一次，不计入单会话成本
+    shared = measure(factory.create, args.sessions)
+    smoke_ok = smoke_check(factory.create)
+    factory.close()
+    
+    print(f"{args.sessions} 个会话，单会话平均:")
+    print(f"  {'':<18}{'构建':>12}{'首轮筛选':>12}{'内存':>12}")
+    for label, result in (("独立 Agent()", standalone), ("AgentFactory", shared)):
+        print(f"  {label:<18}{result['build_us']:>9.0f} µs{result['first_select_us']:>9.0f} µs"
+              f"{result['memory_kb']:>9.1f} KB")
+    print()
+    
+    results = [
+        ("工厂模式构建耗时", shared["build_us"], args.budget_build_us, "µs"),
+        ("工厂模式会话内存", shared["memory_kb"], args.budget_memory_kb, "KB"),
+    ]
+    over_budget = not smoke_ok
+    for label, value, budget, unit in results:
+        ok = value <= budget
+        over_budget |= not ok
+        print(f"{'✅' if ok else '❌'} {label:<12} {value:>8.1f} {unit}  (预算 {budget:.0f} {unit})")
+    
+    if args.record:
+        record = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "sessions": args.sessions,
+            "standalone": {key: round(value, 1) for key, value in standalone.items()},
+            "factory": {key: round(value, 1) for key, value in shared.items()},
+        }
+        with open(args.record, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
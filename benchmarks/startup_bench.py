@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准
+
+测量三项指标并与预算比较（超出预算时退出码为 1，便于在 CI 或脚本中跟踪）：
+  1. import 耗时：python -X importtime run.py --help，列出累计耗时最高的模块
+  2. --help 的墙钟时间
+  3. 从启动到出现输入提示符（You:）的墙钟时间
+
+使用方法:
+    python benchmarks/startup_bench.py
+    python benchmarks/startup_bench.py --runs 10 --record benchmarks/startup.jsonl
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RUN_PY = ROOT / "run.py"
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def bench_env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONUNBUFFERED"] = "1"
+    # 到达提示符之前不会调用 LLM，没有真实 Key 时用占位值即可
+    env.setdefault("DASHSCOPE_API_KEY", "bench-placeholder")
+    return env
+
+
+def make_config(workdir: Path) -> Path:
+    """复制 config.yaml，关闭历史保存和日志文件，避免基准运行写入仓库目录"""
+    import yaml
+    with open(ROOT / "config.yaml", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    config.setdefault("history", {})["save_to_file"] = False
+    config.setdefault("logging", {})["save_to_file"] = False
+    path = workdir / "config.yaml"
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+
+def measure_imports(top: int) -> dict:
+    """解析 -X importtime 输出，返回总耗时和累计耗时最高的模块"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(RUN_PY), "--help"],
+        capture_output=True, text=True, cwd=ROOT, env=bench_env()
+    )
+    modules = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        if not indent.strip(" ") and len(indent) <= 1:
+            total_us += int(cumulative_us)  # 只累加顶层导入，避免重复计算
+        modules.append((name, int(cumulative_us)))
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "top": [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in modules[:top]],
+    }
+
+
+def measure_help(runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, str(RUN_PY), "--help"], capture_output=True, cwd=ROOT, env=bench_env())
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def measure_prompt(runs: int, timeout: float) -> float:
+    """启动交互模式，测量出现 "You" 提示符所需的时间，然后发送 exit"""
+    samples = []
+    workdir = Path(tempfile.mkdtemp(prefix="kortix-bench-"))
+    try:
+        config = make_config(workdir)
+        for _ in range(runs):
+            started = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, str(RUN_PY), "--config", str(config)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                cwd=workdir, env=bench_env()
+            )
+            ready = threading.Event()
+            
+            def read_output():
+                buffer = b""
+                while True:
+                    block = process.stdout.read1(4096) if hasattr(process.stdout, "read1") else process.stdout.read(1)
+                    if not block:
+                        return
+                    buffer += block
+                    if b"You" in buffer:
+                        ready.set()
+            
+            reader = threading.Thread(target=read_output, daemon=True)
+            reader.start()
+            if not ready.wait(timeout):
+                process.kill()
+                raise RuntimeError(f"{timeout} 秒内未出现输入提示符")
+            samples.append((time.perf_counter() - started) * 1000)
+            try:
+                process.stdin.write(b"exit\n")
+                process.stdin.flush()
+                process.wait(10)
+            except Exception:
+                process.kill()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kortix CLI 启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的运行次数（取中位数）")
+    parser.add_argument("--top", type=int, default=15, help="列出累计导入耗时最高的模块数")
+    parser.add_argument("--budget-import-ms", type=float, default=60, help="--help 路径导入耗时预算")
+    parser.add_argument("--budget-help-ms", type=float, default=150, help="--help 墙钟时间预算")
+    parser.add_argument("--budget-prompt-ms", type=float, default=400, help="启动到提示符的墙钟时间预算")
+    parser.add_argument("--timeout", type=float, default=60, help="等待提示符的超时（秒）")
+    parser.add_argument("--record", help="把结果追加到 JSONL 文件，用于跟踪趋势")
+    args = parser.parse_args()
+    
+    imports = measure_imports(args.top)
+    help_ms = measure_help(args.runs)
+    prompt_ms = measure_prompt(args.runs, args.timeout)
+    
+    print("累计导入耗时最高的模块（run.py --help）:")
+    for item in imports["top"]:
+        print(f"  {item['cumulative_ms']:>8.1f} ms  {item['module']}")
+    print()
+    
+    results = [
+        ("导入耗时 (--help)", imports["total_ms"], args.budget_import_ms),
+        ("--help 墙钟时间", help_ms, args.budget_help_ms),
+        ("启动到提示符", prompt_ms, args.budget_prompt_ms),
+    ]
+    over_budget = False
+    for label, value, budget in results:
+        ok = value <= budget
+        over_budget |= not ok
+        print(f"{'✅' if ok else '❌'} {label:<16} {value:>8.1f} ms  (预算 {budget:.0f} ms)")
+    
+    if args.record:
+        record = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "import_ms": imports["total_ms"],
+            "help_ms": round(help_ms, 1),
+            "prompt_ms": round(prompt_ms, 1),
+        }
+        with open(args.record, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,45 @@
-"""Kortix CLI - 核心模块（增强版）"""
-from .agent import Agent
-from .llm import LLM, Message
-from .sandbox import DockerSandbox, SandboxResult
-from .tools import (
-    Tool,
-    ToolResult,
-    ToolRegistry,
-    FileManagerTool,
-    WebSearchTool,
-    ShellTool,
-    CalculatorTool
-)
-from .utils import init_config, get_config, setup_logging, get_logger
+"""Kortix CLI - 核心模块（增强版）
+
+子模块按需导入（PEP 562），`import core.utils` 等不会连带加载 LLM SDK 和 Docker SDK。
+"""
+from importlib import import_module
 
 __version__ = "2.0.0"
-__all__ = [
-    'Agent',
-    'LLM',
-    'Message',
-    'DockerSandbox',
-    'SandboxResult',
-    'Tool',
-    'ToolResult',
-    'ToolRegistry',
-    'FileManagerTool',
-    'WebSearchTool',
-    'ShellTool',
-    'CalculatorTool',
-    'init_config',
-    'get_config',
-    'setup_logging',
-    'get_logger',
-]
+
+# 导出名 -> 所在子模块
+_EXPORTS = {
+    'Agent': '.agent',
+    'AgentFactory': '.factory',
+    'Event': '.events',
+    'LLM': '.llm',
+    'Message': '.llm',
+    'DockerSandbox': '.sandbox',
+    'SandboxResult': '.sandbox',
+    'Tool': '.tools',
+    'ToolResult': '.tools',
+    'ToolRegistry': '.tools',
+    'FileManagerTool': '.tools',
+    'WebSearchTool': '.tools',
+    'ShellTool': '.tools',
+    'CalculatorTool': '.tools',
+    'TableQueryTool': '.tools',
+    'init_config': '.utils',
+    'get_config': '.utils',
+    'setup_logging': '.utils',
+    'get_logger': '.utils',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,18 +1,26 @@
 """AI Agent 核心 - 增强版，支持完整工具系统和 Function Calling"""
 from typing import List, Dict, Any, Optional, Iterator
+from contextlib import closing
 import json
 import re
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
-from core.llm import LLM, Message
-from core.sandbox import DockerSandbox
+from core.artifacts import ArtifactStore, HANDLE_REFERENCE, READ_ARTIFACT_FUNCTION, preview
+from core.catalog import SessionCatalog
+from core.events import Event, TextDelta, ToolStart, ToolEnd, Usage, Error, TurnEnd
+from core.journal import ConversationJournal, artifacts_path
+from core.llm import LLM, Message, load_dashscope
+from core.memory import MemoryIndex, format_memories
 from core.tools import (
     ToolRegistry,
-    FileManagerTool,
-    WebSearchTool,
-    ShellTool,
-    CalculatorTool,
+    ToolSelector,
+    ToolCatalog,
+    ToolContext,
+    LazyTool,
+    discover_tools,
     ToolResult
 )
 from core.utils.logger import get_logger
@@ -20,111 +28,138 @@ from core.utils.config import get_config
 
 logger = get_logger(__name__)
 
-
-class CodeExecutorTool:
-    """代码执行工具包装器"""
-    def __init__(self, sandbox: DockerSandbox):
-        self.sandbox = sandbox
-        self.name = "code_executor"
-        self.description = "执行Python代码"
-    
-    def get_functions(self):
-        return [{
-            "name": "execute_python",
-            "description": "在Docker沙箱中执行Python代码，用于数据计算、文件处理等",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "code": {
-                        "type": "string",
-                        "description": "要执行的Python代码"
-                    }
-                },
-                "required": ["code"]
-            }
-        }]
-    
-    def execute(self, function_name: str, **kwargs):
-        if function_name == "execute_python":
-            code = kwargs.get("code", "")
-            result = self.sandbox.execute_python(code)
-            return ToolResult(
-                success=result.success,
-                output=result.output,
-                error=result.error
-            )
-        return ToolResult(success=False, output="", error="未知函数")
+# chat() 文本输出中工具结果的预览长度（run_turn 的 tool_end 事件携带完整结果，
+# 写入对话历史的超长结果见 tools.artifacts）
+TOOL_RESULT_PREVIEW_CHARS = 500
 
 
 class Agent:
     """AI Agent - 增强版，支持完整工具系统"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        tool_registry: Optional[ToolRegistry] = None,
+        llm: Optional[LLM] = None,
+        system_prompt: Optional[str] = None,
+        tool_catalog: Optional[ToolCatalog] = None
+    ):
+        """
+        多会话场景请通过 AgentFactory 创建，共享组件只构建一次（见 core/factory.py）
+        
+        Args:
+            tool_registry: 共享的工具注册表（如守护进程、服务器中多个会话共用）；
+                不传则自行创建并注册所有工具，cleanup 时一并关闭
+            llm: 共享的 LLM 客户端，不传则新建
+            system_prompt: 预先构建的系统提示词，不传则根据注册表生成
+            tool_catalog: 共享的工具检索索引，不传则工具筛选器自建
+        """
         config = get_config()
         
         # 初始化 LLM
-        self.llm = LLM()
-        
-        # 初始化工具注册表
-        self.tool_registry = ToolRegistry()
+        self.llm = llm if llm is not None else LLM()
         
-        # 注册所有工具
-        self._register_tools(config)
+        # 初始化工具注册表（执行引擎）并注册所有工具
+        self._owns_registry = tool_registry is None
+        self.tool_registry = tool_registry if tool_registry is not None else self.build_tool_registry(config)
         
         # 对话历史
         self.messages: List[Message] = []
         self.max_messages = config.history_max_messages
         
         # 系统提示词
-        self.system_prompt = self._build_system_prompt()
+        self.system_prompt = system_prompt or self.build_system_prompt(self.tool_registry)
         self.messages.append(Message("system", self.system_prompt))
         
+        # 对话日志（attach_journal 设置后每条消息产生时立即追加）
+        self.journal: Optional[ConversationJournal] = None
+        # 会话目录（attach_catalog 设置后每轮结束时更新元数据和全文索引）
+        self.catalog: Optional[SessionCatalog] = None
+        self.session_id: Optional[str] = None
+        # 长期记忆（attach_memory 设置后每轮检索相关的历史片段，结束时写入本轮内容）
+        self.memory: Optional[MemoryIndex] = None
+        
+        # 超长工具结果保存为会话产物，历史中只保留预览和句柄（attach_journal / attach_artifacts 后保存到磁盘）
+        self.artifacts = ArtifactStore()
+        self.spill_chars = config.get('tools.artifacts.spill_chars', 4000)
+        self.preview_lines = (
+            config.get('tools.artifacts.preview_head_lines', 20),
+            config.get('tools.artifacts.preview_tail_lines', 10)
+        )
+        
+        # LLM 用量统计（累计）和最近一轮对话的错误
+        self.usage = {"llm_calls": 0, "input_tokens": 0, "output_tokens": 0}
+        self.last_error: Optional[str] = None
+        
         # 是否启用 Function Calling
         self.enable_function_calling = config.get('llm.enable_function_calling', True)
         
-        logger.info(
+        # 工具筛选：每次只发送与当前对话相关的函数定义
+        self.tool_selector = None
+        self._offered_functions: Optional[List[str]] = None
+        if config.get('tools.selection.enabled', True):
+            self.tool_selector = ToolSelector(
+                self.tool_registry,
+                top_k=config.get('tools.selection.top_k', 6),
+                core_functions=config.get('tools.selection.core_functions', []),
+                usage_boost=config.get('tools.selection.usage_boost', 0.5),
+                recent_turns=config.get('tools.selection.recent_turns', 3),
+                catalog=tool_catalog
+            )
+        
+        logger.debug(
             "Agent 初始化完成",
             tools=self.tool_registry.list_tools(),
             function_calling=self.enable_function_calling
         )
     
-    def _register_tools(self, config):
-        """注册所有工具"""
-        # 文件管理工具
-        if config.get('tools.file_manager.enabled', True):
-            workspace = config.get('tools.file_manager.workspace_dir', './workspace')
-            self.tool_registry.register(FileManagerTool(workspace))
-            logger.info("已注册文件管理工具")
-        
-        # Web 搜索工具
-        if config.get('tools.web_search.enabled', True):
-            api_key = config.get('tools.web_search.api_key')
-            self.tool_registry.register(WebSearchTool(api_key))
-            logger.info("已注册Web搜索工具")
-        
-        # Shell 工具
-        if config.get('tools.shell.enabled', True):
-            workspace = config.get('tools.file_manager.workspace_dir', './workspace')
-            self.tool_registry.register(ShellTool(workspace))
-            logger.info("已注册Shell工具")
-        
-        # 计算器工具
-        if config.get('tools.calculator.enabled', True):
-            self.tool_registry.register(CalculatorTool())
-            logger.info("已注册计算器工具")
-        
-        # 代码执行工具
-        if config.get('tools.code_executor.enabled', True) and config.sandbox_enabled:
-            sandbox = DockerSandbox()
-            code_tool = CodeExecutorTool(sandbox)
-            self.tool_registry.register(code_tool)
-            logger.info("已注册代码执行工具")
+    @staticmethod
+    def build_tool_registry(config) -> ToolRegistry:
+        """
+        创建工具注册表并注册所有发现的工具
+        
+        只登记静态函数定义，工具实例在首次调用时创建；
+        标记为预热的工具（如 Docker 沙箱）在后台线程中初始化，不阻塞启动。
+        """
+        registry = ToolRegistry(
+            default_timeout=config.get('tools.execution.default_timeout', 120),
+            max_in_flight=config.get('tools.execution.max_in_flight', 8),
+            thread_workers=config.get('tools.execution.thread_workers', 8),
+            process_workers=config.get('tools.execution.process_workers', 2)
+        )
+        context = ToolContext(config)
+        for spec in discover_tools(config):
+            tool = LazyTool(spec, context)
+            registry.register(tool)
+            if spec.warm:
+                tool.warm()
+        return registry
     
-    def _build_system_prompt(self) -> str:
-        """构建系统提示词"""
+    def warm_up(self) -> threading.Thread:
+        """
+        后台预热：导入 dashscope SDK、建立工具筛选索引
+        
+        与用户输入第一条消息的时间重叠，避免首轮对话承担这些开销。
+        """
+        def run():
+            started = time.perf_counter()
+            try:
+                load_dashscope(get_config().llm_api_key)
+                if self.tool_selector is not None:
+                    self.tool_selector.refresh()
+                logger.debug("后台预热完成", elapsed_ms=round((time.perf_counter() - started) * 1000))
+            except Exception as e:
+                logger.warning("后台预热失败", error=str(e))
+        
+        thread = threading.Thread(target=run, name="kortix-warmup", daemon=True)
+        thread.start()
+        return thread
+    
+    @staticmethod
+    def build_system_prompt(tool_registry: ToolRegistry) -> str:
+        """根据注册的工具构建系统提示词"""
         tools_info = []
-        for tool_name in self.tool_registry.list_tools():
-            tool = self.tool_registry.get_tool(tool_name)
+        for tool_name in tool_registry.list_tools():
+            tool = tool_registry.get_tool(tool_name)
             tools_info.append(f"- **{tool.name}**: {tool.description}")
         
         tools_desc = "\n".join(tools_info)
@@ -152,9 +187,28 @@ class Agent:
 """
         return prompt
     
-    def _get_tool_functions(self) -> List[Dict[str, Any]]:
-        """获取所有工具的函数定义（用于 Function Calling）"""
-        return self.tool_registry.get_all_functions()
+    def _get_tool_functions(self, messages: Optional[List[Message]] = None) -> List[Dict[str, Any]]:
+        """获取本次调用发送的函数定义（启用工具筛选时只返回相关子集；有会话产物或历史中有句柄时附加 read_artifact）"""
+        if self.tool_selector is None or not messages:
+            self._offered_functions = None
+            functions = self.tool_registry.get_all_functions()
+        else:
+            # 以最近两条用户消息作为筛选依据（兼顾“继续”之类的简短追问）
+            recent_user = [msg.content for msg in messages if msg.role == "user"][-2:]
+            selection = self.tool_selector.select("\n".join(recent_user))
+            self._offered_functions = None if selection.full_set else selection.names
+            functions = selection.functions
+        if self.artifacts or self._has_artifact_handles(self.messages if messages is None else messages):
+            functions = functions + [READ_ARTIFACT_FUNCTION]
+        return functions
+    
+    @staticmethod
+    def _has_artifact_handles(messages: List[Message]) -> bool:
+        """历史中是否有产物句柄（产物可能由其他 worker 或接续前的进程保存，本地存储为空）"""
+        return any(
+            msg.role == "tool" and isinstance(msg.content, str) and HANDLE_REFERENCE.search(msg.content)
+            for msg in messages
+        )
     
     def _call_llm_with_tools(self, messages: List[Message]) -> Dict[str, Any]:
         """调用 LLM（带工具支持）"""
@@ -164,17 +218,14 @@ class Agent:
         # 准备工具定义
         tools = []
         if self.enable_function_calling:
-            functions = self._get_tool_functions()
+            functions = self._get_tool_functions(messages)
             tools = [{"type": "function", "function": func} for func in functions]
         
         # 调用百炼API（使用原生API以支持tools参数）
-        from dashscope import Generation
-        import dashscope
-        
         config = get_config()
-        dashscope.api_key = config.llm_api_key
+        dashscope = load_dashscope(config.llm_api_key)
         
-        response = Generation.call(
+        response = dashscope.Generation.call(
             model=config.llm_model,
             messages=messages_dict,
             result_format='message',
@@ -186,21 +237,116 @@ class Agent:
         if response.status_code != 200:
             raise Exception(f"LLM调用失败: {response.message}")
         
+        self._record_usage(getattr(response, "usage", None))
         return response.output.choices[0].message
     
+    def _record_usage(self, usage: Any):
+        """累计 LLM token 用量（百炼响应中的 usage 字段）"""
+        self.usage["llm_calls"] += 1
+        if not usage:
+            return
+        for key in ("input_tokens", "output_tokens"):
+            self.usage[key] += int(usage.get(key) or 0)
+    
+    @staticmethod
+    def _parse_arguments(raw: Any) -> tuple:
+        """
+        解析工具调用参数
+        
+        Returns:
+            (参数字典, 错误信息)；解析失败时参数为空字典
+        """
+        if isinstance(raw, dict):
+            return raw, None
+        if raw is None or not str(raw).strip():
+            return {}, None
+        try:
+            arguments = json.loads(raw)
+        except json.JSONDecodeError as e:
+            return {}, (
+                f"参数不是合法的 JSON（第 {e.lineno} 行第 {e.colno} 列: {e.msg}），工具未执行。"
+                f"收到的参数: {str(raw)[:200]}"
+            )
+        if not isinstance(arguments, dict):
+            return {}, f"参数应为 JSON 对象，收到: {str(raw)[:200]}"
+        return arguments, None
+    
     def chat(self, user_input: str, stream: bool = True) -> Iterator[str]:
         """
-        与 Agent 对话
+        与 Agent 对话（把 run_turn 的事件渲染成文本片段）
         
         Args:
             user_input: 用户输入
-            stream: 是否流式输出
+            stream: 是否流式输出；否则只产出最终回复（及错误提示）
         
         Yields:
             Agent 的回复片段
         """
+        # 提前关闭（如客户端断开）时同时关闭 run_turn，由它补齐未完成的工具调用
+        with closing(self.run_turn(user_input)) as events:
+            for event in events:
+                if isinstance(event, TextDelta):
+                    if stream:
+                        yield event.text
+                elif isinstance(event, ToolStart):
+                    if stream:
+                        yield f"\n\n🔧 [使用工具: {event.name}]\n"
+                elif isinstance(event, ToolEnd):
+                    if stream:
+                        result_text = str(ToolResult(event.success, event.output, event.error))
+                        if len(result_text) > TOOL_RESULT_PREVIEW_CHARS:
+                            result_text = result_text[:TOOL_RESULT_PREVIEW_CHARS] + "...\n(输出已截断)"
+                        yield f"{result_text}\n"
+                elif isinstance(event, Error):
+                    yield f"\n\n❌ 错误: {event.message}\n"
+                elif isinstance(event, TurnEnd):
+                    if not stream and event.text:
+                        yield event.text
+                    if event.reason == "max_iterations":
+                        yield "\n\n⚠️ 达到最大工具调用次数限制"
+    
+    def run_turn(self, user_input: str) -> Iterator[Event]:
+        """
+        执行一轮对话，产出类型化事件（见 core/events.py）
+        
+        最后两个事件总是 usage 和 turn_end；失败时在它们之前产出 error。
+        提前关闭生成器（如客户端断开）时，为还没有结果的工具调用补上“已取消”的工具消息，
+        保证历史中每个 tool_calls 都有对应的回复，之后的 LLM 调用不会因此失败。
+        
+        Args:
+            user_input: 用户输入
+        """
+        try:
+            yield from self._run_turn(user_input)
+        except GeneratorExit:
+            self._cancel_pending_tool_calls()
+            raise
+    
+    def _cancel_pending_tool_calls(self):
+        """为最后一条带 tool_calls 的助手消息中还没有结果的调用补上取消消息"""
+        for index in range(len(self.messages) - 1, -1, -1):
+            message = self.messages[index]
+            if message.role == "assistant" and message.tool_calls:
+                break
+            if message.role == "user":
+                return
+        else:
+            return
+        answered = {m.tool_call_id for m in self.messages[index + 1:] if m.role == "tool"}
+        pending = [call for call in message.tool_calls if call.get("id") not in answered]
+        for call in pending:
+            self._append(Message(
+                role="tool",
+                content="已取消：对话在执行该工具前中断，工具未执行",
+                tool_call_id=call.get("id"),
+                name=call.get("function", {}).get("name")
+            ))
+        if pending:
+            logger.info("对话已中断，补齐未执行的工具调用", pending=len(pending))
+    
+    def _run_turn(self, user_input: str) -> Iterator[Event]:
         # 添加用户消息
-        self.messages.append(Message("user", user_input))
+        self._append(Message("user", user_input))
         
         # 限制历史消息数量
         if len(self.messages) > self.max_messages:
@@ -208,107 +354,227 @@ class Agent:
             self.messages = [system_msg] + self.messages[-(self.max_messages-1):]
         
         logger.info("用户输入", input=user_input, message_count=len(self.messages))
+        self.last_error = None
+        usage_before = dict(self.usage)
+        turn_start = len(self.messages) - 1
+        
+        if self.tool_selector is not None:
+            self.tool_selector.start_turn()
+        
+        recalled = self._recall(user_input) if self.memory is not None else ""
         
         # 多轮工具调用循环
         max_iterations = 5
         iteration = 0
-        full_response = ""
+        reply = ""
+        reason = "max_iterations"
+        failed_calls = []
         
         while iteration < max_iterations:
             iteration += 1
             
             try:
                 # 调用 LLM
-                response_message = self._call_llm_with_tools(self.messages)
+                response_message = self._call_llm_with_tools(self._with_memory(recalled))
                 
                 # 检查是否需要调用工具
                 tool_calls = response_message.get('tool_calls', [])
                 
                 if not tool_calls:
                     # 没有工具调用，直接返回回复
-                    content = response_message.get('content', '')
-                    
-                    if stream:
-                        # 模拟流式输出
-                        for char in content:
-                            yield char
-                            full_response += char
-                    else:
-                        full_response = content
-                        yield content
+                    reply = response_message.get('content', '')
+                    if reply:
+                        yield TextDelta(reply)
                     
                     # 添加助手回复到历史
-                    self.messages.append(Message("assistant", full_response))
+                    self._append(Message("assistant", reply))
+                    reason = "stop"
                     break
                 
-                else:
-                    # 有工具调用
-                    assistant_message_content = response_message.get('content', '')
-                    if assistant_message_content:
-                        full_response += assistant_message_content
-                        if stream:
-                            yield assistant_message_content
+                # 有工具调用
+                assistant_message_content = response_message.get('content', '')
+                if assistant_message_content:
+                    yield TextDelta(assistant_message_content)
+                
+                # 添加助手消息（包含tool_calls）
+                self._append(Message(
+                    role="assistant",
+                    content=assistant_message_content,
+                    tool_calls=tool_calls
+                ))
+                
+                # 执行所有工具调用
+                for tool_call in tool_calls:
+                    function_name = tool_call['function']['name']
+                    tool_call_id = tool_call['id']
+                    arguments, parse_error = self._parse_arguments(tool_call['function'].get('arguments'))
                     
-                    # 添加助手消息（包含tool_calls）
-                    self.messages.append(Message(
-                        role="assistant",
-                        content=assistant_message_content,
-                        tool_calls=tool_calls
-                    ))
+                    logger.info("调用工具", function=function_name, args=arguments)
+                    if self.tool_selector is not None and function_name != READ_ARTIFACT_FUNCTION["name"]:
+                        self.tool_selector.record_use(function_name, self._offered_functions)
+                    yield ToolStart(tool_call_id, function_name, arguments)
                     
-                    # 执行所有工具调用
-                    for tool_call in tool_calls:
-                        function_name = tool_call['function']['name']
-                        arguments = json.loads(tool_call['function']['arguments'])
-                        tool_call_id = tool_call['id']
-                        
-                        logger.info("调用工具", function=function_name, args=arguments)
-                        
-                        # 通知用户
-                        tool_msg = f"\n\n🔧 [使用工具: {function_name}]\n"
-                        full_response += tool_msg
-                        if stream:
-                            yield tool_msg
-                        
-                        # 执行工具
+                    # 执行工具（参数无法解析时不执行，把错误交给模型修正）
+                    started = time.perf_counter()
+                    if parse_error:
+                        logger.warning("工具参数不是合法 JSON", function=function_name, error=parse_error)
+                        result = ToolResult(success=False, output="", error=parse_error)
+                    elif function_name == READ_ARTIFACT_FUNCTION["name"]:
+                        result = self._read_artifact(**arguments)
+                    else:
                         result = self.tool_registry.execute(function_name, **arguments)
-                        
-                        # 显示工具结果
-                        result_text = str(result)
-                        if len(result_text) > 500:
-                            result_text = result_text[:500] + "...\n(输出已截断)"
-                        
-                        result_msg = f"{result_text}\n"
-                        full_response += result_msg
-                        if stream:
-                            yield result_msg
-                        
-                        # 添加工具结果到消息历史
-                        self.messages.append(Message(
-                            role="tool",
-                            content=result.output if result.success else result.error,
-                            tool_call_id=tool_call_id,
-                            name=function_name
-                        ))
                     
-                    # 继续下一轮对话（让LLM基于工具结果回复）
-                    continue
+                    if not result.success:
+                        failed_calls.append(tool_call_id)
+                    
+                    # 先添加工具结果到消息历史（超长结果只保留预览和句柄），再产出事件：
+                    # 消费方在 tool_end 处停止时历史仍然完整
+                    self._append(Message(
+                        role="tool",
+                        content=self._spill(result.output if result.success else result.error),
+                        tool_call_id=tool_call_id,
+                        name=function_name
+                    ))
+                    yield ToolEnd(
+                        tool_call_id,
+                        function_name,
+                        result.success,
+                        result.output,
+                        result.error,
+                        round((time.perf_counter() - started) * 1000)
+                    )
+                
+                # 继续下一轮对话（让LLM基于工具结果回复）
             
             except Exception as e:
-                error_msg = f"\n\n❌ 错误: {str(e)}\n"
                 logger.error("对话失败", error=str(e))
-                full_response += error_msg
-                yield error_msg
+                self.last_error = str(e)
+                reason = "error"
+                yield Error(str(e))
                 break
         
-        if iteration >= max_iterations:
-            warning = "\n\n⚠️ 达到最大工具调用次数限制"
-            full_response += warning
-            yield warning
+        usage = {key: self.usage[key] - usage_before[key] for key in self.usage}
+        if self.catalog is not None or self.memory is not None:
+            self._record_turn(self.messages[turn_start:], usage, failed_calls)
+        yield Usage(**usage)
+        yield TurnEnd(reason, reply)
+    
+    def _spill(self, content: Any) -> Any:
+        """超过 spill_chars 的工具结果保存为会话产物，返回写入历史的预览"""
+        if not self.spill_chars or content is None:
+            return content
+        text = content if isinstance(content, str) else str(content)
+        if len(text) <= self.spill_chars:
+            return content
+        try:
+            handle = self.artifacts.put(text)
+        except Exception as e:
+            logger.warning("工具结果保存失败，原样写入历史", error=str(e))
+            return content
+        logger.info("工具结果已保存为会话产物", handle=handle, chars=len(text))
+        return preview(text, handle, *self.preview_lines)
+    
+    def _read_artifact(self, handle: str = "", offset: int = 0, limit: int = 200, **_) -> ToolResult:
+        try:
+            success, text = self.artifacts.read(handle, offset, limit, max_chars=self.spill_chars or 4000)
+        except (TypeError, ValueError) as e:
+            return ToolResult(success=False, output="", error=f"参数错误: {e}")
+        return ToolResult(success=True, output=text) if success else ToolResult(success=False, output="", error=text)
+    
+    def _append(self, message: Message):
+        """添加消息到历史（并写入对话日志）"""
+        self.messages.append(message)
+        if self.journal is not None:
+            self.journal.append(message)
+    
+    def attach_journal(self, journal: ConversationJournal, resume_turns: int = 0):
+        """
+        之后的消息写入对话日志
+        
+        Args:
+            journal: 对话日志（Agent.cleanup 时关闭）
+            resume_turns: 从日志中恢复最近多少轮对话（0 表示不恢复）
+        """
+        self.journal = journal
+        self.attach_artifacts(str(artifacts_path(journal.path)))
+        if resume_turns > 0:
+            restored = journal.tail_load(resume_turns)
+            self.messages = [Message("system", self.system_prompt)] + restored
+            if restored:
+                logger.info("已从对话日志恢复", path=str(journal.path), message_count=len(restored))
+    
+    def attach_artifacts(self, directory: str):
+        """会话产物保存到 directory（而不是内存），会话重建后句柄仍然有效"""
+        self.artifacts = ArtifactStore(directory)
+    
+    def attach_catalog(self, catalog: SessionCatalog, session_id: str):
+        """每轮对话结束时把本轮消息和用量记入会话目录"""
+        self.catalog = catalog
+        self.session_id = session_id
+    
+    def attach_memory(self, memory: MemoryIndex, session_id: str):
+        """每轮对话检索长期记忆，结束时把本轮内容写入记忆"""
+        self.memory = memory
+        self.session_id = session_id
+    
+    def _recall(self, query: str) -> str:
+        """检索与本轮输入相关的历史片段（失败时不影响对话）"""
+        config = get_config()
+        started = time.perf_counter()
+        try:
+            recollections = self.memory.search(
+                query,
+                limit=config.get('memory.top_k', 4),
+                exclude_session=self.session_id,
+                min_coverage=config.get('memory.min_coverage', 0.3),
+                vector_weight=config.get('memory.vector_weight', 0.3)
+            )
+            text = format_memories(recollections, config.get('memory.max_tokens', 400))
+        except Exception as e:
+            logger.warning("长期记忆检索失败", error=str(e))
+            return ""
+        logger.debug(
+            "长期记忆检索",
+            hits=len(recollections),
+            chars=len(text),
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
+        return text
+    
+    def _with_memory(self, recalled: str) -> List[Message]:
+        """发送给模型的消息：检索到的历史片段附加在系统提示词之后（不写入对话历史）"""
+        if not recalled or not self.messages or self.messages[0].role != "system":
+            return self.messages
+        return [Message("system", f"{self.messages[0].content}\n\n{recalled}")] + self.messages[1:]
+    
+    def _record_turn(self, messages: List[Message], usage: Dict[str, int], failed_calls: List[str]):
+        if self.catalog is not None:
+            try:
+                self.catalog.record_turn(
+                    self.session_id,
+                    messages,
+                    usage,
+                    model=get_config().llm_model,
+                    journal=str(self.journal.path) if self.journal is not None else None
+                )
+            except Exception as e:
+                logger.warning("会话目录更新失败", session=self.session_id, error=str(e))
+        if self.memory is not None:
+            try:
+                self.memory.add_turn(
+                    self.session_id,
+                    messages,
+                    failed_calls,
+                    include_tools=get_config().get('memory.include_tools', True)
+                )
+            except Exception as e:
+                logger.warning("长期记忆更新失败", session=self.session_id, error=str(e))
     
     def reset(self):
         """重置对话历史"""
         self.messages = [Message("system", self.system_prompt)]
+        if self.journal is not None:
+            self.journal.reset()
         logger.info("对话历史已重置")
     
     def save_history(self, filepath: Optional[str] = None):
@@ -327,7 +593,7 @@ class Agent:
         
         history_data = {
             "timestamp": datetime.now().isoformat(),
-            "messages": [{"role": msg.role, "content": msg.content} for msg in self.messages]
+            "messages": [msg.to_dict() for msg in self.messages]
         }
         
         with open(filepath, 'w', encoding='utf-8') as f:
@@ -340,19 +606,26 @@ class Agent:
         with open(filepath, 'r', encoding='utf-8') as f:
             history_data = json.load(f)
         
-        self.messages = [
-            Message(msg["role"], msg["content"]) 
-            for msg in history_data["messages"]
-        ]
+        self.messages = [Message.from_dict(msg) for msg in history_data["messages"]]
         
         logger.info(f"对话历史已加载", filepath=filepath, message_count=len(self.messages))
     
     def cleanup(self):
-        """清理资源"""
-        # 清理 Docker 沙箱
-        code_tool = self.tool_registry.get_tool("code_executor")
-        if code_tool and hasattr(code_tool, 'sandbox'):
-            code_tool.sandbox.cleanup()
+        """清理资源（共享的工具注册表由其创建者负责关闭）"""
+        if self.journal is not None:
+            self.journal.close()
+        if self._owns_registry:
+            self.close_tool_registry(self.tool_registry)
+    
+    @staticmethod
+    def close_tool_registry(registry: ToolRegistry):
+        """释放工具资源（如 Docker 客户端）并关闭工具执行池"""
+        for tool_name in registry.list_tools():
+            try:
+                registry.get_tool(tool_name).close()
+            except Exception as e:
+                logger.warning("工具清理失败", tool=tool_name, error=str(e))
+        registry.shutdown()
 
 
 def test_agent():
@@ -0,0 +1,168 @@
+"""
+会话产物 - 保存超长的工具结果，对话历史中只保留首尾预览和句柄
+
+一次 read_file 或 Shell 命令的大输出如果原样写入历史，之后每次调用模型都会重复发送。
+超过阈值的结果保存为产物（句柄为内容哈希，相同内容只保存一份），历史中的工具消息替换为
+首尾预览加句柄，模型需要时调用 read_artifact(handle, offset, limit) 分页读取。
+
+接上对话日志的会话把产物保存在日志旁的 <会话 ID>.artifacts/ 目录，恢复会话后句柄仍然有效，
+删除日志时一并删除；使用 SQLite 会话存储的服务器会话保存在数据库旁的目录中，由所有 worker 共享，
+会话被回收或由其他 worker 接续后句柄仍然有效；其余会话保存在内存中。
+"""
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+import hashlib
+import os
+import re
+import threading
+
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+HANDLE_PATTERN = re.compile(r"^art_[0-9a-f]{12}$")
+# 历史中的产物句柄（预览末尾的提示）
+HANDLE_REFERENCE = re.compile(r"\bart_[0-9a-f]{12}\b")
+# 超过该长度的行（如压缩后的 JSON）按该长度折成多行，保证可以分页读取
+WRAP_CHARS = 1000
+
+# 模型读取产物的函数（由 Agent 直接处理，不经过工具注册表：产物属于会话，注册表由会话共享）
+READ_ARTIFACT_FUNCTION = {
+    "name": "read_artifact",
+    "description": "分页读取被省略的完整工具结果（历史中的工具结果显示为预览和 art_ 开头的句柄时使用）",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "handle": {
+                "type": "string",
+                "description": "产物句柄，如 art_0123456789ab"
+            },
+            "offset": {
+                "type": "integer",
+                "description": "起始行（从 0 开始，默认 0）"
+            },
+            "limit": {
+                "type": "integer",
+                "description": "读取的行数（默认 200）"
+            }
+        },
+        "required": ["handle"]
+    }
+}
+
+
+class ArtifactStore:
+    """一个会话的产物（线程安全）"""
+    
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Args:
+            directory: 保存目录（首次写入时创建）；不传则保存在内存中
+        """
+        self.directory = Path(directory) if directory else None
+        self._memory: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stored: Optional[bool] = None if self.directory is not None else False
+    
+    def __bool__(self) -> bool:
+        """是否保存过产物（决定是否向模型提供 read_artifact）"""
+        if self._stored is None:
+            self._stored = self.directory.is_dir() and any(self.directory.iterdir())
+        return self._stored
+    
+    def put(self, text: str) -> str:
+        """保存内容，返回句柄"""
+        handle = "art_" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            self._stored = True
+            if self.directory is None:
+                self._memory[handle] = text
+                return handle
+            path = self.directory / f"{handle}.txt"
+            if not path.exists():
+                self.directory.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(".tmp")
+                tmp.write_text(text, encoding="utf-8")
+                os.replace(tmp, path)
+        return handle
+    
+    def get(self, handle: str) -> Optional[str]:
+        """读取完整内容，句柄不存在时返回 None"""
+        if not HANDLE_PATTERN.match(handle or ""):
+            return None
+        with self._lock:
+            if self.directory is None:
+                return self._memory.get(handle)
+            try:
+                return (self.directory / f"{handle}.txt").read_text(encoding="utf-8")
+            except OSError:
+                return None
+    
+    def read(self, handle: str, offset: int = 0, limit: int = 200, max_chars: int = 4000) -> Tuple[bool, str]:
+        """
+        分页读取
+        
+        Args:
+            handle: 句柄
+            offset: 起始行（从 0 开始）
+            limit: 最多读取的行数
+            max_chars: 本页的最大字符数（保证读出的内容不会再次被保存为产物）
+        
+        Returns:
+            (是否成功, 本页内容或错误信息)
+        """
+        text = self.get(handle)
+        if text is None:
+            return False, f"产物不存在或已失效: {handle}"
+        lines = split_lines(text)
+        offset = max(0, int(offset))
+        if offset >= len(lines):
+            return False, f"offset 超出范围（共 {len(lines)} 行）"
+        end = min(len(lines), offset + max(1, int(limit)))
+        
+        parts, size = [], 0
+        for index in range(offset, end):
+            line = lines[index]
+            if size + len(line) + 1 > max_chars:
+                if index == offset:
+                    parts.append(line[:max_chars] + "…（该行过长，已截断）")
+                    index += 1
+                end = index
+                break
+            parts.append(line)
+            size += len(line) + 1
+        
+        footer = f"[{handle} 第 {offset}-{end - 1} 行，共 {len(lines)} 行"
+        footer += f"；继续读取请使用 offset={end}]" if end < len(lines) else "；已读完]"
+        return True, "\n".join(parts) + "\n" + footer
+
+
+def split_lines(text: str) -> List[str]:
+    """产物的行（超长的行折成多行；预览和分页读取使用同一套行号）"""
+    lines = []
+    for line in text.splitlines():
+        if len(line) <= WRAP_CHARS:
+            lines.append(line)
+        else:
+            lines.extend(line[i:i + WRAP_CHARS] for i in range(0, len(line), WRAP_CHARS))
+    return lines
+
+
+def preview(text: str, handle: str, head_lines: int = 20, tail_lines: int = 10, max_line_chars: int = 200) -> str:
+    """历史中代替完整结果的首尾预览"""
+    lines = split_lines(text)
+    
+    def clip(line: str) -> str:
+        return line if len(line) <= max_line_chars else line[:max_line_chars] + "…"
+    
+    if len(lines) > head_lines + tail_lines:
+        shown = [clip(line) for line in lines[:head_lines]]
+        shown.append(f"…（省略第 {head_lines}-{len(lines) - tail_lines - 1} 行）…")
+        shown += [clip(line) for line in lines[-tail_lines:]] if tail_lines else []
+    else:
+        shown = [clip(line) for line in lines]
+    return (
+        "\n".join(shown)
+        + f"\n[完整结果共 {len(lines)} 行 / {len(text)} 字符，已保存为 {handle}；"
+        f"需要时调用 read_artifact(handle=\"{handle}\", offset=起始行, limit=行数) 分页读取]"
+    )
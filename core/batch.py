@@ -0,0 +1,247 @@
+"""
+批处理 - 把 JSONL 文件中的提示词并发送入 Agent
+
+- 每行一个独立会话（AgentFactory 创建，共享工具注册表和 LLM 客户端），在线程池中并发执行
+- 每完成一条立即追加到输出文件，中断后重新运行会跳过已成功的条目，只重跑失败和未完成的
+- 每条结果记录耗时、LLM 调用次数和 token 用量，结束时写出汇总
+
+输入每行可以是 JSON 对象 {"id": "...", "prompt": "..."}（也接受 message 字段），
+或 JSON 字符串；缺少 id 时使用行号。
+"""
+from typing import Any, Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from pathlib import Path
+import json
+import statistics
+import threading
+import time
+
+from core.factory import AgentFactory
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class BatchItem:
+    id: str
+    prompt: str
+
+
+@dataclass
+class BatchResult:
+    """一条提示词的处理结果（输出文件中的一行）"""
+    id: str
+    status: str  # ok | error
+    reply: str
+    error: Optional[str]
+    elapsed_ms: int
+    attempts: int
+    llm_calls: int
+    input_tokens: int
+    output_tokens: int
+    finished_at: str
+
+
+def read_items(path: str) -> List[BatchItem]:
+    """读取输入文件，校验 ID 唯一"""
+    items: List[BatchItem] = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"第 {lineno} 行不是合法的 JSON: {e.msg}")
+            if isinstance(data, str):
+                data = {"prompt": data}
+            if not isinstance(data, dict):
+                raise ValueError(f"第 {lineno} 行应为 JSON 对象或字符串")
+            prompt = data.get("prompt") or data.get("message")
+            if not isinstance(prompt, str) or not prompt.strip():
+                raise ValueError(f"第 {lineno} 行缺少 prompt")
+            item_id = str(data.get("id", f"line-{lineno}"))
+            if item_id in seen:
+                raise ValueError(f"第 {lineno} 行的 id 重复: {item_id}")
+            seen.add(item_id)
+            items.append(BatchItem(item_id, prompt))
+    return items
+
+
+def completed_ids(path: str) -> set:
+    """输出文件中已成功的条目（同一 ID 以最后一行为准）"""
+    status: Dict[str, str] = {}
+    if not Path(path).exists():
+        return set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 上次中断时写了一半的行
+            if isinstance(record, dict) and "id" in record:
+                status[str(record["id"])] = record.get("status")
+    return {item_id for item_id, value in status.items() if value == "ok"}
+
+
+class BatchRunner:
+    """并发处理一批提示词"""
+    
+    def __init__(
+        self,
+        factory: AgentFactory,
+        concurrency: int = 4,
+        retries: int = 2,
+        retry_backoff: float = 2.0
+    ):
+        """
+        Args:
+            factory: 创建会话 Agent 的工厂
+            concurrency: 同时处理的条目数
+            retries: 失败后的重试次数（每次重试使用新会话）
+            retry_backoff: 第 n 次重试前等待 retry_backoff * 2^(n-1) 秒（应对限流）
+        """
+        self.factory = factory
+        self.concurrency = max(1, concurrency)
+        self.retries = max(0, retries)
+        self.retry_backoff = retry_backoff
+        self._stopped = threading.Event()
+    
+    def stop(self):
+        """不再开始新的条目（进行中的条目会完成）"""
+        self._stopped.set()
+    
+    def run_item(self, item: BatchItem) -> BatchResult:
+        """在新会话中处理一条提示词，失败时按退避重试"""
+        started = time.perf_counter()
+        usage = {"llm_calls": 0, "input_tokens": 0, "output_tokens": 0}
+        reply, error, attempts = "", None, 0
+        
+        while attempts <= self.retries and not self._stopped.is_set():
+            if attempts:
+                time.sleep(self.retry_backoff * 2 ** (attempts - 1))
+            attempts += 1
+            agent = self.factory.create()
+            try:
+                reply = "".join(agent.chat(item.prompt, stream=False))
+                error = agent.last_error
+            except Exception as e:
+                error = str(e)
+            finally:
+                for key in usage:
+                    usage[key] += agent.usage[key]
+                agent.cleanup()
+            if error is None:
+                break
+            logger.warning("批处理条目失败", id=item.id, attempt=attempts, error=error)
+        
+        return BatchResult(
+            id=item.id,
+            status="ok" if error is None and attempts else "error",
+            reply=reply,
+            error=error if attempts else "已中断",
+            elapsed_ms=round((time.perf_counter() - started) * 1000),
+            attempts=attempts,
+            finished_at=datetime.now().isoformat(timespec="seconds"),
+            **usage
+        )
+    
+    def run(
+        self,
+        items: List[BatchItem],
+        output_path: str,
+        on_result: Optional[Callable[[BatchResult, int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        处理所有未成功的条目，结果逐条追加到 output_path
+        
+        Args:
+            items: 全部条目（输出文件中已成功的会被跳过）
+            output_path: 结果 JSONL 文件
+            on_result: 每完成一条时回调 (结果, 已完成数, 待处理总数)
+        
+        Returns:
+            本次运行的汇总
+        """
+        done = completed_ids(output_path)
+        pending = [item for item in items if item.id not in done]
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        logger.info("批处理开始", total=len(items), skipped=len(done), pending=len(pending))
+        
+        results: List[BatchResult] = []
+        recorded = set()
+        started = time.perf_counter()
+        
+        def record(future):
+            result = future.result()
+            recorded.add(future)
+            if not result.attempts:
+                return  # 中断时还没开始，留给下次运行
+            out.write(json.dumps(asdict(result), ensure_ascii=False) + "\n")
+            out.flush()
+            results.append(result)
+            if on_result is not None:
+                on_result(result, len(results), len(pending))
+        
+        interrupted = False
+        with open(output_path, "a", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="kortix-batch") as pool:
+            futures = [pool.submit(self.run_item, item) for item in pending]
+            try:
+                for future in as_completed(futures):
+                    record(future)
+            except KeyboardInterrupt:
+                # 不再开始新条目，等进行中的条目结束并落盘，下次运行从断点继续
+                interrupted = True
+                self.stop()
+                logger.warning("批处理被中断，等待进行中的条目完成")
+                for future in futures:
+                    future.cancel()
+                for future in futures:
+                    if future not in recorded and not future.cancelled():
+                        record(future)
+        
+        summary = summarize(results, time.perf_counter() - started, total=len(items), skipped=len(done))
+        summary["concurrency"] = self.concurrency
+        summary["interrupted"] = interrupted
+        logger.info("批处理完成", **{k: v for k, v in summary.items() if not isinstance(v, dict)})
+        return summary
+
+
+def summarize(results: List[BatchResult], wall_s: float, total: int, skipped: int) -> Dict[str, Any]:
+    """汇总耗时和 token 用量"""
+    latencies = sorted(r.elapsed_ms for r in results)
+    
+    def percentile(p: float) -> int:
+        if not latencies:
+            return 0
+        return latencies[min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))]
+    
+    ok = [r for r in results if r.status == "ok"]
+    return {
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "total": total,
+        "skipped": skipped,
+        "processed": len(results),
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "wall_seconds": round(wall_s, 2),
+        "items_per_second": round(len(results) / wall_s, 2) if wall_s > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies)) if latencies else 0,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "max": latencies[-1] if latencies else 0,
+        },
+        "tokens": {
+            "llm_calls": sum(r.llm_calls for r in results),
+            "input": sum(r.input_tokens for r in results),
+            "output": sum(r.output_tokens for r in results),
+        },
+    }
+
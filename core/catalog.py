@@ -0,0 +1,384 @@
+"""
+会话目录 - 用 SQLite 索引所有会话，支持列出、全文搜索和按 ID 恢复
+
+- sessions 表：标题（首条用户消息）、模型、轮数、token 用量、工具使用次数、时间、对话日志路径
+- messages + messages_fts（FTS5）：用户和助手消息的全文索引。中文没有空格分词，
+  索引内容是 core.utils.search_index.tokenize 的结果（中文二字组），查询按同样方式分词
+- 恢复会话只需按主键查出日志路径再 tail_load，与会话总数无关
+- 保留策略：超过 compress_after_days 未更新的会话把对话日志压缩为 gzip 快照，
+  超过 delete_after_days 或超出 max_sessions 的最旧会话连同日志一起删除
+
+消息正文以对话日志（core/journal.py）为准，目录中只保存用于搜索结果摘要的前若干字符。
+"""
+from typing import Any, Dict, Iterable, List, Optional
+from collections import Counter
+from pathlib import Path
+import json
+import sqlite3
+import threading
+import time
+
+from core.journal import compact_journal, is_journal_open, open_journal, remove_journal
+from core.llm import Message
+from core.memory import MemoryIndex, open_memory
+from core.utils.logger import get_logger
+from core.utils.search_index import tokenize
+
+logger = get_logger(__name__)
+
+# 目录中保存的消息正文长度（用于搜索结果摘要）
+SNIPPET_SOURCE_CHARS = 2000
+TITLE_CHARS = 60
+
+_catalogs: Dict[str, "SessionCatalog"] = {}
+_catalogs_lock = threading.Lock()
+
+
+class SessionCatalog:
+    """会话目录（线程安全，多个进程可共享同一个数据库文件）"""
+    
+    def __init__(self, db_path: str, busy_timeout: float = 10.0):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=busy_timeout, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL DEFAULT '',
+                model TEXT,
+                journal TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                turns INTEGER NOT NULL DEFAULT 0,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                llm_calls INTEGER NOT NULL DEFAULT 0,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                tools TEXT NOT NULL DEFAULT '{}',
+                compressed INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                ts REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(terms);
+            """
+        )
+        self._conn.commit()
+    
+    # ---------- 写入 ----------
+    
+    def record_turn(
+        self,
+        session_id: str,
+        messages: List[Message],
+        usage: Dict[str, int],
+        model: Optional[str] = None,
+        journal: Optional[str] = None,
+        ts: Optional[float] = None
+    ):
+        """
+        记录一轮对话：更新会话元数据，把用户和助手消息加入全文索引
+        
+        Args:
+            session_id: 会话 ID
+            messages: 本轮新增的消息（从用户消息开始）
+            usage: 本轮 LLM 用量（llm_calls / input_tokens / output_tokens）
+            model: 使用的模型
+            journal: 会话的对话日志路径（恢复时使用）
+            ts: 本轮的时间（默认当前时间，导入旧记录时使用原时间）
+        """
+        now = ts or time.time()
+        title = next((m.content for m in messages if m.role == "user" and m.content), "")[:TITLE_CHARS]
+        tools = Counter(m.name for m in messages if m.role == "tool" and m.name)
+        
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT tools FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO sessions (id, title, model, journal, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, title, model, journal, now, now)
+                )
+                total_tools = tools
+            else:
+                total_tools = Counter(json.loads(row["tools"])) + tools
+            self._conn.execute(
+                "UPDATE sessions SET updated_at = ?, model = COALESCE(?, model), journal = COALESCE(?, journal), "
+                "title = CASE WHEN title = '' THEN ? ELSE title END, turns = turns + 1, "
+                "message_count = message_count + ?, llm_calls = llm_calls + ?, "
+                "input_tokens = input_tokens + ?, output_tokens = output_tokens + ?, tools = ?, compressed = 0 "
+                "WHERE id = ?",
+                (now, model, journal, title, len(messages), usage.get("llm_calls", 0),
+                 usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+                 json.dumps(dict(total_tools), ensure_ascii=False), session_id)
+            )
+            self._index_locked(session_id, messages, now)
+    
+    def _index_locked(self, session_id: str, messages: Iterable[Message], ts: float):
+        for message in messages:
+            if message.role not in ("user", "assistant") or not message.content:
+                continue
+            cursor = self._conn.execute(
+                "INSERT INTO messages (session_id, role, content, ts) VALUES (?, ?, ?, ?)",
+                (session_id, message.role, message.content[:SNIPPET_SOURCE_CHARS], ts)
+            )
+            self._conn.execute(
+                "INSERT INTO messages_fts (rowid, terms) VALUES (?, ?)",
+                (cursor.lastrowid, " ".join(tokenize(message.content)))
+            )
+    
+    def delete(self, session_id: str) -> bool:
+        """删除会话及其全文索引（不删除日志文件）"""
+        with self._lock, self._conn:
+            return self._delete_locked(session_id)
+    
+    def _delete_locked(self, session_id: str) -> bool:
+        self._conn.execute(
+            "DELETE FROM messages_fts WHERE rowid IN (SELECT id FROM messages WHERE session_id = ?)", (session_id,)
+        )
+        self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        return self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+    
+    # ---------- 查询 ----------
+    
+    def resolve(self, prefix: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """按 ID 或唯一前缀查找会话；不传时返回最近更新的会话"""
+        with self._lock:
+            if not prefix:
+                row = self._conn.execute("SELECT * FROM sessions ORDER BY updated_at DESC LIMIT 1").fetchone()
+                return _session(row) if row else None
+            row = self._conn.execute("SELECT * FROM sessions WHERE id = ?", (prefix,)).fetchone()
+            if row is None:
+                rows = self._conn.execute(
+                    "SELECT * FROM sessions WHERE id LIKE ? ESCAPE '\\' LIMIT 2",
+                    (prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",)
+                ).fetchall()
+                if len(rows) > 1:
+                    raise ValueError(f"会话 ID 前缀不唯一: {prefix}")
+                row = rows[0] if rows else None
+        return _session(row) if row else None
+    
+    def list(self, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """按最近更新时间列出会话"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM sessions ORDER BY updated_at DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [_session(row) for row in rows]
+    
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        全文搜索消息，按会话返回最相关的结果
+        
+        Returns:
+            会话信息列表，每项附带 hits（命中消息数）、snippet（最相关消息的摘要）、role
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in dict.fromkeys(terms))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT m.session_id, m.role, m.content, bm25(messages_fts) AS rank "
+                "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                "WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit * 20)
+            ).fetchall()
+            results: Dict[str, Dict[str, Any]] = {}
+            for row in rows:
+                hit = results.get(row["session_id"])
+                if hit is None:
+                    session = self._conn.execute(
+                        "SELECT * FROM sessions WHERE id = ?", (row["session_id"],)
+                    ).fetchone()
+                    if session is None:
+                        continue
+                    hit = results[row["session_id"]] = {
+                        **_session(session),
+                        "hits": 0,
+                        "role": row["role"],
+                        "snippet": _snippet(row["content"], query, terms)
+                    }
+                hit["hits"] += 1
+        return list(results.values())[:limit]
+    
+    # ---------- 保留策略 ----------
+    
+    def apply_retention(
+        self,
+        compress_after_days: float = 7,
+        delete_after_days: float = 0,
+        max_sessions: int = 0
+    ) -> Dict[str, int]:
+        """
+        压缩和删除旧会话
+        
+        Args:
+            compress_after_days: 超过该天数未更新的会话，对话日志压缩为 gzip 快照（0 表示不压缩）
+            delete_after_days: 超过该天数未更新的会话连同日志删除（0 表示不按时间删除）
+            max_sessions: 最多保留的会话数，超出的最旧会话被删除（0 表示不限）
+        
+        Returns:
+            {"compressed": n, "deleted": n}
+        """
+        now = time.time()
+        with self._lock:
+            doomed = []
+            if delete_after_days:
+                doomed += self._conn.execute(
+                    "SELECT id, journal FROM sessions WHERE updated_at < ?", (now - delete_after_days * 86400,)
+                ).fetchall()
+            if max_sessions:
+                doomed += self._conn.execute(
+                    "SELECT id, journal FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?", (max_sessions,)
+                ).fetchall()
+            stale = []
+            if compress_after_days:
+                stale = self._conn.execute(
+                    "SELECT id, journal FROM sessions WHERE compressed = 0 AND updated_at < ?",
+                    (now - compress_after_days * 86400,)
+                ).fetchall()
+        
+        deleted = set()
+        for row in doomed:
+            if row["id"] in deleted:
+                continue
+            if row["journal"] and is_journal_open(row["journal"]):
+                continue  # 本进程正在使用（如刚恢复的会话）
+            if row["journal"]:
+                remove_journal(row["journal"])
+            with self._lock, self._conn:
+                self._delete_locked(row["id"])
+            deleted.add(row["id"])
+        
+        compressed = 0
+        for row in stale:
+            if row["id"] in deleted:
+                continue
+            if row["journal"] and Path(row["journal"]).exists():
+                # 本进程打开着该日志时由持有追加句柄的实例压缩，否则替换文件后新消息会写进旧文件
+                compact_journal(row["journal"])
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE sessions SET compressed = 1 WHERE id = ?", (row["id"],))
+            compressed += 1
+        
+        if deleted or compressed:
+            logger.info("会话保留策略已执行", deleted=len(deleted), compressed=compressed)
+        return {"compressed": compressed, "deleted": len(deleted)}
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _session(row: sqlite3.Row) -> Dict[str, Any]:
+    data = dict(row)
+    data["tools"] = json.loads(data["tools"])
+    data["compressed"] = bool(data["compressed"])
+    return data
+
+
+def _snippet(content: str, query: str, terms: List[str], width: int = 80) -> str:
+    """截取命中位置附近的正文"""
+    lowered = content.lower()
+    position = -1
+    for needle in [query.lower()] + terms:
+        position = lowered.find(needle)
+        if position >= 0:
+            break
+    start = max(0, position - width // 3) if position >= 0 else 0
+    snippet = " ".join(content[start:start + width].split())
+    return ("…" if start > 0 else "") + snippet + ("…" if start + width < len(content) else "")
+
+
+def open_catalog(config) -> Optional[SessionCatalog]:
+    """按配置（history.catalog）打开会话目录，同一进程内共享一个实例；未启用时返回 None"""
+    if not config.get('history.catalog.enabled', True):
+        return None
+    path = config.get('history.catalog.path') or str(Path(config.history_file_path) / "sessions.db")
+    with _catalogs_lock:
+        catalog = _catalogs.get(path)
+        if catalog is None:
+            catalog = _catalogs[path] = SessionCatalog(path)
+        return catalog
+
+
+def attach_history(agent, config, session_id: str, resume_turns: int = 0):
+    """
+    为 Agent 接上会话的对话日志、会话目录和长期记忆（按 history.journal / history.catalog / memory 配置）
+    
+    Args:
+        agent: 会话 Agent
+        config: 配置对象
+        session_id: 会话 ID
+        resume_turns: 从对话日志中恢复最近多少轮（0 表示不恢复）
+    """
+    journal = open_journal(config, session_id)
+    if journal is not None:
+        agent.attach_journal(journal, resume_turns=resume_turns)
+    catalog = open_catalog(config)
+    if catalog is not None:
+        agent.attach_catalog(catalog, session_id)
+    memory = open_memory(config)
+    if memory is not None:
+        agent.attach_memory(memory, session_id)
+
+
+def import_history_files(catalog: SessionCatalog, config, directory: str, memory: Optional[MemoryIndex] = None) -> int:
+    """
+    导入旧版 save_history 写出的 conversation_*.json：写入对话日志并登记到会话目录（以及长期记忆）
+    
+    会话 ID 为 legacy_<文件名时间戳>；已导入的文件跳过。
+    
+    Returns:
+        导入的会话数
+    """
+    imported = 0
+    for path in sorted(Path(directory).glob("conversation_*.json")):
+        session_id = "legacy_" + path.stem[len("conversation_"):]
+        existing = catalog.resolve(session_id)
+        if existing is not None and existing["id"] == session_id:
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            messages = [Message.from_dict(m) for m in data["messages"] if m.get("role") != "system"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("跳过无法解析的历史文件", path=str(path), error=str(e))
+            continue
+        if not messages:
+            continue
+        
+        journal = open_journal(config, session_id)
+        if journal is None:
+            return imported
+        try:
+            for message in messages:
+                journal.append(message)
+        finally:
+            journal.close()
+        
+        # 按用户消息切分成轮次登记（保留原文件的时间）
+        ts = path.stat().st_mtime
+        turn: List[Message] = []
+        for message in messages + [None]:
+            if message is None or (message.role == "user" and turn):
+                catalog.record_turn(session_id, turn, {}, journal=str(journal.path), ts=ts)
+                if memory is not None:
+                    memory.add_turn(session_id, turn, ts=ts)
+                turn = []
+            if message is not None:
+                turn.append(message)
+        imported += 1
+    return imported
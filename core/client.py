@@ -0,0 +1,130 @@
+"""
+守护进程瘦客户端 - 通过 Unix 域套接字与常驻 Agent 通信
+
+只依赖标准库：脚本和编辑器集成的一次性调用不必加载配置、LLM SDK、Docker SDK，
+几十毫秒即可拿到第一个输出片段。协议见 core/daemon.py。
+"""
+from typing import Any, Dict, Iterator, Optional
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# 未通过 --socket / KORTIX_SOCKET 指定时使用的套接字路径（相对于工作目录）
+DEFAULT_SOCKET_PATH = "./data/kortix.sock"
+
+
+def default_socket_path() -> str:
+    """守护进程套接字路径：环境变量 KORTIX_SOCKET 优先"""
+    return os.environ.get("KORTIX_SOCKET") or DEFAULT_SOCKET_PATH
+
+
+class DaemonNotRunning(ConnectionError):
+    """守护进程未运行（套接字不存在或拒绝连接）"""
+
+
+class DaemonError(RuntimeError):
+    """守护进程返回的错误"""
+
+
+class DaemonClient:
+    """守护进程客户端：每个请求一条连接，响应按行流式读取"""
+    
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Args:
+            socket_path: 套接字路径（默认见 default_socket_path）
+            timeout: 单次读取超时（秒），None 表示一直等待
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+    
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            sock.close()
+            raise DaemonNotRunning(f"守护进程未运行: {self.socket_path}") from e
+        sock.settimeout(self.timeout)
+        return sock
+    
+    def request(self, op: str, **params) -> Iterator[Dict[str, Any]]:
+        """发送请求并逐条产出响应事件，收到 done/error 后结束"""
+        sock = self._connect()
+        try:
+            payload = json.dumps({"op": op, **params}, ensure_ascii=False) + "\n"
+            sock.sendall(payload.encode("utf-8"))
+            with sock.makefile("r", encoding="utf-8") as reader:
+                for line in reader:
+                    event = json.loads(line)
+                    if event.get("type") == "error":
+                        raise DaemonError(event.get("error", "未知错误"))
+                    yield event
+                    if event.get("type") == "done":
+                        return
+            raise DaemonError("守护进程提前关闭了连接")
+        finally:
+            sock.close()
+    
+    def _call(self, op: str, **params) -> Dict[str, Any]:
+        """非流式请求：返回 done 事件"""
+        event: Dict[str, Any] = {}
+        for event in self.request(op, **params):
+            pass
+        return event
+    
+    def chat(self, message: str, session: str = "default") -> Iterator[str]:
+        """发送一条消息，流式产出回复片段"""
+        for event in self.request("chat", session=session, message=message):
+            if event.get("type") == "chunk":
+                yield event["text"]
+    
+    def chat_events(self, message: str, session: str = "default") -> Iterator[Dict[str, Any]]:
+        """发送一条消息，逐个产出类型化事件（字典，type 字段见 core/events.py）"""
+        for event in self.request("chat", session=session, message=message, events=True):
+            if event.get("type") == "event":
+                yield event["event"]
+    
+    def ping(self) -> bool:
+        try:
+            self._call("ping")
+            return True
+        except (DaemonNotRunning, OSError):
+            return False
+    
+    def status(self) -> Dict[str, Any]:
+        return self._call("status")
+    
+    def reset(self, session: str = "default") -> Dict[str, Any]:
+        return self._call("reset", session=session)
+    
+    def shutdown(self) -> Dict[str, Any]:
+        return self._call("shutdown")
+
+
+def spawn_daemon(argv: list, socket_path: str, wait: float = 30.0) -> DaemonClient:
+    """
+    在后台启动守护进程并等待套接字就绪
+    
+    Args:
+        argv: 启动守护进程的命令行参数（不含解释器）
+        socket_path: 守护进程监听的套接字路径
+        wait: 最长等待时间（秒）
+    """
+    subprocess.Popen(
+        [sys.executable, *argv],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+    client = DaemonClient(socket_path)
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        if client.ping():
+            return client
+        time.sleep(0.05)
+    raise DaemonNotRunning(f"守护进程未能在 {wait:.0f} 秒内就绪: {socket_path}")
@@ -0,0 +1,213 @@
+"""
+常驻 Agent 守护进程 - 通过 Unix 域套接字为瘦客户端提供服务
+
+配置、日志、LLM SDK、工具注册表（执行池、Docker 沙箱、缓存连接）只初始化一次，
+之后每次调用只需建立一条本地连接。
+
+协议：每条连接一个请求，请求和响应都是一行一个 JSON 对象（UTF-8）。
+
+    请求: {"op": "chat", "session": "default", "message": "...", "events": false}
+          {"op": "reset" | "status" | "ping" | "shutdown", ...}
+    响应: {"type": "chunk", "text": "..."}   # 仅 chat，可多条
+          {"type": "event", "event": {...}}   # chat 且 events 为 true 时代替 chunk，见 core/events.py
+          {"type": "done", ...}               # 成功结束
+          {"type": "error", "error": "..."}   # 失败结束
+"""
+from typing import Any, Callable, Dict, Optional
+from pathlib import Path
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+
+from core.factory import AgentFactory
+from core.sessions import SessionManager
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """读取一行请求，把响应事件逐行写回"""
+    
+    def handle(self):
+        def send(event: Dict[str, Any]):
+            self.wfile.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+        
+        try:
+            line = self.rfile.readline()
+            if not line:
+                return
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("请求应为 JSON 对象")
+        except (ValueError, UnicodeDecodeError) as e:
+            send({"type": "error", "error": f"无效的请求: {e}"})
+            return
+        
+        try:
+            self.server.agent_daemon.dispatch(request, send)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("客户端已断开", op=request.get("op"))
+        except Exception as e:
+            logger.error("请求处理失败", op=request.get("op"), error=str(e))
+            try:
+                send({"type": "error", "error": str(e)})
+            except OSError:
+                pass
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    
+    def __init__(self, socket_path: str, agent_daemon: "AgentDaemon"):
+        self.agent_daemon = agent_daemon
+        super().__init__(socket_path, _Handler)
+
+
+class AgentDaemon:
+    """
+    Agent 守护进程
+    
+    每个会话名对应一个 Agent（独立历史），所有会话共用工具注册表和 LLM 客户端；
+    会话按名字自动创建，超出数量上限时回收最久未用的空闲会话。
+    """
+    
+    def __init__(
+        self,
+        socket_path: str,
+        max_sessions: int = 16,
+        idle_timeout: float = 1800
+    ):
+        """
+        Args:
+            socket_path: 监听的 Unix 套接字路径
+            max_sessions: 同时保留的会话数上限（超出时回收最久未用的空闲会话）
+            idle_timeout: 会话空闲多久后回收（秒，0 表示不回收）
+        """
+        self.socket_path = socket_path
+        self.started_at = time.time()
+        
+        self.factory = AgentFactory()
+        self.tool_registry = self.factory.tool_registry
+        self.sessions = SessionManager(
+            self.factory.create,
+            max_sessions=max_sessions,
+            idle_timeout=idle_timeout,
+            evict_when_full=True
+        )
+        self._server: Optional[_Server] = None
+        
+        # 预先创建默认会话（同时校验 LLM 配置）
+        self.sessions.get("default", create=True)
+    
+    # ---------- 请求处理 ----------
+    
+    def dispatch(self, request: Dict[str, Any], send: Callable[[Dict[str, Any]], None]):
+        """处理一个请求，通过 send 写回响应事件"""
+        op = request.get("op")
+        session_name = str(request.get("session") or "default")
+        
+        if op == "chat":
+            message = request.get("message")
+            if not isinstance(message, str) or not message.strip():
+                send({"type": "error", "error": "message 不能为空"})
+                return
+            self._chat(session_name, message, send, events=bool(request.get("events")))
+        
+        elif op == "reset":
+            self.sessions.get(session_name, create=True).reset()
+            send({"type": "done", "session": session_name})
+        
+        elif op == "status":
+            send({"type": "done", **self.status()})
+        
+        elif op == "ping":
+            send({"type": "done", "pid": os.getpid()})
+        
+        elif op == "shutdown":
+            send({"type": "done"})
+            threading.Thread(target=self.stop, name="kortix-daemon-stop", daemon=True).start()
+        
+        else:
+            send({"type": "error", "error": f"未知操作: {op}"})
+    
+    def _chat(self, session_name: str, message: str, send: Callable[[Dict[str, Any]], None], events: bool = False):
+        session = self.sessions.get(session_name, create=True)
+        started = time.perf_counter()
+        if events:
+            for event in session.run_turn(message):
+                send({"type": "event", "event": event.to_dict()})
+        else:
+            for text in session.chat(message):
+                send({"type": "chunk", "text": text})
+        send({
+            "type": "done",
+            "session": session_name,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000)
+        })
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started_at),
+            "tools": self.tool_registry.list_tools(),
+            "sessions": self.sessions.list()
+        }
+    
+    # ---------- 生命周期 ----------
+    
+    def _bind(self) -> _Server:
+        path = Path(self.socket_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            # 已有守护进程在监听时拒绝启动；否则是上次异常退出留下的套接字文件
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(path))
+                raise RuntimeError(f"守护进程已在运行: {path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                path.unlink(missing_ok=True)
+            finally:
+                probe.close()
+        
+        old_umask = os.umask(0o177)  # 套接字只允许当前用户访问
+        try:
+            return _Server(str(path), self)
+        finally:
+            os.umask(old_umask)
+    
+    def serve_forever(self):
+        """监听套接字直到收到 shutdown 请求或 SIGTERM/SIGINT"""
+        self._server = self._bind()
+        
+        def on_signal(signum, frame):
+            threading.Thread(target=self.stop, name="kortix-daemon-stop", daemon=True).start()
+        
+        signal.signal(signal.SIGTERM, on_signal)
+        signal.signal(signal.SIGINT, on_signal)
+        
+        # 后台预热 LLM SDK 和工具筛选索引
+        self.factory.warm_up()
+        self.sessions.start_reaper()
+        
+        logger.info("守护进程已启动", socket=self.socket_path, pid=os.getpid())
+        try:
+            self._server.serve_forever()
+        finally:
+            self._close()
+    
+    def stop(self):
+        """停止接受新请求（在非 serve_forever 线程中调用）"""
+        if self._server is not None:
+            self._server.shutdown()
+    
+    def _close(self):
+        self._server.server_close()
+        Path(self.socket_path).unlink(missing_ok=True)
+        self.sessions.close()
+        self.factory.close()
+        logger.info("守护进程已退出")
@@ -0,0 +1,86 @@
+"""
+Agent 事件 - 一轮对话产出的类型化事件流
+
+Agent.run_turn() 逐个产出事件，Agent.chat() 只是把它们渲染成文本片段的适配器；
+守护进程、服务器和 `ask --output jsonl` 直接转发事件的 to_dict()，
+下游程序按 type 字段区分，不必再解析文本。
+
+    text_delta  模型回复文本（工具调用前的说明和最终回复）
+    tool_start  开始调用工具（调用 ID、函数名、参数）
+    tool_end    工具调用结束（完整结果、是否成功、耗时）
+    usage       本轮 LLM 用量
+    error       本轮失败（之后仍会产出 turn_end）
+    turn_end    本轮结束（结束原因、最终回复）
+"""
+from typing import Any, ClassVar, Dict, Optional
+from dataclasses import dataclass, fields
+
+
+def _jsonable(value: Any) -> Any:
+    """工具结果可能是任意对象，转换为 JSON 可序列化的值"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return str(value)
+
+
+@dataclass
+class Event:
+    """事件基类"""
+    type: ClassVar[str] = "event"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"type": self.type}
+        for field in fields(self):
+            data[field.name] = _jsonable(getattr(self, field.name))
+        return data
+
+
+@dataclass
+class TextDelta(Event):
+    type: ClassVar[str] = "text_delta"
+    text: str
+
+
+@dataclass
+class ToolStart(Event):
+    type: ClassVar[str] = "tool_start"
+    call_id: str
+    name: str
+    arguments: Dict[str, Any]
+
+
+@dataclass
+class ToolEnd(Event):
+    type: ClassVar[str] = "tool_end"
+    call_id: str
+    name: str
+    success: bool
+    output: Any
+    error: Optional[str]
+    duration_ms: int
+
+
+@dataclass
+class Usage(Event):
+    """本轮（而非会话累计）的 LLM 用量"""
+    type: ClassVar[str] = "usage"
+    llm_calls: int
+    input_tokens: int
+    output_tokens: int
+
+
+@dataclass
+class Error(Event):
+    type: ClassVar[str] = "error"
+    message: str
+
+
+@dataclass
+class TurnEnd(Event):
+    type: ClassVar[str] = "turn_end"
+    reason: str  # stop | error | max_iterations
+    text: str  # 最终回复（不含工具调用过程）
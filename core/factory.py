@@ -0,0 +1,76 @@
+"""
+Agent 工厂 - 共享组件只构建一次，每个会话只创建自己的对话状态
+
+共享（线程安全，所有会话共用）：
+- LLM 客户端
+- 工具注册表：执行池、工具实例（Docker 沙箱、Tavily 客户端、HTTP 连接池、缓存）
+- 系统提示词
+- 工具检索索引（ToolCatalog）
+
+每个会话独有：消息历史、工具筛选的使用记录。
+"""
+from typing import Optional
+import threading
+import time
+
+from core.agent import Agent
+from core.llm import LLM, load_dashscope
+from core.tools import ToolCatalog
+from core.utils.config import get_config
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AgentFactory:
+    """创建共享同一套组件的 Agent"""
+    
+    def __init__(self, config=None):
+        """
+        Args:
+            config: 配置对象，默认使用全局配置
+        """
+        started = time.perf_counter()
+        self.config = config or get_config()
+        
+        self.llm = LLM()
+        self.tool_registry = Agent.build_tool_registry(self.config)
+        self.system_prompt = Agent.build_system_prompt(self.tool_registry)
+        self.tool_catalog: Optional[ToolCatalog] = None
+        if self.config.get('tools.selection.enabled', True):
+            self.tool_catalog = ToolCatalog(self.tool_registry)
+        
+        logger.info(
+            "Agent 工厂初始化完成",
+            tools=self.tool_registry.list_tools(),
+            elapsed_ms=round((time.perf_counter() - started) * 1000)
+        )
+    
+    def create(self) -> Agent:
+        """创建一个会话 Agent（只分配消息历史和筛选状态）"""
+        return Agent(
+            tool_registry=self.tool_registry,
+            llm=self.llm,
+            system_prompt=self.system_prompt,
+            tool_catalog=self.tool_catalog
+        )
+    
+    def warm_up(self) -> threading.Thread:
+        """后台预热：导入 dashscope SDK、建立共享的工具检索索引"""
+        def run():
+            started = time.perf_counter()
+            try:
+                load_dashscope(self.llm.api_key)
+                if self.tool_catalog is not None:
+                    self.tool_catalog.refresh()
+                logger.debug("后台预热完成", elapsed_ms=round((time.perf_counter() - started) * 1000))
+            except Exception as e:
+                logger.warning("后台预热失败", error=str(e))
+        
+        thread = threading.Thread(target=run, name="kortix-warmup", daemon=True)
+        thread.start()
+        return thread
+    
+    def close(self):
+        """释放共享的工具资源"""
+        Agent.close_tool_registry(self.tool_registry)
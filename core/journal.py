@@ -0,0 +1,403 @@
+"""
+对话日志 - 每个会话一个只追加的 JSONL 文件，消息产生时立即写入
+
+- 每条消息写一行 Message.to_dict()（保留 tool_calls / tool_call_id / name），
+  进程崩溃最多丢失正在写的一行；fsync 批量进行（间隔 fsync_interval 秒），
+  避免每条消息一次磁盘同步
+- tail_load 从文件末尾倒着读，只解析最近 N 轮，长会话恢复时间与总长度无关
+- 日志超过 compact_bytes 后在后台压缩：把当前对话写成 gzip 快照，日志从空文件重新开始
+
+文件布局（<dir>/<会话 ID>.jsonl 与 <会话 ID>.snapshot.jsonl.gz，超长工具结果在 <会话 ID>.artifacts/）：
+
+    {"op": "base", "generation": 2}                 # 压缩后新日志的第一行
+    {"op": "message", "ts": ..., "message": {...}}
+    {"op": "reset", "ts": ...}                      # 清空对话，之前的消息不再加载
+
+快照第一行记录它覆盖的日志代数和偏移量；压缩中途崩溃时据此跳过已写入快照的记录，
+不会重复加载。
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import weakref
+
+from core.llm import Message
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 倒读日志时每次读取的块大小
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# 本进程中打开着的日志（绝对路径 -> 实例）：压缩会替换日志文件，必须由持有追加句柄的实例执行
+_open_journals: "weakref.WeakValueDictionary[str, ConversationJournal]" = weakref.WeakValueDictionary()
+_open_journals_lock = threading.Lock()
+
+
+def journal_path(directory: str, session_id: str) -> Path:
+    """会话 ID 对应的日志文件（ID 中的特殊字符替换为下划线）"""
+    safe_id = re.sub(r"[^\w-]", "_", session_id)
+    return Path(directory) / f"{safe_id}.jsonl"
+
+
+def snapshot_path(path: Path) -> Path:
+    """日志对应的 gzip 快照路径"""
+    return path.with_name(path.stem + ".snapshot.jsonl.gz")
+
+
+def artifacts_path(path: Path) -> Path:
+    """日志对应的会话产物目录（core/artifacts.py）"""
+    return path.with_name(path.stem + ".artifacts")
+
+
+def remove_journal(path: str):
+    """删除日志及其快照、会话产物"""
+    for file in (Path(path), snapshot_path(Path(path))):
+        file.unlink(missing_ok=True)
+    shutil.rmtree(artifacts_path(Path(path)), ignore_errors=True)
+
+
+def is_journal_open(path: str) -> bool:
+    """本进程中是否有实例打开着该日志（正在使用的会话不应被保留策略删除）"""
+    with _open_journals_lock:
+        return os.path.abspath(path) in _open_journals
+
+
+def compact_journal(path: str):
+    """压缩日志：本进程中打开着该日志时由打开的实例压缩，否则临时打开"""
+    with _open_journals_lock:
+        journal = _open_journals.get(os.path.abspath(path))
+    if journal is not None:
+        journal.compact()
+        return
+    journal = ConversationJournal(path, compact_bytes=0)
+    try:
+        journal.compact()
+    finally:
+        journal.close()
+
+
+def open_journal(config, session_id: str) -> Optional["ConversationJournal"]:
+    """按配置（history.journal）打开会话的对话日志，未启用时返回 None"""
+    if not config.get('history.journal.enabled', True):
+        return None
+    directory = config.get('history.journal.dir') or str(Path(config.history_file_path) / "journal")
+    return ConversationJournal(
+        str(journal_path(directory, session_id)),
+        fsync_interval=config.get('history.journal.fsync_interval', 1.0),
+        compact_bytes=config.get('history.journal.compact_bytes', 4 * 1024 * 1024)
+    )
+
+
+class ConversationJournal:
+    """一个会话的只追加日志（线程安全）"""
+    
+    def __init__(
+        self,
+        path: str,
+        fsync_interval: float = 1.0,
+        compact_bytes: int = 4 * 1024 * 1024
+    ):
+        """
+        Args:
+            path: 日志文件路径（快照保存在同目录的 <名称>.snapshot.jsonl.gz）
+            fsync_interval: 批量 fsync 的间隔（秒，0 表示每条都 fsync）
+            compact_bytes: 日志超过该大小时后台压缩（0 表示不自动压缩）
+        """
+        self.path = Path(path)
+        self.snapshot_path = snapshot_path(self.path)
+        self.fsync_interval = fsync_interval
+        self.compact_bytes = compact_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        _truncate_torn_line(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._dirty = False
+        self._last_sync = time.monotonic()
+        self._sync_timer: Optional[threading.Timer] = None
+        self._compacting = False
+        self._compact_lock = threading.Lock()  # 后台压缩和保留策略的压缩串行执行
+        with _open_journals_lock:
+            _open_journals.setdefault(os.path.abspath(self.path), self)
+    
+    # ---------- 写入 ----------
+    
+    def append(self, message: Message):
+        """追加一条消息（系统提示词不记录，加载方使用自己当前的系统提示词）"""
+        if message.role == "system":
+            return
+        self._write({"op": "message", "ts": time.time(), "message": message.to_dict()})
+    
+    def reset(self):
+        """记录对话被清空"""
+        self._write({"op": "reset", "ts": time.time()})
+    
+    def _write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()  # 写入操作系统缓存：进程崩溃不丢失
+            self._dirty = True
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+            elif self._sync_timer is None:
+                # 空闲时也要在间隔内落盘
+                self._sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+            size = self._file.tell()
+        
+        if self.compact_bytes and size >= self.compact_bytes and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self._compact_in_background, name="kortix-journal-compact", daemon=True).start()
+    
+    def sync(self):
+        """把已写入的记录 fsync 到磁盘"""
+        with self._lock:
+            self._sync_locked()
+    
+    def _sync_locked(self):
+        if self._sync_timer is not None:
+            self._sync_timer.cancel()
+            self._sync_timer = None
+        if self._dirty and not self._file.closed:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+        self._last_sync = time.monotonic()
+    
+    def close(self):
+        with _open_journals_lock:
+            if _open_journals.get(os.path.abspath(self.path)) is self:
+                del _open_journals[os.path.abspath(self.path)]
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync_locked()
+            self._file.close()
+    
+    # ---------- 读取 ----------
+    
+    def load(self) -> List[Message]:
+        """加载最近一次 reset 之后的全部消息（快照 + 日志）"""
+        snapshot, start = self._read_snapshot()
+        return [Message.from_dict(data) for data in self._replay(snapshot, start)]
+    
+    def tail_load(self, turns: int) -> List[Message]:
+        """
+        加载最近 turns 轮对话（每轮从一条用户消息开始，保证工具调用消息完整）
+        
+        从日志末尾倒着读，日志中的轮数不够时才读取快照。
+        """
+        if turns <= 0:
+            return []
+        collected: List[Dict[str, Any]] = []
+        user_turns = 0
+        reached_reset = False
+        
+        header = self._read_snapshot_header()
+        for record in self._iter_records_reversed(self._journal_start(header)):
+            if record.get("op") == "reset":
+                reached_reset = True
+                break
+            if record.get("op") != "message":
+                continue
+            collected.append(record["message"])
+            if record["message"].get("role") == "user":
+                user_turns += 1
+                if user_turns >= turns:
+                    break
+        collected.reverse()
+        
+        if user_turns < turns and not reached_reset and header is not None:
+            snapshot, _ = self._read_snapshot()
+            collected = snapshot + collected
+        
+        # 从第 turns 轮的用户消息开始（丢弃前面不完整的一轮）
+        user_indexes = [i for i, data in enumerate(collected) if data.get("role") == "user"]
+        if len(user_indexes) > turns:
+            collected = collected[user_indexes[-turns]:]
+        elif user_indexes:
+            collected = collected[user_indexes[0]:]
+        return [Message.from_dict(data) for data in collected]
+    
+    def _read_snapshot_header(self) -> Optional[Dict[str, Any]]:
+        if not self.snapshot_path.exists():
+            return None
+        with gzip.open(self.snapshot_path, "rt", encoding="utf-8") as f:
+            return json.loads(f.readline())
+    
+    def _read_snapshot(self) -> Tuple[List[Dict[str, Any]], int]:
+        """返回 (快照中的消息, 日志中应跳过的字节数)"""
+        if not self.snapshot_path.exists():
+            return [], 0
+        with gzip.open(self.snapshot_path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            messages = [json.loads(line) for line in f if line.strip()]
+        return messages, self._journal_start(header)
+    
+    def _journal_generation(self) -> int:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                first = json.loads(f.readline() or "{}")
+        except (OSError, json.JSONDecodeError):
+            return 0
+        return first.get("generation", 0) if first.get("op") == "base" else 0
+    
+    def _journal_start(self, header: Optional[Dict[str, Any]]) -> int:
+        """日志中尚未写入快照的记录的起始偏移量"""
+        if header is None:
+            return 0
+        if self._journal_generation() == header["journal_generation"]:
+            return header["offset"]  # 压缩写完快照后、替换日志前崩溃
+        return 0
+    
+    def _iter_records(self, start: int = 0, end: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            while end is None or f.tell() < end:
+                line = f.readline()
+                if not line:
+                    break
+                record = _parse(line)
+                if record is not None:
+                    yield record
+    
+    def _replay(self, snapshot: List[Dict[str, Any]], start: int, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        """在快照的基础上重放日志记录，返回消息字典"""
+        messages = list(snapshot)
+        for record in self._iter_records(start, end):
+            if record.get("op") == "reset":
+                messages = []
+            elif record.get("op") == "message":
+                messages.append(record["message"])
+        return messages
+    
+    def _iter_records_reversed(self, start: int = 0) -> Iterator[Dict[str, Any]]:
+        """从文件末尾倒序产出记录，读到 start 为止"""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            position = f.seek(0, os.SEEK_END)
+            remainder = b""
+            while position > start:
+                size = min(TAIL_BLOCK_SIZE, position - start)
+                position -= size
+                f.seek(position)
+                lines = (f.read(size) + remainder).split(b"\n")
+                remainder = lines.pop(0)  # 可能是被块边界截断的行
+                for line in reversed(lines):
+                    record = _parse(line)
+                    if record is not None:
+                        yield record
+            record = _parse(remainder)
+            if record is not None:
+                yield record
+    
+    # ---------- 压缩 ----------
+    
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.warning("对话日志压缩失败", path=str(self.path), error=str(e))
+        finally:
+            self._compacting = False
+    
+    def compact(self):
+        """把当前对话写成 gzip 快照，日志只保留快照之后追加的记录"""
+        with self._compact_lock:
+            self._compact()
+    
+    def _compact(self):
+        started = time.perf_counter()
+        with self._lock:
+            self._sync_locked()
+            offset = self._file.tell()
+        generation = self._journal_generation()
+        
+        # 快照在锁外写入，只包含 offset 之前的记录，压缩期间追加的记录留在日志中
+        snapshot, start = self._read_snapshot()
+        messages = self._replay(snapshot, start, offset)
+        
+        tmp_snapshot = self.snapshot_path.with_suffix(".tmp")
+        with gzip.open(tmp_snapshot, "wt", encoding="utf-8") as f:
+            header = {"op": "snapshot", "ts": time.time(), "generation": generation + 1,
+                      "journal_generation": generation, "offset": offset}
+            f.write(json.dumps(header) + "\n")
+            for data in messages:
+                f.write(json.dumps(data, ensure_ascii=False) + "\n")
+        _fsync_path(tmp_snapshot)
+        os.replace(tmp_snapshot, self.snapshot_path)
+        
+        with self._lock:
+            self._file.flush()
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                rest = f.read()
+            tmp_journal = self.path.with_suffix(".tmp")
+            with open(tmp_journal, "wb") as f:
+                f.write((json.dumps({"op": "base", "generation": generation + 1}) + "\n").encode("utf-8"))
+                f.write(rest)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_journal, self.path)
+            self._file.close()
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._dirty = False
+        
+        logger.info(
+            "对话日志已压缩",
+            path=str(self.path),
+            messages=len(messages),
+            journal_bytes=offset,
+            snapshot_bytes=self.snapshot_path.stat().st_size,
+            elapsed_ms=round((time.perf_counter() - started) * 1000)
+        )
+
+
+def _parse(line: bytes) -> Optional[Dict[str, Any]]:
+    """解析一行记录；空行和崩溃时写了一半的行返回 None"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def _truncate_torn_line(path: Path):
+    """截掉崩溃时写了一半的最后一行（没有换行符），否则下一条记录会接在同一行上，两条都无法解析"""
+    try:
+        with open(path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                size = min(TAIL_BLOCK_SIZE, position)
+                f.seek(position - size)
+                block = f.read(size)
+                newline = block.rfind(b"\n")
+                if newline >= 0:
+                    position = position - size + newline + 1
+                    break
+                position -= size
+            if position < end:
+                f.truncate(position)
+                logger.warning("对话日志末尾有不完整的记录，已截掉", path=str(path), bytes=end - position)
+    except FileNotFoundError:
+        pass
+
+
+def _fsync_path(path: Path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
@@ -1,8 +1,5 @@
 """阿里云百炼 LLM 接口"""
 from typing import List, Dict, Any, Optional, Iterator
-from dashscope import Generation
-from dashscope.api_entities.dashscope_response import GenerationResponse
-import dashscope
 from core.utils.logger import get_logger
 from core.utils.config import get_config
 
@@ -36,6 +33,31 @@ class Message:
             result["name"] = self.name
         
         return result
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Message":
+        """从 to_dict() 的结果还原消息"""
+        return cls(
+            role=data["role"],
+            content=data.get("content") or "",
+            tool_calls=data.get("tool_calls"),
+            tool_call_id=data.get("tool_call_id"),
+            name=data.get("name")
+        )
+
+
+def load_dashscope(api_key: Optional[str] = None):
+    """
+    导入 dashscope SDK（首次导入约需 150ms，可在后台线程中提前调用）
+    
+    Returns:
+        dashscope 模块
+    """
+    import dashscope
+    from dashscope import Generation  # noqa: F401  预先加载生成接口
+    if api_key:
+        dashscope.api_key = api_key
+    return dashscope
 
 
 class LLM:
@@ -52,9 +74,6 @@ class LLM:
         if not self.api_key:
             raise ValueError("未设置 DASHSCOPE_API_KEY，请在配置文件或环境变量中设置")
         
-        # 设置 API Key
-        dashscope.api_key = self.api_key
-        
         logger.info("LLM 初始化完成", model=self.model)
     
     def chat(
@@ -77,9 +96,10 @@ class LLM:
             AI 回复内容
         """
         messages_dict = [msg.to_dict() for msg in messages]
+        generation = load_dashscope(self.api_key).Generation
         
         try:
-            response = Generation.call(
+            response = generation.call(
                 model=self.model,
                 messages=messages_dict,
                 result_format='message',
@@ -131,9 +151,10 @@ class LLM:
             每个 token 片段
         """
         messages_dict = [msg.to_dict() for msg in messages]
+        generation = load_dashscope(self.api_key).Generation
         
         try:
-            response = Generation.call(
+            response = generation.call(
                 model=self.model,
                 messages=messages_dict,
                 result_format='message',
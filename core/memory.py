@@ -0,0 +1,312 @@
+"""
+长期记忆 - 从历史会话中检索与当前问题相关的片段，注入系统提示词
+
+- 每轮对话结束时增量写入：一轮问答（用户问题 + 最终回复）一条，每个成功的工具结果一条
+- 记忆与会话目录（core/catalog.py）保存在同一个 SQLite 文件中，全文索引同样存放
+  core.utils.search_index.tokenize 的结果（中文二字组）
+- 检索分两步：FTS5 按 BM25 取出候选，再按查询词覆盖率过滤；启用向量时，用本地计算的
+  字符三元组哈希向量（无需模型）与 BM25 加权重排，能匹配 index / indexes 这类词形变化
+- 注入内容受 max_tokens 限制，不修改对话历史，也不写入对话日志
+
+当前会话的内容已经在上下文中，检索时排除。
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+import math
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from core.llm import Message
+from core.utils.logger import get_logger
+from core.utils.search_index import tokenize
+from core.utils.tokens import estimate_tokens
+
+logger = get_logger(__name__)
+
+# 一条记忆保存的正文长度
+MEMORY_CHARS = 1500
+# 哈希向量维度
+VECTOR_DIM = 256
+# 每次检索从全文索引取出的候选数
+CANDIDATES = 50
+# 每次检索最多打分的倒排项数：查询词按文档频率从低到高选取，检索耗时不随记忆总数增长；
+# 所有查询词都过于常见时，只在最近的记忆中检索
+MAX_POSTINGS = 10000
+
+_memories: Dict[str, "MemoryIndex"] = {}
+_memories_lock = threading.Lock()
+
+
+def embed(text: str, dim: int = VECTOR_DIM) -> array:
+    """字符三元组的哈希向量（L2 归一化）"""
+    vector = array("f", bytes(4 * dim))
+    for word in re.findall(r"\w+", text.lower()):
+        word = f" {word} "
+        for i in range(max(1, len(word) - 2)):
+            vector[zlib.crc32(word[i:i + 3].encode("utf-8")) % dim] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm:
+        for i in range(dim):
+            vector[i] /= norm
+    return vector
+
+
+@dataclass
+class Recollection:
+    """一条检索结果"""
+    session_id: str
+    kind: str  # turn | tool
+    text: str
+    score: float
+    ts: float
+
+
+class MemoryIndex:
+    """长期记忆索引（线程安全，多个进程可共享同一个数据库文件）"""
+    
+    def __init__(self, db_path: str, vectors: bool = True, busy_timeout: float = 10.0):
+        """
+        Args:
+            db_path: SQLite 文件（与会话目录共用）
+            vectors: 是否计算哈希向量并参与排序
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.vectors = vectors
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=busy_timeout, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS memories (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                text TEXT NOT NULL,
+                vector BLOB,
+                ts REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS memories_session ON memories (session_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(terms);
+            CREATE TABLE IF NOT EXISTS memory_terms (
+                term TEXT PRIMARY KEY,
+                docs INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            """
+        )
+        self._conn.commit()
+    
+    # ---------- 写入 ----------
+    
+    def add_turn(
+        self,
+        session_id: str,
+        messages: List[Message],
+        failed_calls: Iterable[str] = (),
+        include_tools: bool = True,
+        ts: Optional[float] = None
+    ):
+        """
+        记录一轮对话
+        
+        Args:
+            session_id: 会话 ID
+            messages: 本轮的消息（从用户消息开始）
+            failed_calls: 执行失败的工具调用 ID（错误信息不记为记忆）
+            include_tools: 是否把成功的工具结果也记为记忆
+            ts: 本轮的时间（默认当前时间，导入旧记录时使用原时间）
+        """
+        now = ts or time.time()
+        entries = []
+        question = next((m.content for m in messages if m.role == "user" and m.content), "")
+        answer = next((m.content for m in reversed(messages) if m.role == "assistant" and m.content), "")
+        if question and answer:
+            entries.append(("turn", f"问: {question}\n答: {answer}"))
+        if include_tools:
+            arguments = {
+                call.get("id"): call.get("function", {}).get("arguments", "")
+                for m in messages if m.role == "assistant" and m.tool_calls
+                for call in m.tool_calls
+            }
+            failed = set(failed_calls)
+            for m in messages:
+                if m.role == "tool" and m.content and m.tool_call_id not in failed:
+                    entries.append(("tool", f"{m.name}({arguments.get(m.tool_call_id, '')}): {m.content}"))
+        if not entries:
+            return
+        
+        rows = []
+        for kind, text in entries:
+            text = text[:MEMORY_CHARS]
+            vector = embed(text).tobytes() if self.vectors else None
+            rows.append((kind, text, vector, " ".join(tokenize(text))))
+        frequencies = Counter(term for *_, terms in rows for term in set(terms.split()))
+        with self._lock, self._conn:
+            for kind, text, vector, terms in rows:
+                cursor = self._conn.execute(
+                    "INSERT INTO memories (session_id, kind, text, vector, ts) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, kind, text, vector, now)
+                )
+                self._conn.execute("INSERT INTO memories_fts (rowid, terms) VALUES (?, ?)", (cursor.lastrowid, terms))
+            self._conn.executemany(
+                "INSERT INTO memory_terms (term, docs) VALUES (?, ?) "
+                "ON CONFLICT (term) DO UPDATE SET docs = docs + excluded.docs",
+                frequencies.items()
+            )
+    
+    def prune(self) -> int:
+        """删除会话目录中已不存在的会话的记忆，返回删除的条数"""
+        with self._lock, self._conn:
+            has_sessions = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'"
+            ).fetchone()
+            if has_sessions is None:
+                return 0
+            orphans = "SELECT id FROM memories WHERE session_id NOT IN (SELECT id FROM sessions)"
+            frequencies = Counter(
+                term
+                for row in self._conn.execute(f"SELECT terms FROM memories_fts WHERE rowid IN ({orphans})")
+                for term in set(row["terms"].split())
+            )
+            self._conn.executemany(
+                "UPDATE memory_terms SET docs = docs - ? WHERE term = ?",
+                [(count, term) for term, count in frequencies.items()]
+            )
+            self._conn.execute("DELETE FROM memory_terms WHERE docs <= 0")
+            self._conn.execute(f"DELETE FROM memories_fts WHERE rowid IN ({orphans})")
+            return self._conn.execute(f"DELETE FROM memories WHERE id IN ({orphans})").rowcount
+    
+    # ---------- 检索 ----------
+    
+    def search(
+        self,
+        query: str,
+        limit: int = 4,
+        exclude_session: Optional[str] = None,
+        min_coverage: float = 0.3,
+        vector_weight: float = 0.3
+    ) -> List[Recollection]:
+        """
+        检索与 query 相关的记忆
+        
+        Args:
+            query: 查询文本（通常是用户本轮输入）
+            limit: 最多返回的条数
+            exclude_session: 排除的会话（当前会话）
+            min_coverage: 记忆至少包含查询词的比例，过滤只碰巧命中一两个常见词的结果
+            vector_weight: 向量相似度在总分中的权重（未启用向量时忽略）
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            selected, min_rowid = self._select_terms_locked(terms)
+            if not selected:
+                return []
+            match = " OR ".join('"' + term.replace('"', '""') + '"' for term in selected)
+            rows = self._conn.execute(
+                "SELECT m.session_id, m.kind, m.text, m.vector, m.ts, f.terms, f.rank FROM ("
+                "  SELECT rowid, terms, rank FROM memories_fts WHERE memories_fts MATCH ? AND rowid > ? "
+                "  ORDER BY rank LIMIT ?"
+                ") f JOIN memories m ON m.id = f.rowid WHERE m.session_id != ? ORDER BY f.rank",
+                (match, min_rowid, CANDIDATES, exclude_session or "")
+            ).fetchall()
+        if not rows:
+            return []
+        
+        best = -rows[0]["rank"] or 1.0  # FTS5 的 bm25() 越小越相关
+        use_vectors = self.vectors and vector_weight > 0
+        query_vector = embed(query) if use_vectors else None
+        results: List[Recollection] = []
+        seen = set()
+        for row in rows:
+            coverage = len(terms & set(row["terms"].split())) / len(terms)
+            if coverage < min_coverage or row["text"] in seen:
+                continue
+            seen.add(row["text"])
+            score = -row["rank"] / best
+            if use_vectors and row["vector"]:
+                vector = array("f")
+                vector.frombytes(row["vector"])
+                similarity = sum(a * b for a, b in zip(query_vector, vector))
+                score = (1 - vector_weight) * score + vector_weight * similarity
+            results.append(Recollection(row["session_id"], row["kind"], row["text"], score, row["ts"]))
+        results.sort(key=lambda item: item.score, reverse=True)
+        return results[:limit]
+    
+    def _select_terms_locked(self, terms: Iterable[str]) -> Tuple[List[str], int]:
+        """
+        按文档频率从低到高选取参与全文检索的查询词，总倒排项数不超过 MAX_POSTINGS
+        
+        Returns:
+            (查询词, 只检索 rowid 大于该值的记忆)
+        """
+        terms = list(terms)
+        frequencies = sorted(
+            (row["docs"], row["term"])
+            for row in self._conn.execute(
+                f"SELECT term, docs FROM memory_terms WHERE term IN ({', '.join('?' * len(terms))})", terms
+            )
+        )
+        if not frequencies:
+            return [], 0
+        selected, postings = [], 0
+        for docs, term in frequencies:
+            if postings + docs > MAX_POSTINGS:
+                break
+            selected.append(term)
+            postings += docs
+        if selected:
+            return selected, 0
+        # 最罕见的词也出现在太多记忆中：只检索最近的记忆
+        docs, term = frequencies[0]
+        last = self._conn.execute("SELECT MAX(id) FROM memories").fetchone()[0] or 0
+        return [term], last - MAX_POSTINGS
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def format_memories(recollections: List[Recollection], max_tokens: int) -> str:
+    """把检索结果排成注入系统提示词的文本，总长度不超过 max_tokens（估算）"""
+    header = "以下是与当前问题可能相关的历史对话片段（仅供参考，可能已过时）："
+    budget = max_tokens - estimate_tokens(header)
+    lines = []
+    for item in recollections:
+        line = f"- [{time.strftime('%Y-%m-%d', time.localtime(item.ts))}] {' '.join(item.text.split())}"
+        cost = estimate_tokens(line)
+        if cost > budget:
+            # 按剩余预算截断（估算值对中文约为 1 字 1 token，按最保守的比例截取）
+            if budget < 20:
+                break
+            line = line[:budget - 1] + "…"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+        lines.append(line)
+        budget -= cost
+    if not lines:
+        return ""
+    return header + "\n" + "\n".join(lines)
+
+
+def open_memory(config) -> Optional[MemoryIndex]:
+    """按配置（memory）打开记忆索引，同一进程内共享一个实例；未启用时返回 None"""
+    if not config.get('memory.enabled', True):
+        return None
+    path = config.get('history.catalog.path') or str(Path(config.history_file_path) / "sessions.db")
+    with _memories_lock:
+        memory = _memories.get(path)
+        if memory is None:
+            memory = _memories[path] = MemoryIndex(path, vectors=config.get('memory.vector_weight', 0.3) > 0)
+        return memory
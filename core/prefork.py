@@ -0,0 +1,98 @@
+"""
+Prefork 多 worker 部署 - 主进程监听端口并 fork 出 N 个 worker 共享同一个监听套接字
+
+每个 worker 是独立的 Python 进程（各自的 GIL、事件循环、工具执行池），由内核在
+accept 时分配连接；会话状态放在共享的会话存储中，任意 worker 都能接续会话。
+主进程只负责监督：worker 异常退出时重新拉起，收到 SIGTERM/SIGINT 时通知所有 worker 退出。
+仅支持 POSIX（依赖 os.fork）。
+"""
+from typing import Callable, Dict
+import os
+import signal
+import socket
+import time
+
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# worker 启动后这么快就退出视为启动失败，重新拉起前等待一段时间，避免疯狂重启
+MIN_WORKER_LIFETIME = 5.0
+RESTART_BACKOFF = 1.0
+
+
+def bind_listener(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    """在主进程中创建监听套接字（fork 后所有 worker 共享）"""
+    sock = socket.create_server((host, port), backlog=backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve_prefork(run_worker: Callable[[socket.socket], None], sock: socket.socket, workers: int):
+    """
+    fork 出 workers 个进程执行 run_worker(sock)，并在主进程中监督它们
+    
+    Args:
+        run_worker: worker 入口（在子进程中调用，应阻塞直到收到退出信号）
+        sock: 已监听的套接字
+        workers: worker 数量
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("多 worker 模式需要 os.fork（仅支持 Linux/macOS）")
+    
+    children: Dict[int, tuple] = {}  # pid -> (编号, 启动时间)
+    stopping = False
+    
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            # 子进程：恢复默认信号处理，由 worker 自己的事件循环接管
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(sock)
+            except BaseException as e:
+                logger.error("worker 异常退出", worker=index, error=str(e))
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+        logger.info("worker 已启动", worker=index, pid=pid)
+    
+    def on_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    for index in range(workers):
+        spawn(index)
+    
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        if pid not in children:
+            continue
+        index, started = children.pop(pid)
+        if stopping:
+            continue
+        
+        logger.warning("worker 已退出，重新启动", worker=index, pid=pid, status=status)
+        if time.monotonic() - started < MIN_WORKER_LIFETIME:
+            time.sleep(RESTART_BACKOFF)
+        if not stopping:
+            spawn(index)
+    
+    sock.close()
+    logger.info("所有 worker 已退出")
@@ -0,0 +1,269 @@
+"""
+终端渲染 - 把一轮对话的事件流（core/events.py）渲染到 Rich Live 区域
+
+- 事件只更新内存中的渲染树，屏幕由 Live 按固定帧率刷新，输出量与事件数量无关
+- 回复文本按 Markdown 渐进渲染：已完成的段落只渲染一次，每帧只重新解析末尾的段落；
+  文本没有变化的帧只输出缓存的片段，等待模型和工具时几乎不占 CPU；一段文本结束后整段重新渲染一次
+- 工具调用折叠为一行状态（函数名、参数摘要、耗时、结果大小），完整结果保留在
+  last_tools 中，交互模式下用 tools 命令展开
+"""
+from typing import Any, Dict, Iterable, List, Optional, Union
+import re
+
+from rich.console import Console, ConsoleOptions, Group, RenderResult
+from rich.live import Live
+from rich.markdown import Markdown
+from rich.segment import Segment
+from rich.spinner import Spinner
+from rich.text import Text
+
+from core.events import Event, TextDelta, ToolStart, ToolEnd, Usage, Error, TurnEnd
+
+# 工具状态行中参数摘要的最大长度
+ARGS_PREVIEW_CHARS = 60
+# Markdown 列表项（无序或有序）
+LIST_ITEM_PATTERN = re.compile(r"^([-+*]|\d{1,9}[.)])(\s|$)")
+
+
+def _stable_boundary(text: str) -> int:
+    """
+    之前的内容再追加文本也不会改变渲染结果的位置
+    
+    取代码块之外的空行之后的位置，且空行后已有一整行顶格、不是列表项的内容：空行后接列表项
+    或缩进行时，前面的列表可能继续（松散列表的编号、续行段落），不能在此拆开。
+    """
+    boundary = pos = 0
+    candidate = None
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped and not in_fence and candidate is not None and line.endswith("\n"):
+            if not line[0].isspace() and not LIST_ITEM_PATTERN.match(line):
+                boundary = candidate
+            candidate = None
+        if stripped.startswith(("```", "~~~")):
+            in_fence = not in_fence
+        pos += len(line)
+        if not stripped and not in_fence:
+            candidate = pos
+    return boundary
+
+
+def _is_blank(line: List[Segment]) -> bool:
+    """Markdown 元素之间的空行（不含表格、代码块的填充行）"""
+    return not any(segment.text for segment in line)
+
+
+def _render_markdown(console: Console, text: str, options: ConsoleOptions) -> List[List[Segment]]:
+    """渲染一段 Markdown，去掉首尾空行（段落之间的空行由调用方统一插入）"""
+    if not text.strip():
+        return []
+    lines = console.render_lines(Markdown(text), options, pad=False)
+    while lines and _is_blank(lines[-1]):
+        lines.pop()
+    start = 0
+    while start < len(lines) and _is_blank(lines[start]):
+        start += 1
+    return lines[start:]
+
+
+class _MarkdownBlock:
+    """
+    一段回复文本（渐进追加）
+    
+    已完成的段落（见 _stable_boundary）只渲染一次并缓存，每帧只重新解析末尾未完成的部分，
+    长回复的刷新开销不随长度增长。finish() 之后整段重新渲染一次，最终输出与一次性渲染完全相同。
+    """
+    
+    def __init__(self):
+        self.parts: List[str] = []
+        self.finished = False
+        self._full_key = None
+        self._full_lines: List[List[Segment]] = []
+        self._width = 0
+        self._stable_len = 0
+        self._stable_lines: List[List[Segment]] = []
+        self._tail_key = None
+        self._tail_lines: List[List[Segment]] = []
+    
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+    
+    def append(self, text: str):
+        self.parts.append(text)
+    
+    def finish(self):
+        """文本不再追加"""
+        self.finished = True
+    
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        text = self.text
+        if self.finished:
+            if (options.max_width, len(text)) != self._full_key:
+                self._full_lines = _render_markdown(console, text, options)
+                self._full_key = (options.max_width, len(text))
+            for line in self._full_lines:
+                yield from line
+                yield Segment.line()
+            return
+        if options.max_width != self._width:
+            self._width = options.max_width
+            self._stable_len, self._stable_lines, self._tail_key = 0, [], None
+        
+        boundary = _stable_boundary(text)
+        if boundary > self._stable_len:
+            lines = _render_markdown(console, text[self._stable_len:boundary], options)
+            if self._stable_lines and lines:
+                self._stable_lines.append([])  # 段落之间的空行
+            self._stable_lines.extend(lines)
+            self._stable_len = boundary
+        
+        if (len(text), self._stable_len) != self._tail_key:
+            self._tail_lines = _render_markdown(console, text[self._stable_len:], options)
+            self._tail_key = (len(text), self._stable_len)
+        
+        lines = self._stable_lines
+        if lines and self._tail_lines:
+            lines = lines + [[]] + self._tail_lines
+        elif self._tail_lines:
+            lines = self._tail_lines
+        for line in lines:
+            yield from line
+            yield Segment.line()
+
+
+class _ToolLine:
+    """一次工具调用的状态行：运行中显示动画，结束后显示耗时和结果大小"""
+    
+    def __init__(self, event: ToolStart):
+        self.start = event
+        self.end: Optional[ToolEnd] = None
+        self._spinner = Spinner("dots", text=Text(self._label(), style="dim"), style="cyan")
+    
+    def _label(self) -> str:
+        args = ", ".join(f"{key}={value!r}" for key, value in self.start.arguments.items())
+        if len(args) > ARGS_PREVIEW_CHARS:
+            args = args[:ARGS_PREVIEW_CHARS] + "…"
+        return f"{self.start.name}({args})"
+    
+    def __rich__(self) -> Union[Spinner, Text]:
+        if self.end is None:
+            return self._spinner
+        line = Text("  ")
+        if self.end.success:
+            line.append("✓ ", style="green")
+        else:
+            line.append("✗ ", style="red")
+        line.append(self._label(), style="dim")
+        line.append(f"  {self.end.duration_ms}ms · {_describe(self.end)}", style="dim")
+        return line
+
+
+def _describe(event: ToolEnd) -> str:
+    """结果大小摘要（折叠行中显示）"""
+    if not event.success:
+        error = (event.error or "").strip().splitlines()
+        return error[0][:ARGS_PREVIEW_CHARS] if error else "失败"
+    text = str(event.output)
+    lines = text.count("\n") + 1 if text else 0
+    return f"{lines} 行 / {len(text)} 字符"
+
+
+class TurnRenderer:
+    """把 Agent.run_turn() 的事件渲染到终端"""
+    
+    def __init__(self, console: Console, fps: float = 12.0, show_usage: bool = False):
+        """
+        Args:
+            console: 输出的 Rich Console
+            fps: 最大刷新帧率
+            show_usage: 结束时显示本轮 token 用量
+        """
+        self.console = console
+        self.fps = fps
+        self.show_usage = show_usage
+        self.last_tools: List[ToolEnd] = []
+        self._blocks: List[Any] = []
+        self._tools: Dict[str, _ToolLine] = {}
+        self._waiting = Spinner("dots", text=Text("思考中…", style="dim"), style="cyan")
+        self._busy = True
+    
+    def __rich__(self) -> Group:
+        items = list(self._blocks)
+        if self._busy and not any(isinstance(b, _ToolLine) and b.end is None for b in items):
+            items.append(self._waiting)
+        return Group(*items)
+    
+    def _text_block(self) -> _MarkdownBlock:
+        if not self._blocks or not isinstance(self._blocks[-1], _MarkdownBlock):
+            self._blocks.append(_MarkdownBlock())
+        return self._blocks[-1]
+    
+    def _finish_text(self):
+        """当前文本段落已结束（后面是工具调用或本轮结束），整段重新渲染一次"""
+        if self._blocks and isinstance(self._blocks[-1], _MarkdownBlock):
+            self._blocks[-1].finish()
+    
+    def handle(self, event: Event):
+        """更新渲染树（屏幕在下一帧刷新）"""
+        if isinstance(event, TextDelta):
+            self._text_block().append(event.text)
+        elif isinstance(event, ToolStart):
+            self._finish_text()
+            line = _ToolLine(event)
+            self._tools[event.call_id] = line
+            self._blocks.append(line)
+        elif isinstance(event, ToolEnd):
+            line = self._tools.get(event.call_id)
+            if line is not None:
+                line.end = event
+            self.last_tools.append(event)
+        elif isinstance(event, Error):
+            self._finish_text()
+            self._blocks.append(Text(f"❌ 错误: {event.message}", style="red"))
+        elif isinstance(event, Usage):
+            self._finish_text()
+            if self.show_usage:
+                self._blocks.append(Text(
+                    f"LLM 调用 {event.llm_calls} 次 · 输入 {event.input_tokens} / 输出 {event.output_tokens} tokens",
+                    style="dim"
+                ))
+        elif isinstance(event, TurnEnd):
+            self._finish_text()
+            self._busy = False
+            if event.reason == "max_iterations":
+                self._blocks.append(Text("⚠️ 达到最大工具调用次数限制", style="yellow"))
+    
+    def render(self, events: Iterable[Event]) -> Optional[TurnEnd]:
+        """
+        消费事件流直到结束（中断时保留已渲染的内容）
+        
+        Returns:
+            turn_end 事件；事件流提前结束时返回 None
+        """
+        self._blocks, self._tools, self.last_tools, self._busy = [], {}, [], True
+        turn_end = None
+        with Live(self, console=self.console, refresh_per_second=self.fps, transient=False):
+            try:
+                for event in events:
+                    self.handle(event)
+                    if isinstance(event, TurnEnd):
+                        turn_end = event
+            finally:
+                self._finish_text()
+                self._busy = False
+        return turn_end
+    
+    def render_tools(self):
+        """展开上一轮工具调用的完整结果"""
+        if not self.last_tools:
+            self.console.print("[dim]上一轮没有调用工具[/dim]")
+            return
+        for event in self.last_tools:
+            status = "[green]✓[/green]" if event.success else "[red]✗[/red]"
+            self.console.rule(f"{status} {event.name}  {event.duration_ms}ms", align="left", style="dim")
+            self.console.print(
+                str(event.output) if event.success else event.error,
+                markup=False, highlight=False
+            )
@@ -1,6 +1,4 @@
 """Docker 沙箱 - 代码执行环境"""
-import docker
-from docker.models.containers import Container
 from typing import Dict, Any, Optional
 import time
 from core.utils.logger import get_logger
@@ -34,6 +32,9 @@ class DockerSandbox:
         self.timeout = timeout or config.sandbox_timeout
         self.memory_limit_mb = memory_limit or config.sandbox_memory_limit
         
+        # docker SDK 导入较慢，只在真正创建沙箱时导入
+        import docker
+        
         try:
             self.client = docker.from_env()
             logger.info("Docker 客户端初始化成功")
@@ -45,10 +46,12 @@ class DockerSandbox:
     
     def _ensure_image_exists(self):
         """确保 Docker 镜像存在，不存在则拉取"""
+        from docker.errors import ImageNotFound
+        
         try:
             self.client.images.get(self.image)
             logger.info(f"Docker 镜像已存在: {self.image}")
-        except docker.errors.ImageNotFound:
+        except ImageNotFound:
             logger.info(f"正在拉取 Docker 镜像: {self.image}（首次运行可能需要几分钟）")
             try:
                 self.client.images.pull(self.image)
@@ -100,10 +103,11 @@ class DockerSandbox:
             )
         
         logger.info(f"执行代码", language=language, timeout=timeout)
+        from docker.errors import ContainerError
         
         try:
             # 创建并运行容器
-            container: Container = self.client.containers.run(
+            container = self.client.containers.run(
                 image=self.image,
                 command=command,
                 detach=True,
@@ -145,7 +149,7 @@ class DockerSandbox:
                 except Exception as e:
                     logger.warning(f"容器清理失败", error=str(e))
         
-        except docker.errors.ContainerError as e:
+        except ContainerError as e:
             logger.error("容器执行错误", error=str(e))
             return SandboxResult(
                 success=False,
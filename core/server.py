@@ -0,0 +1,334 @@
+"""
+多会话 HTTP / WebSocket 服务器（aiohttp）
+
+一台主机上为整个团队提供服务：每个会话持有自己的消息历史，
+工具注册表（执行池、HTTP 连接池、Docker 沙箱）和 LLM 客户端所有会话共享。
+
+接口：
+
+    GET    /health                      健康检查
+    POST   /sessions                    创建会话，可选 {"id": "..."}
+    GET    /sessions                    会话列表
+    GET    /sessions/{id}               会话信息
+    DELETE /sessions/{id}               保存历史并关闭会话
+    POST   /sessions/{id}/messages      发送消息 {"message": "...", "events": false}；
+                                        Accept: text/event-stream 时以 SSE 流式返回
+    POST   /sessions/{id}/reset         清空对话历史
+    GET    /sessions/{id}/history       对话历史
+    GET    /sessions/{id}/ws            WebSocket：发送 {"message": "..."} 或 {"op": "reset"}
+
+流式事件与守护进程协议一致：chunk（{"text"}）、done、error。
+请求中 "events": true 时改为转发类型化的 Agent 事件（core/events.py）代替 chunk：
+SSE 的事件名为事件类型，WebSocket 发送 {"type": "event", "event": {...}}，
+非流式响应返回 events 列表。
+"""
+from typing import Any, AsyncIterator, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import os
+import threading
+import time
+
+from aiohttp import web, WSMsgType
+
+from core.factory import AgentFactory
+from core.session_store import SessionStore
+from core.sessions import Session, SessionManager, SessionNotFound, SessionLimitError, SessionBusyError
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _json_error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status, dumps=_dumps)
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> bytes:
+    return f"event: {event}\ndata: {_dumps(data)}\n\n".encode("utf-8")
+
+
+class AgentServer:
+    """多会话 Agent 服务器"""
+    
+    def __init__(
+        self,
+        max_sessions: int = 32,
+        idle_timeout: float = 1800,
+        token: Optional[str] = None,
+        chat_workers: Optional[int] = None,
+        store: Optional[SessionStore] = None,
+        lease_ttl: float = 60
+    ):
+        """
+        Args:
+            max_sessions: 内存中同时存在的会话数上限（无会话存储时达到上限后拒绝新建，返回 503）
+            idle_timeout: 会话空闲多久后保存历史并回收（秒，0 表示不回收）
+            token: 访问令牌；设置后请求需携带 Authorization: Bearer <token>
+            chat_workers: 执行对话的线程数（默认等于 max_sessions，保证每个会话都能同时进行）
+            store: 会话存储；设置后会话在内存中达到上限时回收最久未用的空闲会话（可从存储接续），
+                多个 worker 进程共享同一存储时可以互相接续会话
+            lease_ttl: 会话租约有效期（秒）
+        """
+        self.token = token or None
+        self.started_at = time.time()
+        
+        self.factory = AgentFactory()
+        self.tool_registry = self.factory.tool_registry
+        self.sessions = SessionManager(
+            self.factory.create,
+            max_sessions=max_sessions,
+            idle_timeout=idle_timeout,
+            evict_when_full=store is not None,
+            store=store,
+            lease_ttl=lease_ttl
+        )
+        # Agent.chat 是阻塞的（LLM 请求、工具调用），在线程池中执行，事件循环只负责转发片段
+        self._executor = ThreadPoolExecutor(
+            max_workers=chat_workers or max_sessions,
+            thread_name_prefix="kortix-chat"
+        )
+    
+    # ---------- 应用 ----------
+    
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._error_middleware, self._auth_middleware])
+        app.router.add_get("/health", self.health)
+        app.router.add_post("/sessions", self.create_session)
+        app.router.add_get("/sessions", self.list_sessions)
+        app.router.add_get("/sessions/{id}", self.get_session)
+        app.router.add_delete("/sessions/{id}", self.delete_session)
+        app.router.add_post("/sessions/{id}/messages", self.send_message)
+        app.router.add_post("/sessions/{id}/reset", self.reset_session)
+        app.router.add_get("/sessions/{id}/history", self.history)
+        app.router.add_get("/sessions/{id}/ws", self.websocket)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+    
+    def run(self, host: str = "127.0.0.1", port: int = 8765, sock=None):
+        """
+        运行服务器直到收到 SIGINT/SIGTERM
+        
+        Args:
+            sock: 已监听的套接字（多 worker 部署时由主进程创建并共享），设置后忽略 host/port
+        """
+        logger.info("服务器启动", host=host, port=port, pid=os.getpid(), max_sessions=self.sessions.max_sessions)
+        if sock is not None:
+            web.run_app(self.build_app(), sock=sock, print=None)
+        else:
+            web.run_app(self.build_app(), host=host, port=port, print=None)
+    
+    async def _on_startup(self, app: web.Application):
+        self.factory.warm_up()
+        self.sessions.start_reaper()
+    
+    async def _on_cleanup(self, app: web.Application):
+        self.sessions.close()
+        self._executor.shutdown(wait=False)
+        self.factory.close()
+        if self.sessions.store is not None:
+            self.sessions.store.close()
+        logger.info("服务器已退出")
+    
+    @web.middleware
+    async def _error_middleware(self, request: web.Request, handler):
+        try:
+            return await handler(request)
+        except SessionNotFound as e:
+            return _json_error(404, f"会话不存在: {e.args[0]}")
+        except SessionLimitError as e:
+            return _json_error(503, str(e))
+        except SessionBusyError as e:
+            return _json_error(409, str(e))
+        except ValueError as e:
+            return _json_error(400, str(e))
+    
+    @web.middleware
+    async def _auth_middleware(self, request: web.Request, handler):
+        if self.token and request.path != "/health":
+            if request.headers.get("Authorization", "") != f"Bearer {self.token}":
+                return _json_error(401, "未授权")
+        return await handler(request)
+    
+    # ---------- 流式对话 ----------
+    
+    async def _stream(self, session: Session, message: str, events: bool = False) -> AsyncIterator[Any]:
+        """
+        在线程池中执行一轮对话，把片段转发到事件循环；迭代提前结束时通知对话停止
+        
+        events 为 True 时产出 Agent 事件的字典，否则产出合并后的文本片段。
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                cancelled.set()  # 事件循环已关闭
+        
+        def run():
+            try:
+                if events:
+                    for event in session.run_turn(message, cancelled):
+                        put(("chunk", event.to_dict()))
+                else:
+                    for text in session.chat(message, cancelled):
+                        put(("chunk", text))
+                put(("done", None))
+            except Exception as e:
+                logger.error("对话失败", session=session.id, error=str(e))
+                put(("error", e))
+        
+        loop.run_in_executor(self._executor, run)
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            cancelled.set()
+    
+    @staticmethod
+    async def _read_message(request: web.Request) -> tuple:
+        """读取请求体，返回 (消息, 是否转发类型化事件)"""
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            raise ValueError("请求体应为 JSON")
+        message = body.get("message") if isinstance(body, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            raise ValueError("message 不能为空")
+        return message, bool(body.get("events"))
+    
+    # ---------- 处理函数 ----------
+    
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started_at),
+            "pid": os.getpid(),
+            "sessions": len(self.sessions),
+            "max_sessions": self.sessions.max_sessions
+        })
+    
+    async def create_session(self, request: web.Request) -> web.Response:
+        body = await request.json() if request.can_read_body else {}
+        session_id = body.get("id") if isinstance(body, dict) else None
+        session = self.sessions.create(session_id)
+        return web.json_response(session.info(), status=201, dumps=_dumps)
+    
+    async def list_sessions(self, request: web.Request) -> web.Response:
+        return web.json_response({"sessions": self.sessions.list()}, dumps=_dumps)
+    
+    async def get_session(self, request: web.Request) -> web.Response:
+        return web.json_response(self.sessions.get(request.match_info["id"]).info(), dumps=_dumps)
+    
+    async def delete_session(self, request: web.Request) -> web.Response:
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.sessions.remove, request.match_info["id"]
+        )
+        return web.json_response({"deleted": request.match_info["id"]})
+    
+    async def reset_session(self, request: web.Request) -> web.Response:
+        session = self.sessions.get(request.match_info["id"])
+        await asyncio.get_running_loop().run_in_executor(self._executor, session.reset)
+        return web.json_response(session.info(), dumps=_dumps)
+    
+    async def history(self, request: web.Request) -> web.Response:
+        session = self.sessions.get(request.match_info["id"])
+        return web.json_response({"id": session.id, "messages": session.history()}, dumps=_dumps)
+    
+    async def send_message(self, request: web.Request) -> web.StreamResponse:
+        session = self.sessions.get(request.match_info["id"])
+        message, events = await self._read_message(request)
+        started = time.perf_counter()
+        
+        if "text/event-stream" not in request.headers.get("Accept", ""):
+            chunks = [chunk async for chunk in self._stream(session, message, events)]
+            body = {"id": session.id}
+            if events:
+                body["events"] = chunks
+            else:
+                body["reply"] = "".join(chunks)
+            body["elapsed_ms"] = round((time.perf_counter() - started) * 1000)
+            return web.json_response(body, dumps=_dumps)
+        
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream; charset=utf-8",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        })
+        await response.prepare(request)
+        try:
+            async for chunk in self._stream(session, message, events):
+                if events:
+                    await response.write(_sse(chunk["type"], chunk))
+                else:
+                    await response.write(_sse("chunk", {"text": chunk}))
+            await response.write(_sse("done", {
+                "id": session.id,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000)
+            }))
+        except ConnectionResetError:
+            logger.info("客户端已断开", session=session.id)
+            return response
+        except Exception as e:
+            await response.write(_sse("error", {"error": str(e)}))
+        await response.write_eof()
+        return response
+    
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        session = self.sessions.get(request.match_info["id"])
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                data = json.loads(msg.data)
+            except json.JSONDecodeError:
+                data = {"message": msg.data}  # 纯文本直接当作消息
+            if not isinstance(data, dict):
+                await ws.send_json({"type": "error", "error": "消息应为 JSON 对象"}, dumps=_dumps)
+                continue
+            
+            if data.get("op") == "reset":
+                await asyncio.get_running_loop().run_in_executor(self._executor, session.reset)
+                await ws.send_json({"type": "done", "id": session.id}, dumps=_dumps)
+                continue
+            
+            message = data.get("message")
+            if not isinstance(message, str) or not message.strip():
+                await ws.send_json({"type": "error", "error": "message 不能为空"}, dumps=_dumps)
+                continue
+            
+            started = time.perf_counter()
+            try:
+                async for chunk in self._stream(session, message, bool(data.get("events"))):
+                    if isinstance(chunk, dict):
+                        await ws.send_json({"type": "event", "event": chunk}, dumps=_dumps)
+                    else:
+                        await ws.send_json({"type": "chunk", "text": chunk}, dumps=_dumps)
+                await ws.send_json({
+                    "type": "done",
+                    "id": session.id,
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000)
+                }, dumps=_dumps)
+            except ConnectionResetError:
+                break
+            except Exception as e:
+                await ws.send_json({"type": "error", "error": str(e)}, dumps=_dumps)
+        
+        return ws
@@ -0,0 +1,294 @@
+"""
+会话存储 - 对话状态保存在进程之外，任意 worker 都能在重启或重新分配后接续会话
+
+- MemorySessionStore: 进程内存储（嵌入使用；open_session_store 对 memory 后端不创建存储）
+- SQLiteSessionStore: 本地 SQLite（WAL 模式），多个 worker 进程共享
+
+租约（lease）保证同一时刻只有一个 worker 在推进某个会话：开始一轮对话前获取，
+结束后释放；持有者崩溃时租约到期自动失效。每次保存版本号加一，
+worker 发现存储中的版本比本地新时重新加载消息。
+"""
+from typing import Any, Dict, List, Optional
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+import json
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+
+@dataclass
+class SessionRecord:
+    """存储中的会话"""
+    id: str
+    messages: List[Dict[str, Any]]
+    version: int
+    created_at: float
+    updated_at: float
+
+
+class SessionStore(ABC):
+    """会话存储接口"""
+    
+    @abstractmethod
+    def create(self, session_id: str, messages: List[Dict[str, Any]]) -> SessionRecord:
+        """新建会话，已存在时抛出 ValueError"""
+    
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        """读取会话，不存在返回 None"""
+    
+    @abstractmethod
+    def version(self, session_id: str) -> Optional[int]:
+        """只读取版本号（判断本地副本是否过期）"""
+    
+    @abstractmethod
+    def save(self, session_id: str, messages: List[Dict[str, Any]], owner: Optional[str] = None) -> Optional[int]:
+        """
+        保存消息，返回新版本号
+        
+        会话不存在（如进行中的一轮对话期间被删除）时不重新创建；指定 owner 时只在其持有租约时保存。
+        未保存时返回 None。
+        """
+    
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """删除会话，返回是否存在"""
+    
+    @abstractmethod
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """按最近更新时间列出会话摘要"""
+    
+    @abstractmethod
+    def acquire_lease(self, session_id: str, owner: str, ttl: float) -> Optional[bool]:
+        """获取（或续期）租约；被其他持有者占用且未到期时返回 False，会话不存在时返回 None"""
+    
+    @abstractmethod
+    def release_lease(self, session_id: str, owner: str):
+        """释放自己持有的租约"""
+    
+    def artifacts_dir(self, session_id: str) -> Optional[str]:
+        """会话产物（core/artifacts.py）的保存目录，所有 worker 共享；None 表示保存在内存中"""
+        return None
+    
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """进程内存储（单进程部署）"""
+    
+    def __init__(self):
+        self._records: Dict[str, SessionRecord] = {}
+        self._leases: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+    
+    def create(self, session_id: str, messages: List[Dict[str, Any]]) -> SessionRecord:
+        with self._lock:
+            if session_id in self._records:
+                raise ValueError(f"会话已存在: {session_id}")
+            now = time.time()
+            record = SessionRecord(session_id, list(messages), 1, now, now)
+            self._records[session_id] = record
+            return record
+    
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is None:
+                return None
+            return SessionRecord(record.id, list(record.messages), record.version,
+                                 record.created_at, record.updated_at)
+    
+    def version(self, session_id: str) -> Optional[int]:
+        record = self._records.get(session_id)
+        return record.version if record else None
+    
+    def save(self, session_id: str, messages: List[Dict[str, Any]], owner: Optional[str] = None) -> Optional[int]:
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is None:
+                return None
+            if owner is not None and self._leases.get(session_id, (None,))[0] != owner:
+                return None
+            record.messages = list(messages)
+            record.version += 1
+            record.updated_at = time.time()
+            return record.version
+    
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            self._leases.pop(session_id, None)
+            return self._records.pop(session_id, None) is not None
+    
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            records = sorted(self._records.values(), key=lambda r: r.updated_at, reverse=True)[:limit]
+            return [_summary(r.id, len(r.messages), r.created_at, r.updated_at) for r in records]
+    
+    def acquire_lease(self, session_id: str, owner: str, ttl: float) -> Optional[bool]:
+        with self._lock:
+            if session_id not in self._records:
+                return None
+            now = time.time()
+            holder, expires = self._leases.get(session_id, (None, 0.0))
+            if holder not in (None, owner) and expires > now:
+                return False
+            self._leases[session_id] = (owner, now + ttl)
+            return True
+    
+    def release_lease(self, session_id: str, owner: str):
+        with self._lock:
+            if self._leases.get(session_id, (None,))[0] == owner:
+                del self._leases[session_id]
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite 会话存储（WAL 模式）
+    
+    多个进程各自打开同一个数据库文件；写冲突由 SQLite 的忙等待处理，
+    会话级互斥由租约保证。
+    """
+    
+    def __init__(self, db_path: str, busy_timeout: float = 10.0):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                messages TEXT NOT NULL,
+                message_count INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL NOT NULL DEFAULT 0
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)")
+        self._conn.commit()
+    
+    def create(self, session_id: str, messages: List[Dict[str, Any]]) -> SessionRecord:
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO sessions (id, messages, message_count, version, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 1, ?, ?)",
+                    (session_id, json.dumps(messages, ensure_ascii=False), len(messages), now, now)
+                )
+                self._conn.commit()
+            except sqlite3.IntegrityError:
+                raise ValueError(f"会话已存在: {session_id}")
+        return SessionRecord(session_id, list(messages), 1, now, now)
+    
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT messages, version, created_at, updated_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return SessionRecord(session_id, json.loads(row[0]), row[1], row[2], row[3])
+    
+    def version(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+    
+    def save(self, session_id: str, messages: List[Dict[str, Any]], owner: Optional[str] = None) -> Optional[int]:
+        now = time.time()
+        data = json.dumps(messages, ensure_ascii=False)
+        sql = "UPDATE sessions SET messages = ?, message_count = ?, version = version + 1, updated_at = ? WHERE id = ?"
+        params = [data, len(messages), now, session_id]
+        if owner is not None:
+            sql += " AND lease_owner = ?"
+            params.append(owner)
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            version = None
+            if cursor.rowcount > 0:
+                version = self._conn.execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()[0]
+            self._conn.commit()
+        return version
+    
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+        shutil.rmtree(self.artifacts_dir(session_id), ignore_errors=True)
+        return cursor.rowcount > 0
+    
+    def artifacts_dir(self, session_id: str) -> Optional[str]:
+        """数据库旁的 <名称>.artifacts/<会话 ID>/"""
+        safe_id = re.sub(r"[^\w-]", "_", session_id)
+        return str(self.db_path.with_name(self.db_path.stem + ".artifacts") / safe_id)
+    
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, message_count, created_at, updated_at FROM sessions "
+                "ORDER BY updated_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [_summary(*row) for row in rows]
+    
+    def acquire_lease(self, session_id: str, owner: str, ttl: float) -> Optional[bool]:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE sessions SET lease_owner = ?, lease_expires = ? "
+                "WHERE id = ? AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires < ?)",
+                (owner, now + ttl, session_id, owner, now)
+            )
+            acquired = cursor.rowcount > 0
+            exists = acquired or self._conn.execute(
+                "SELECT 1 FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone() is not None
+            self._conn.commit()
+        return acquired if exists else None
+    
+    def release_lease(self, session_id: str, owner: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE sessions SET lease_owner = NULL, lease_expires = 0 WHERE id = ? AND lease_owner = ?",
+                (session_id, owner)
+            )
+            self._conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _summary(session_id: str, message_count: int, created_at: float, updated_at: float) -> Dict[str, Any]:
+    return {
+        "id": session_id,
+        "messages": message_count,
+        "created_at": created_at,
+        "updated_at": updated_at
+    }
+
+
+def open_session_store(config, prefix: str = "server.store") -> Optional[SessionStore]:
+    """
+    按配置创建会话存储（backend: memory | sqlite）
+    
+    memory 后端返回 None：单进程部署时会话只保存在 SessionManager 中，达到 max_sessions 后拒绝新建，
+    回收时保存历史文件；进程内存储不会淘汰记录，反而让会话数不受限制。
+    """
+    backend = config.get(f"{prefix}.backend", "memory")
+    if backend == "memory":
+        return None
+    if backend == "sqlite":
+        path = config.get(f"{prefix}.path") or str(Path(config.cache_dir).parent / "sessions.db")
+        return SQLiteSessionStore(path)
+    raise ValueError(f"未知的会话存储类型: {backend}")
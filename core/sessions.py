@@ -0,0 +1,410 @@
+"""
+会话管理 - 多个对话会话共用工具注册表，各自持有消息历史
+
+守护进程（core/daemon.py）和 HTTP 服务器（core/server.py）共用：
+同一会话的请求串行执行，不同会话并行；空闲超时的会话保存历史后回收。
+配置了会话存储（core/session_store.py）时，每轮对话在租约保护下进行并写回存储，
+多个 worker 进程可以接续同一个会话。
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+
+from core.agent import Agent
+from core.catalog import attach_history
+from core.events import Event
+from core.llm import Message
+from core.session_store import SessionStore
+from core.utils.config import get_config
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 回复片段的合并窗口（秒）：短时间内产出的文本、工具提示和工具结果合并后再发送
+CHUNK_FLUSH_INTERVAL = 0.03
+
+
+class SessionNotFound(KeyError):
+    """会话不存在（或已被回收）"""
+
+
+class SessionLimitError(RuntimeError):
+    """会话数已达上限"""
+
+
+class SessionBusyError(RuntimeError):
+    """会话正由其他 worker 处理（等待租约超时）"""
+
+
+class Session:
+    """一个对话会话（独立的消息历史，共享工具注册表）"""
+    
+    def __init__(
+        self,
+        session_id: str,
+        agent: Agent,
+        store: Optional[SessionStore] = None,
+        owner: str = "",
+        lease_ttl: float = 60,
+        lease_wait: float = 30,
+        version: int = 0
+    ):
+        self.id = session_id
+        self.agent = agent
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        
+        self.store = store
+        self.owner = owner
+        self.lease_ttl = lease_ttl
+        self.lease_wait = lease_wait
+        self.version = version
+        self.in_turn = False
+    
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+    
+    def touch(self):
+        self.last_used = time.monotonic()
+    
+    def chat(self, message: str, cancelled: Optional[threading.Event] = None) -> Iterator[str]:
+        """
+        串行执行一轮对话，产出合并后的回复片段
+        
+        Args:
+            message: 用户消息
+            cancelled: 客户端断开时置位，下一个片段处停止
+        """
+        with self.lock, self._turn():
+            buffer: List[str] = []
+            last_flush = time.monotonic()
+            # 取消时在写回存储前关闭 Agent 的生成器，由它补齐未完成的工具调用
+            chunks = self.agent.chat(message, stream=True)
+            try:
+                for chunk in chunks:
+                    if cancelled is not None and cancelled.is_set():
+                        logger.info("对话已取消", session=self.id)
+                        return
+                    buffer.append(chunk)
+                    if time.monotonic() - last_flush >= CHUNK_FLUSH_INTERVAL:
+                        yield "".join(buffer)
+                        buffer.clear()
+                        last_flush = time.monotonic()
+                if buffer:
+                    yield "".join(buffer)
+            finally:
+                chunks.close()
+                self.touch()
+    
+    def run_turn(self, message: str, cancelled: Optional[threading.Event] = None) -> Iterator[Event]:
+        """
+        串行执行一轮对话，逐个产出类型化事件（见 core/events.py）
+        
+        Args:
+            message: 用户消息
+            cancelled: 客户端断开时置位，下一个事件处停止
+        """
+        with self.lock, self._turn():
+            events = self.agent.run_turn(message)
+            try:
+                for event in events:
+                    if cancelled is not None and cancelled.is_set():
+                        logger.info("对话已取消", session=self.id)
+                        return
+                    yield event
+            finally:
+                events.close()
+                self.touch()
+    
+    def reset(self):
+        with self.lock, self._turn():
+            self.agent.reset()
+        self.touch()
+    
+    @contextmanager
+    def _turn(self):
+        """
+        在存储租约保护下执行一轮操作
+        
+        开始前若存储中的版本更新（其他 worker 推进过该会话）则重新加载消息，结束后写回。
+        """
+        if self.store is None:
+            yield
+            return
+        
+        deadline = time.monotonic() + self.lease_wait
+        while True:
+            acquired = self.store.acquire_lease(self.id, self.owner, self.lease_ttl)
+            if acquired is None:
+                raise SessionNotFound(self.id)  # 已被删除（可能在其他 worker 上）
+            if acquired:
+                break
+            if time.monotonic() >= deadline:
+                raise SessionBusyError(f"会话正由其他 worker 处理: {self.id}")
+            time.sleep(0.1)
+        
+        self.in_turn = True
+        synced = False
+        try:
+            self._sync()
+            synced = True
+            yield
+        finally:
+            try:
+                # 只在同步成功后写回；会话在本轮进行中被删除或租约失效时不写回，避免把删除的会话恢复出来
+                if synced:
+                    version = self.store.save(self.id, self.history(), owner=self.owner)
+                    if version is None:
+                        logger.warning("会话已删除或租约已失效，本轮结果未写回存储", session=self.id)
+                    else:
+                        self.version = version
+            finally:
+                self.in_turn = False
+                self.store.release_lease(self.id, self.owner)
+    
+    def _sync(self):
+        version = self.store.version(self.id)
+        if version is None:
+            raise SessionNotFound(self.id)
+        if version != self.version:
+            record = self.store.load(self.id)
+            self.load(record.messages, record.version)
+            logger.info("会话已从存储同步", session=self.id, version=record.version)
+    
+    def load(self, messages: List[Dict[str, Any]], version: int):
+        """用存储中的消息替换本地历史"""
+        if messages:
+            self.agent.messages = [Message.from_dict(m) for m in messages]
+        self.version = version
+    
+    def history(self) -> List[Dict[str, Any]]:
+        return [msg.to_dict() for msg in self.agent.messages]
+    
+    def info(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "messages": len(self.agent.messages),
+            "busy": self.busy,
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(timespec="seconds"),
+            "idle_seconds": round(time.monotonic() - self.last_used)
+        }
+
+
+class SessionManager:
+    """
+    会话管理器
+    
+    会话数达到上限时：evict_when_full 为 True 则回收最久未用的空闲会话，否则拒绝新建。
+    """
+    
+    def __init__(
+        self,
+        create_agent: Callable[[], Agent],
+        max_sessions: int = 16,
+        idle_timeout: float = 1800,
+        evict_when_full: bool = False,
+        store: Optional[SessionStore] = None,
+        lease_ttl: float = 60,
+        lease_wait: float = 30
+    ):
+        """
+        Args:
+            create_agent: 创建会话 Agent 的函数（通常是 AgentFactory.create）
+            max_sessions: 同时保留在内存中的会话数上限
+            idle_timeout: 会话空闲多久后回收（秒，0 表示不回收）
+            evict_when_full: 达到上限时是否回收最久未用的空闲会话
+            store: 会话存储；设置后会话状态写回存储，回收后仍可从存储接续
+            lease_ttl: 会话租约有效期（秒），进行中的对话会定期续期
+            lease_wait: 等待其他 worker 释放租约的最长时间（秒）
+        """
+        self.create_agent = create_agent
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout = idle_timeout
+        self.evict_when_full = evict_when_full
+        self.store = store
+        self.lease_ttl = lease_ttl
+        self.lease_wait = lease_wait
+        # 租约持有者标识：主机名 + 进程号（每个 worker 不同）
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def create(self, session_id: Optional[str] = None) -> Session:
+        """新建会话（不指定 ID 时随机生成）"""
+        with self._lock:
+            session_id = session_id or uuid.uuid4().hex
+            if session_id in self._sessions:
+                raise ValueError(f"会话已存在: {session_id}")
+            return self._create_locked(session_id, new=True)
+    
+    def get(self, session_id: str, create: bool = False) -> Session:
+        """获取会话（本地没有时从存储加载）；create 为 True 时不存在则新建"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                record = self.store.load(session_id) if self.store is not None else None
+                if record is not None:
+                    session = self._create_locked(session_id)
+                    session.load(record.messages, record.version)
+                elif create:
+                    session = self._create_locked(session_id, new=True)
+                else:
+                    raise SessionNotFound(session_id)
+            session.touch()
+            return session
+    
+    def _create_locked(self, session_id: str, new: bool = False) -> Session:
+        if len(self._sessions) >= self.max_sessions:
+            if not (self.evict_when_full and self._evict_lru_locked()):
+                raise SessionLimitError(f"会话数已达上限 ({self.max_sessions})")
+        agent = self.create_agent()
+        if self.store is None:
+            # 没有会话存储时用对话日志持久化：逐条追加，同名会话重建（如守护进程重启）后接续
+            config = get_config()
+            attach_history(agent, config, session_id, resume_turns=config.get('history.journal.resume_turns', 20))
+        elif self.store.artifacts_dir(session_id):
+            # 产物保存在存储旁的共享目录，会话回收或由其他 worker 接续后句柄仍然有效
+            agent.attach_artifacts(self.store.artifacts_dir(session_id))
+        session = Session(
+            session_id,
+            agent,
+            store=self.store,
+            owner=self.owner,
+            lease_ttl=self.lease_ttl,
+            lease_wait=self.lease_wait
+        )
+        if new and self.store is not None:
+            session.version = self.store.create(session_id, session.history()).version
+        self._sessions[session_id] = session
+        logger.info("会话已创建", session=session_id, sessions=len(self._sessions))
+        return session
+    
+    def _evict_lru_locked(self) -> bool:
+        idle = [(s.last_used, sid) for sid, s in self._sessions.items() if not s.busy]
+        if not idle:
+            return False
+        _, session_id = min(idle)
+        self._close(self._sessions.pop(session_id))
+        return True
+    
+    def remove(self, session_id: str):
+        """关闭会话并从存储中删除"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        deleted = self.store.delete(session_id) if self.store is not None else False
+        if session is None and not deleted:
+            raise SessionNotFound(session_id)
+        if session is not None:
+            self._close(session)
+    
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            sessions = {sid: s.info() for sid, s in self._sessions.items()}
+        if self.store is None:
+            return list(sessions.values())
+        
+        # 存储中的会话（包括其他 worker 上的），本进程已加载的补充运行状态
+        result = []
+        for summary in self.store.list():
+            info = sessions.get(summary["id"], {})
+            result.append({
+                **summary,
+                "created_at": datetime.fromtimestamp(summary["created_at"]).isoformat(timespec="seconds"),
+                "updated_at": datetime.fromtimestamp(summary["updated_at"]).isoformat(timespec="seconds"),
+                "loaded": bool(info),
+                "busy": info.get("busy", False)
+            })
+        return result
+    
+    @staticmethod
+    def _save_history(session: Session):
+        """保存会话历史（文件名带会话 ID，避免同一秒回收的多个会话互相覆盖）"""
+        config = get_config()
+        if not config.history_save_to_file or len(session.agent.messages) <= 1:
+            return
+        if session.agent.journal is not None:
+            return  # 对话日志已逐条保存
+        history_dir = Path(config.history_file_path)
+        history_dir.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_id = re.sub(r"[^\w-]", "_", session.id)
+        session.agent.save_history(str(history_dir / f"conversation_{timestamp}_{safe_id}.json"))
+    
+    def _close(self, session: Session):
+        # 有会话存储时历史已逐轮写回，无需另存文件
+        if self.store is None:
+            try:
+                self._save_history(session)
+            except Exception as e:
+                logger.warning("会话历史保存失败", session=session.id, error=str(e))
+        session.agent.cleanup()
+        logger.info("会话已回收", session=session.id)
+    
+    def reap_idle(self) -> int:
+        """回收空闲超时的会话，返回回收数量"""
+        if self.idle_timeout <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                self._sessions.pop(sid) for sid, s in list(self._sessions.items())
+                if not s.busy and now - s.last_used > self.idle_timeout
+            ]
+        for session in expired:
+            self._close(session)
+        return len(expired)
+    
+    def renew_leases(self):
+        """为进行中的对话续租，避免长时间的工具调用期间租约过期"""
+        with self._lock:
+            sessions = [s for s in self._sessions.values() if s.in_turn]
+        for session in sessions:
+            try:
+                self.store.acquire_lease(session.id, self.owner, self.lease_ttl)
+            except Exception as e:
+                logger.warning("租约续期失败", session=session.id, error=str(e))
+    
+    def start_reaper(self):
+        """启动后台维护线程：回收空闲会话、为进行中的对话续租"""
+        if self._reaper is not None:
+            return
+        intervals = []
+        if self.idle_timeout > 0:
+            intervals.append(min(60.0, max(1.0, self.idle_timeout / 4)))
+        if self.store is not None:
+            intervals.append(max(1.0, self.lease_ttl / 3))
+        if not intervals:
+            return
+        interval = min(intervals)
+        
+        def run():
+            while not self._stopped.wait(interval):
+                self.reap_idle()
+                if self.store is not None:
+                    self.renew_leases()
+        
+        self._reaper = threading.Thread(target=run, name="kortix-session-reaper", daemon=True)
+        self._reaper.start()
+    
+    def close(self):
+        """停止回收线程，保存并关闭所有会话"""
+        self._stopped.set()
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            self._close(session)
@@ -1,19 +1,43 @@
 """工具模块 - 完整工具系统"""
 from .base import Tool, ToolResult, tool_function
 from .registry import ToolRegistry
+from .validation import ArgumentValidator, ArgumentValidationError
+from .selector import ToolSelector, ToolCatalog, Selection
+from .workspace_index import WorkspaceIndex
+from .chunk_index import ChunkIndex
 from .file_manager import FileManagerTool
-from .web_search import WebSearchTool
+from .web_search import WebSearchTool, SearchCache
+from .web_fetch import WebFetchTool, PageCache
 from .shell import ShellTool
 from .calculator import CalculatorTool
+from .table_query import TableQueryTool
+from .code_executor import CodeExecutorTool
+from .plugins import ToolSpec, ToolContext, LazyTool, discover_tools
 
 __all__ = [
     'Tool',
     'ToolResult',
     'tool_function',
     'ToolRegistry',
+    'ArgumentValidator',
+    'ArgumentValidationError',
+    'ToolSelector',
+    'ToolCatalog',
+    'Selection',
+    'WorkspaceIndex',
+    'ChunkIndex',
     'FileManagerTool',
     'WebSearchTool',
+    'SearchCache',
+    'WebFetchTool',
+    'PageCache',
     'ShellTool',
     'CalculatorTool',
+    'TableQueryTool',
+    'CodeExecutorTool',
+    'ToolSpec',
+    'ToolContext',
+    'LazyTool',
+    'discover_tools',
 ]
 
@@ -2,7 +2,17 @@
 from typing import Dict, Any, Optional, List, Callable
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
+from contextvars import ContextVar
 import inspect
+import threading
+
+# 执行器类型：inline（调用线程直接执行）/ thread（线程池）/ process（进程池，适合 CPU 密集型）
+EXECUTORS = ("inline", "thread", "process")
+
+# 当前工具调用的取消事件（由 ToolRegistry 在执行前设置）
+current_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("current_cancel_event", default=None)
+# 当前工具调用使用的进程池入口 (func, args) -> 结果（由 ToolRegistry 在执行前设置）
+current_process_runner: ContextVar[Optional[Callable]] = ContextVar("current_process_runner", default=None)
 
 
 @dataclass
@@ -19,6 +29,35 @@ class ToolResult:
             return f"❌ 失败\n{self.error}"
 
 
+@dataclass(frozen=True)
+class ExecutionSpec:
+    """工具函数的执行元数据"""
+    executor: str = "thread"
+    timeout: Optional[float] = None  # 秒；None 表示使用注册表默认值
+    max_concurrency: Optional[int] = None  # 同一函数的最大并发数；None 表示不限制
+
+
+def is_cancelled() -> bool:
+    """当前工具调用是否已超时/被取消（长循环中应定期检查）"""
+    event = current_cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def run_in_process(func: Callable, *args) -> Any:
+    """
+    在注册表的进程池中执行模块级函数（参数和返回值必须可序列化），等待结果
+    
+    线程池中的调用超时后只能等函数自行退出，而持有 GIL 的 C 调用（如回溯失控的正则）
+    既不会检查 is_cancelled()，也会让调用方无法按时返回。这类计算应交给进程池：
+    调用超时时终止执行它的工作进程，并抛出 TimeoutError。
+    不经过注册表调用（如直接调用工具方法）时在当前线程执行。
+    """
+    runner = current_process_runner.get()
+    if runner is None:
+        return func(*args)
+    return runner(func, args)
+
+
 class Tool(ABC):
     """工具基类"""
     
@@ -26,6 +65,7 @@ class Tool(ABC):
         self.name = name
         self.description = description
         self._functions: Dict[str, Callable] = {}
+        self._execution_specs: Dict[str, ExecutionSpec] = {}
     
     @abstractmethod
     def get_functions(self) -> List[Dict[str, Any]]:
@@ -77,29 +117,61 @@ class Tool(ABC):
                 error=f"执行失败: {str(e)}"
             )
     
+    def warm(self):
+        """预热工具（如建立连接），可在后台线程中调用（默认无操作）"""
+        pass
+    
+    def close(self):
+        """释放工具占用的资源（默认无操作）"""
+        pass
+    
     def register_function(self, name: str, func: Callable):
-        """注册一个函数"""
+        """注册一个函数（读取 tool_function 装饰器上的执行元数据）"""
         self._functions[name] = func
+        self._execution_specs[name] = getattr(func, "_execution_spec", None) or ExecutionSpec()
+    
+    def get_execution_spec(self, function_name: str) -> ExecutionSpec:
+        """获取函数的执行元数据"""
+        return self._execution_specs.get(function_name) or ExecutionSpec()
+
+
+def execution_specs(tool_class: type) -> Dict[str, ExecutionSpec]:
+    """从工具类上 tool_function 装饰的方法读取执行元数据（无需实例化）"""
+    specs = {}
+    for _, member in inspect.getmembers(tool_class, inspect.isfunction):
+        if getattr(member, "_is_tool_function", False):
+            specs[member._function_name] = member._execution_spec
+    return specs
 
 
 # 装饰器：用于标记工具函数
 def tool_function(
-    name: str,
-    description: str,
-    parameters: Optional[Dict[str, Any]] = None
+    name: Optional[str] = None,
+    description: str = "",
+    parameters: Optional[Dict[str, Any]] = None,
+    executor: str = "thread",
+    timeout: Optional[float] = None,
+    max_concurrency: Optional[int] = None
 ):
     """
     工具函数装饰器
     
     Args:
-        name: 函数名
+        name: 函数名（默认使用被装饰函数的名称）
         description: 函数描述
         parameters: 参数定义（OpenAI格式）
+        executor: 执行器，inline / thread / process
+        timeout: 执行超时（秒）
+        max_concurrency: 同一函数的最大并发数
     """
+    if executor not in EXECUTORS:
+        raise ValueError(f"未知的执行器: {executor}")
+    
     def decorator(func):
         func._is_tool_function = True
-        func._function_name = name
+        func._function_name = name or func.__name__
         func._function_description = description
+        func._execution_spec = ExecutionSpec(executor, timeout, max_concurrency)
         func._function_parameters = parameters or {
             "type": "object",
             "properties": {},
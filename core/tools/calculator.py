@@ -1,13 +1,394 @@
 """计算器和实用工具"""
-from typing import List
+from typing import Any, Callable, Dict, List, Optional
+from functools import lru_cache
+import ast
 import math
-import re
+import operator
 from datetime import datetime
-from core.tools.base import Tool, ToolResult
+from core.tools.base import Tool, ToolResult, tool_function
 from core.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 安全限制
+MAX_EXPRESSION_LENGTH = 1000
+MAX_NODES = 300          # 表达式 AST 节点数上限（无循环，节点数即求值步数上限）
+MAX_INT_BITS = 8192      # 整数运算结果的最大位数（约 2466 位十进制）
+MAX_FACTORIAL = 1000
+MAX_ROUND_DIGITS = 1000  # round 的 ndigits 绝对值上限
+MAX_BATCH = 200          # 单次批量表达式数
+MAX_VALUES = 1_000_000   # 单次向量化求值的元素数
+MAX_DISPLAY_ROWS = 100
+
+
+class CalculationError(ValueError):
+    """表达式不合法或超出安全限制"""
+
+
+def _int_bits(value: Any) -> int:
+    return abs(value).bit_length() if isinstance(value, int) else 0
+
+
+def _checked_mul(a, b):
+    # 列表乘整数是重复拼接（[0] * 10**8 会分配上亿个元素），不是数学运算
+    if isinstance(a, (list, tuple)) or isinstance(b, (list, tuple)):
+        raise CalculationError("不支持列表乘法")
+    if isinstance(a, int) and isinstance(b, int) and _int_bits(a) + _int_bits(b) > MAX_INT_BITS:
+        raise CalculationError(f"结果过大（超过 {MAX_INT_BITS} 位）")
+    return operator.mul(a, b)
+
+
+def _checked_pow(a, b):
+    if isinstance(a, int) and isinstance(b, int) and b > 0 and abs(a) > 1:
+        if b > MAX_INT_BITS or b * _int_bits(a) > MAX_INT_BITS:
+            raise CalculationError(f"乘方结果过大（超过 {MAX_INT_BITS} 位）")
+    if isinstance(a, float) or isinstance(b, float):
+        return math.pow(a, b)
+    return operator.pow(a, b)
+
+
+def _checked_pow3(a, b, mod=None):
+    if mod is None:
+        return _checked_pow(a, b)
+    # 模幂不会产生大数
+    return pow(a, b, mod)
+
+
+def _round_digits(ndigits):
+    # 整数按很大的负 ndigits 取整时耗时随位数超线性增长，NumPy 同样很慢
+    if ndigits is not None and abs(ndigits) > MAX_ROUND_DIGITS:
+        raise CalculationError(f"round 的位数不能超过 {MAX_ROUND_DIGITS}")
+    return ndigits
+
+
+def _checked_round(x, ndigits=None):
+    return round(x, _round_digits(ndigits))
+
+
+def _checked_factorial(n):
+    if isinstance(n, float) and n.is_integer():
+        n = int(n)
+    if not isinstance(n, int) or n < 0:
+        raise CalculationError("factorial 只接受非负整数")
+    if n > MAX_FACTORIAL:
+        raise CalculationError(f"factorial 参数不能超过 {MAX_FACTORIAL}")
+    return math.factorial(n)
+
+
+def _checked_comb(n, k):
+    if max(n, k) > 10 * MAX_FACTORIAL:
+        raise CalculationError("comb/perm 参数过大")
+    return math.comb(n, k)
+
+
+def _checked_perm(n, k=None):
+    if max(n, k or 0) > 10 * MAX_FACTORIAL:
+        raise CalculationError("comb/perm 参数过大")
+    return math.perm(n, k)
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _checked_mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _checked_pow,
+}
+
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+# 标量函数
+MATH_FUNCTIONS: Dict[str, Callable] = {
+    "abs": abs,
+    "round": _checked_round,
+    "min": min,
+    "max": max,
+    "sum": lambda *args: sum(args[0]) if len(args) == 1 and isinstance(args[0], (list, tuple)) else sum(args),
+    "pow": _checked_pow3,
+    # 数学函数
+    "sqrt": math.sqrt,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "atan2": math.atan2,
+    "sinh": math.sinh,
+    "cosh": math.cosh,
+    "tanh": math.tanh,
+    "log": math.log,
+    "log10": math.log10,
+    "log2": math.log2,
+    "exp": math.exp,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "degrees": math.degrees,
+    "radians": math.radians,
+    "hypot": math.hypot,
+    "gcd": math.gcd,
+    "factorial": _checked_factorial,
+    "comb": _checked_comb,
+    "perm": _checked_perm,
+}
+
+# 常量
+CONSTANTS = {
+    "pi": math.pi,
+    "e": math.e,
+    "tau": math.tau,
+}
+
+# 向量化求值时对应的 NumPy 函数（逐元素语义一致）
+NUMPY_FUNCTIONS = {
+    "abs": "abs", "sqrt": "sqrt", "sin": "sin", "cos": "cos", "tan": "tan",
+    "asin": "arcsin", "acos": "arccos", "atan": "arctan", "atan2": "arctan2",
+    "sinh": "sinh", "cosh": "cosh", "tanh": "tanh", "log10": "log10", "log2": "log2",
+    "exp": "exp", "floor": "floor", "ceil": "ceil", "degrees": "degrees", "radians": "radians",
+    "hypot": "hypot", "min": "minimum", "max": "maximum", "pow": "power",
+}
+
+Evaluator = Callable[[Dict[str, Any]], Any]
+
+
+def _compile_node(node: ast.AST, variables: frozenset) -> Evaluator:
+    """将 AST 节点编译为求值闭包"""
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body, variables)
+    
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise CalculationError(f"不支持的常量: {node.value!r}")
+        value = node.value
+        if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+            raise CalculationError("数字过大")
+        return lambda env: value
+    
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in variables:
+            return lambda env: env[name]
+        if name in CONSTANTS:
+            value = CONSTANTS[name]
+            return lambda env: value
+        raise CalculationError(f"未知名称: {name}")
+    
+    if isinstance(node, ast.BinOp):
+        op = BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise CalculationError(f"不支持的运算符: {type(node.op).__name__}")
+        left = _compile_node(node.left, variables)
+        right = _compile_node(node.right, variables)
+        return lambda env: op(left(env), right(env))
+    
+    if isinstance(node, ast.UnaryOp):
+        op = UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise CalculationError(f"不支持的运算符: {type(node.op).__name__}")
+        operand = _compile_node(node.operand, variables)
+        return lambda env: op(operand(env))
+    
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise CalculationError("只支持调用内置数学函数（不支持关键字参数）")
+        name = node.func.id
+        if name not in MATH_FUNCTIONS:
+            raise CalculationError(f"未知函数: {name}")
+        args = [_compile_node(arg, variables) for arg in node.args]
+        return lambda env: env["__functions__"][name](*(arg(env) for arg in args))
+    
+    if isinstance(node, (ast.List, ast.Tuple)):
+        items = [_compile_node(item, variables) for item in node.elts]
+        return lambda env: [item(env) for item in items]
+    
+    raise CalculationError(f"不支持的语法: {type(node).__name__}")
+
+
+@lru_cache(maxsize=512)
+def compile_expression(expression: str, variables: frozenset = frozenset()) -> Evaluator:
+    """
+    解析并编译表达式（结果缓存，相同表达式只编译一次）
+    
+    Args:
+        expression: 数学表达式，支持 ^ 作为乘方
+        variables: 允许出现的变量名
+    
+    Returns:
+        求值函数 env -> 结果
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise CalculationError(f"表达式过长（超过 {MAX_EXPRESSION_LENGTH} 字符）")
+    
+    source = expression.strip().replace("^", "**").replace("×", "*").replace("÷", "/")
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise CalculationError(f"语法错误: {e.msg}")
+    
+    node_count = sum(1 for _ in ast.walk(tree))
+    if node_count > MAX_NODES:
+        raise CalculationError(f"表达式过于复杂（超过 {MAX_NODES} 个节点）")
+    
+    return _compile_node(tree, variables)
+
+
+def _scalar_env(extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    env = {"__functions__": MATH_FUNCTIONS}
+    if extra:
+        env.update(extra)
+    return env
+
+
+def _numpy_functions(np) -> Dict[str, Callable]:
+    """构造向量化函数表（无对应 NumPy 函数的退化为逐元素调用）"""
+    functions = dict(MATH_FUNCTIONS)
+    for name, np_name in NUMPY_FUNCTIONS.items():
+        functions[name] = getattr(np, np_name)
+    functions["log"] = lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base)
+    functions["round"] = lambda x, n=0: np.round(x, _round_digits(n))
+    functions["factorial"] = np.vectorize(_checked_factorial, otypes=[object])
+    functions["pow"] = lambda a, b, mod=None: np.power(a, b) if mod is None else np.mod(np.power(a, b), mod)
+    return functions
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e16:
+        return str(int(value))
+    if hasattr(value, "item"):
+        return _format_value(value.item())
+    return str(value)
+
+
+def evaluate(expression: str) -> Any:
+    """安全计算单个表达式"""
+    return compile_expression(expression.lower())(_scalar_env())
+
+
+def evaluate_batch(expressions: List[str]) -> List[Any]:
+    """批量计算表达式，单个失败不影响其他（失败项返回 CalculationError）"""
+    if len(expressions) > MAX_BATCH:
+        raise CalculationError(f"单次最多计算 {MAX_BATCH} 个表达式")
+    results = []
+    for expression in expressions:
+        try:
+            results.append(evaluate(expression))
+        except (ArithmeticError, ValueError, TypeError) as e:
+            results.append(e if isinstance(e, CalculationError) else CalculationError(str(e)))
+    return results
+
+
+def evaluate_vector(expression: str, variable: str, values: List[float]) -> List[Any]:
+    """
+    在一组取值上计算表达式（有 NumPy 时整体向量化，否则逐元素调用编译后的表达式）
+    """
+    if not variable.isidentifier() or variable.startswith("_") or variable.lower() in CONSTANTS or variable.lower() in MATH_FUNCTIONS:
+        raise CalculationError(f"无效的变量名: {variable}")
+    if len(values) > MAX_VALUES:
+        raise CalculationError(f"取值数量不能超过 {MAX_VALUES}")
+    
+    variable = variable.lower()
+    evaluator = compile_expression(expression.lower(), frozenset([variable]))
+    
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    
+    if np is not None:
+        array = np.asarray(values, dtype=float)
+        env = {"__functions__": _numpy_functions(np), variable: array}
+        with np.errstate(all="ignore"):
+            result = evaluator(env)
+        return np.broadcast_to(result, array.shape).tolist()
+    
+    results = []
+    for value in values:
+        try:
+            results.append(evaluator(_scalar_env({variable: value})))
+        except (ArithmeticError, ValueError) as e:
+            results.append(CalculationError(str(e)))
+    return results
+
+
+def make_range(start: float, stop: float, step: float = 1) -> List[float]:
+    """生成 [start, stop] 闭区间上的取值（按 step 递增）"""
+    if step == 0:
+        raise CalculationError("step 不能为 0")
+    count = int(math.floor((stop - start) / step + 1e-9)) + 1
+    if count <= 0:
+        return []
+    if count > MAX_VALUES:
+        raise CalculationError(f"取值数量不能超过 {MAX_VALUES}")
+    return [round(start + i * step, 12) for i in range(count)]
+
+
+# 函数定义（OpenAI Function Calling 格式），注册时无需实例化工具即可读取
+FUNCTIONS = [
+    {
+        "name": "calculate",
+        "description": (
+            "执行数学计算（支持基本运算、乘方、三角函数、对数、阶乘等）。"
+            "可一次计算多个表达式（expressions），或在变量的一组取值/区间上批量求值（variable + values 或 start/stop/step），"
+            "适合制表类计算，一次调用完成"
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "expression": {
+                    "type": "string",
+                    "description": "数学表达式，如 '2 + 3 * 4'、'sin(pi/2)'；配合 variable 时可包含变量，如 'x**2 + 1'"
+                },
+                "expressions": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "要批量计算的多个表达式"
+                },
+                "variable": {
+                    "type": "string",
+                    "description": "表达式中的变量名，如 'x'"
+                },
+                "values": {
+                    "type": "array",
+                    "items": {"type": "number"},
+                    "description": "变量的取值列表"
+                },
+                "start": {
+                    "type": "number",
+                    "description": "变量取值区间起点（与 stop/step 一起使用）"
+                },
+                "stop": {
+                    "type": "number",
+                    "description": "变量取值区间终点（包含）"
+                },
+                "step": {
+                    "type": "number",
+                    "description": "变量取值步长（默认1）"
+                }
+            },
+            "required": []
+        }
+    },
+    {
+        "name": "get_current_time",
+        "description": "获取当前时间",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "format": {
+                    "type": "string",
+                    "description": "时间格式（默认: '%Y-%m-%d %H:%M:%S'）"
+                }
+            },
+            "required": []
+        }
+    }
+]
+
 
 class CalculatorTool(Tool):
     """计算器和实用工具"""
@@ -20,76 +401,71 @@ class CalculatorTool(Tool):
         self.register_function("get_current_time", self.get_current_time)
     
     def get_functions(self) -> List[dict]:
-        return [
-            {
-                "name": "calculate",
-                "description": "执行数学计算（支持基本运算、三角函数、对数等）",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "expression": {
-                            "type": "string",
-                            "description": "数学表达式，如 '2 + 3 * 4' 或 'sin(pi/2)'"
-                        }
-                    },
-                    "required": ["expression"]
-                }
-            },
-            {
-                "name": "get_current_time",
-                "description": "获取当前时间",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "format": {
-                            "type": "string",
-                            "description": "时间格式（默认: '%Y-%m-%d %H:%M:%S'）"
-                        }
-                    },
-                    "required": []
-                }
-            }
-        ]
+        return FUNCTIONS
     
-    def calculate(self, expression: str) -> ToolResult:
+    @tool_function(executor="process", timeout=30)
+    def calculate(
+        self,
+        expression: Optional[str] = None,
+        expressions: Optional[List[str]] = None,
+        variable: Optional[str] = None,
+        values: Optional[List[float]] = None,
+        start: Optional[float] = None,
+        stop: Optional[float] = None,
+        step: float = 1
+    ) -> ToolResult:
         """计算数学表达式"""
         try:
-            # 安全的数学环境
-            safe_dict = {
-                "abs": abs,
-                "round": round,
-                "min": min,
-                "max": max,
-                "sum": sum,
-                "pow": pow,
-                # 数学函数
-                "sqrt": math.sqrt,
-                "sin": math.sin,
-                "cos": math.cos,
-                "tan": math.tan,
-                "log": math.log,
-                "log10": math.log10,
-                "exp": math.exp,
-                "floor": math.floor,
-                "ceil": math.ceil,
-                # 常量
-                "pi": math.pi,
-                "e": math.e,
-            }
+            # 批量表达式
+            if expressions:
+                batch = list(expressions) + ([expression] if expression else [])
+                results = evaluate_batch(batch)
+                lines = []
+                for expr, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        lines.append(f"{expr} → 错误: {result}")
+                    else:
+                        lines.append(f"{expr} = {_format_value(result)}")
+                logger.info("批量计算完成", count=len(results))
+                return ToolResult(success=True, output="\n".join(lines))
+            
+            if not expression:
+                return ToolResult(success=False, output="", error="请提供 expression 或 expressions")
             
-            # 清理表达式（只保留安全字符）
-            cleaned = re.sub(r'[^0-9+\-*/().,\sa-z]', '', expression.lower())
+            # 向量化求值
+            if variable:
+                if values is None:
+                    if start is None or stop is None:
+                        return ToolResult(success=False, output="", error="请提供 values，或 start 和 stop")
+                    values = make_range(start, stop, step)
+                results = evaluate_vector(expression, variable, values)
+                
+                rows = [f"{variable} | {expression}"]
+                for value, result in list(zip(values, results))[:MAX_DISPLAY_ROWS]:
+                    text = f"错误: {result}" if isinstance(result, Exception) else _format_value(result)
+                    rows.append(f"{_format_value(value)} | {text}")
+                if len(values) > MAX_DISPLAY_ROWS:
+                    numeric = [r for r in results if isinstance(r, (int, float)) and math.isfinite(r)]
+                    rows.append(f"...（共 {len(values)} 个取值，仅显示前 {MAX_DISPLAY_ROWS} 个）")
+                    if numeric:
+                        rows.append(
+                            f"汇总: min={_format_value(min(numeric))}, max={_format_value(max(numeric))}, "
+                            f"sum={_format_value(sum(numeric))}, mean={_format_value(sum(numeric) / len(numeric))}"
+                        )
+                logger.info("向量化计算完成", expression=expression, count=len(values))
+                return ToolResult(success=True, output="\n".join(rows))
             
-            # 计算
-            result = eval(cleaned, {"__builtins__": {}}, safe_dict)
+            # 单个表达式
+            result = evaluate(expression)
             
-            logger.info("计算完成", expression=expression, result=result)
-            return ToolResult(success=True, output=f"{expression} = {result}")
+            logger.info("计算完成", expression=expression, result=_format_value(result)[:100])
+            return ToolResult(success=True, output=f"{expression} = {_format_value(result)}")
         
         except Exception as e:
             logger.error("计算失败", expression=expression, error=str(e))
             return ToolResult(success=False, output="", error=f"计算错误: {str(e)}")
     
+    @tool_function(executor="inline")
     def get_current_time(self, format: str = "%Y-%m-%d %H:%M:%S") -> ToolResult:
         """获取当前时间"""
         try:
@@ -0,0 +1,272 @@
+"""
+工作区片段索引 - 按代码和 Markdown 结构分块，BM25 检索相关片段
+
+- 分块边界：Markdown 按标题（忽略代码块内的 #），YAML/TOML/INI 按顶层键或节（连同上方的注释），
+  其他代码和文本按空行后的顶格行（函数、类、段落）；相邻的小块合并，超长的块在空行处拆开
+- 每个片段记录所在文件、行号范围和标题（Markdown 标题路径，或代码块的第一行），
+  路径和标题也参与打分，“数据库在哪里配置”可以直接命中 config.yaml 中的对应段落
+- 增量更新：复用 WorkspaceIndex 的元数据，每次同步重新 stat 文件，大小和 mtime 不变时不重新读取，
+  内容哈希不变时不重新分块
+"""
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from pathlib import Path
+import re
+import threading
+
+from core.tools.base import is_cancelled
+from core.tools.document_extractor import is_supported_document
+from core.tools.workspace_index import WorkspaceIndex
+from core.utils.search_index import BM25Index, tokenize
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MARKDOWN_SUFFIXES = {".md", ".markdown", ".mdx", ".rst"}
+CONFIG_SUFFIXES = {".yaml", ".yml", ".toml", ".ini", ".cfg", ".conf", ".env", ".properties"}
+# 不建立索引的目录
+SKIP_DIRS = {"node_modules", "__pycache__", "venv", ".venv", "dist", "build"}
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+CONFIG_KEY_PATTERN = re.compile(r"^(\[[^\]]+\]|[\w.\"'-]+\s*[:=])")
+TITLE_CHARS = 80
+
+
+@dataclass
+class Chunk:
+    """一个片段"""
+    path: str  # 相对 workspace 的 POSIX 路径
+    start: int  # 起始行号（从 1 开始，含）
+    end: int  # 结束行号（含）
+    title: str
+    text: str
+
+
+def _markdown_units(lines: List[str]) -> List[Tuple[int, str]]:
+    """Markdown 的分块起点 [(行下标, 标题路径)]"""
+    units = [(0, "")]
+    headings: List[Tuple[int, str]] = []  # (级别, 标题)
+    in_fence = False
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith(("```", "~~~")):
+            in_fence = not in_fence
+            continue
+        match = None if in_fence else HEADING_PATTERN.match(line)
+        if match is None:
+            continue
+        level = len(match.group(1))
+        headings = [h for h in headings if h[0] < level] + [(level, match.group(2))]
+        title = " > ".join(h[1] for h in headings)
+        if i == 0:
+            units[0] = (0, title)
+        else:
+            units.append((i, title))
+    return units
+
+
+def _block_units(lines: List[str], config: bool) -> List[Tuple[int, str]]:
+    """代码、配置和文本的分块起点 [(行下标, 标题)]"""
+    starts = [0]
+    for i in range(1, len(lines)):
+        line = lines[i]
+        if not line.strip() or line[0].isspace():
+            continue
+        if config:
+            if not CONFIG_KEY_PATTERN.match(line):
+                continue
+            # 顶层键上方紧挨着的注释属于同一块
+            start = i
+            while start > 0 and lines[start - 1].startswith(("#", ";")):
+                start -= 1
+            if start > starts[-1]:
+                starts.append(start)
+        elif not lines[i - 1].strip():
+            starts.append(i)
+    units = []
+    for start in starts:
+        first = next((line.strip() for line in lines[start:] if line.strip() and not line.startswith(("#", ";"))), "")
+        units.append((start, first[:TITLE_CHARS]))
+    return units
+
+
+def split_chunks(path: str, text: str, max_lines: int = 60, max_chars: int = 3000) -> List[Chunk]:
+    """
+    按结构把文件内容分成片段
+    
+    Args:
+        path: 相对 workspace 的路径（决定分块方式）
+        text: 文件内容
+        max_lines: 每个片段的最大行数
+        max_chars: 每个片段的最大字符数
+    """
+    lines = text.splitlines()
+    if not lines:
+        return []
+    suffix = Path(path).suffix.lower()
+    if suffix in MARKDOWN_SUFFIXES:
+        units = _markdown_units(lines)
+    else:
+        units = _block_units(lines, config=suffix in CONFIG_SUFFIXES)
+    
+    # 结构单元 [(起始, 结束, 标题)]，超长的在最后一个空行处拆开
+    pieces: List[Tuple[int, int, str]] = []
+    for index, (start, title) in enumerate(units):
+        end = units[index + 1][0] if index + 1 < len(units) else len(lines)
+        while end - start > max_lines or sum(len(line) + 1 for line in lines[start:end]) > max_chars:
+            limit = start + 1
+            size = 0
+            while limit < end and limit - start < max_lines and size + len(lines[limit]) < max_chars:
+                size += len(lines[limit]) + 1
+                limit += 1
+            split = next((i for i in range(limit - 1, start, -1) if not lines[i].strip()), limit)
+            pieces.append((start, split, title))
+            start = split
+        pieces.append((start, end, title))
+    
+    # 合并相邻的小单元
+    chunks: List[Chunk] = []
+    current: Optional[List] = None  # [起始, 结束, 标题]
+    for start, end, title in pieces:
+        if not any(line.strip() for line in lines[start:end]):
+            continue  # 拆分超长单元剩下的空行：并入下一单元会让合并后的片段沿用错误的标题
+        if current is not None and (
+            end - current[0] <= max_lines
+            and sum(len(line) + 1 for line in lines[current[0]:end]) <= max_chars
+        ):
+            current[1] = end
+            continue
+        if current is not None:
+            chunks.append(_make_chunk(path, lines, *current))
+        current = [start, end, title]
+    if current is not None:
+        chunks.append(_make_chunk(path, lines, *current))
+    return [chunk for chunk in chunks if chunk.text.strip()]
+
+
+def _make_chunk(path: str, lines: List[str], start: int, end: int, title: str) -> Chunk:
+    # 去掉首尾空行，行号随之调整
+    while start < end - 1 and not lines[start].strip():
+        start += 1
+    while end > start + 1 and not lines[end - 1].strip():
+        end -= 1
+    return Chunk(path, start + 1, end, title, "\n".join(lines[start:end]))
+
+
+class ChunkIndex:
+    """工作区片段索引（线程安全，多个会话共享）"""
+    
+    def __init__(
+        self,
+        workspace_index: WorkspaceIndex,
+        max_chunk_lines: int = 60,
+        max_chunk_chars: int = 3000,
+        max_file_bytes: int = 1024 * 1024
+    ):
+        """
+        Args:
+            workspace_index: 工作区元数据索引（提供文件列表和缓存的内容哈希）
+            max_chunk_lines: 每个片段的最大行数
+            max_chunk_chars: 每个片段的最大字符数
+            max_file_bytes: 超过该大小的文件不建立索引
+        """
+        self.workspace_index = workspace_index
+        self.max_chunk_lines = max_chunk_lines
+        self.max_chunk_chars = max_chunk_chars
+        self.max_file_bytes = max_file_bytes
+        
+        self.index = BM25Index()
+        self._chunks: Dict[Tuple[str, int], Chunk] = {}
+        self._files: Dict[str, Tuple[str, int]] = {}  # 路径 -> (内容哈希, 片段数)
+        self._lock = threading.Lock()
+    
+    def _indexable(self, path: str, size: int) -> bool:
+        parts = path.split("/")
+        if any(part.startswith(".") or part in SKIP_DIRS for part in parts[:-1]) or parts[-1].startswith("."):
+            return False
+        return size <= self.max_file_bytes and not is_supported_document(Path(path))
+    
+    def sync(self) -> Dict[str, int]:
+        """
+        同步工作区文件：只重新分块内容哈希发生变化的文件
+        
+        先重新 stat 所有文件（只比较大小和 mtime），工具之外原地修改的文件也会重新分块。
+        被取消时保留已完成的部分，下次调用继续。
+        
+        Returns:
+            {"indexed": 重新分块的文件数, "removed": 移除的文件数}
+        """
+        root = self.workspace_index.root
+        self.workspace_index.refresh(full=True)
+        entries = self.workspace_index.files(root)
+        indexed = 0
+        cancelled = False
+        with self._lock:
+            current = set()
+            for entry in entries:
+                if not self._indexable(entry.path, entry.size):
+                    continue
+                current.add(entry.path)
+                digest = self.workspace_index.entry_hash(entry)
+                if digest is None or self._files.get(entry.path, ("", 0))[0] == digest:
+                    continue
+                if is_cancelled():
+                    cancelled = True
+                    break
+                self._drop_locked(entry.path)
+                chunks = self._read_chunks(entry.path)
+                for n, chunk in enumerate(chunks):
+                    self._chunks[(entry.path, n)] = chunk
+                    self.index.add((entry.path, n), tokens=tokenize(f"{chunk.path} {chunk.title}\n{chunk.text}"))
+                self._files[entry.path] = (digest, len(chunks))
+                indexed += 1
+            removed = [] if cancelled else [path for path in self._files if path not in current]
+            for path in removed:
+                self._drop_locked(path)
+        
+        if indexed or removed:
+            logger.debug("工作区片段索引已更新", indexed=indexed, removed=len(removed), chunks=len(self._chunks))
+        return {"indexed": indexed, "removed": len(removed)}
+    
+    def _read_chunks(self, path: str) -> List[Chunk]:
+        """读取并分块；二进制或非 UTF-8 文件返回空列表（记录哈希，内容不变时不再读取）"""
+        try:
+            data = (self.workspace_index.root / path).read_bytes()
+        except OSError:
+            return []
+        if b"\0" in data[:8192]:
+            return []
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            return []
+        return split_chunks(path, text, self.max_chunk_lines, self.max_chunk_chars)
+    
+    def _drop_locked(self, path: str):
+        _, count = self._files.pop(path, ("", 0))
+        for n in range(count):
+            self._chunks.pop((path, n), None)
+            self.index.remove((path, n))
+    
+    def search(self, query: str, top_k: int = 5, prefix: str = ".") -> List[Tuple[Chunk, float]]:
+        """
+        检索与 query 最相关的片段（调用前应先 sync）
+        
+        Args:
+            query: 查询文本
+            top_k: 返回的片段数
+            prefix: 只检索该目录（相对 workspace）下的文件
+        """
+        with self._lock:  # sync 会并发修改 BM25 索引
+            scores = self.index.scores(query)
+        if prefix not in (".", ""):
+            prefix = prefix.strip("/")
+            scores = {key: score for key, score in scores.items()
+                      if key[0] == prefix or key[0].startswith(prefix + "/")}
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        with self._lock:
+            return [(self._chunks[key], score) for key, score in ranked if key in self._chunks]
+    
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"files": sum(1 for _, count in self._files.values() if count), "chunks": len(self._chunks)}
@@ -0,0 +1,75 @@
+"""代码执行工具 - 在 Docker 沙箱中执行 Python 代码"""
+from typing import List
+import threading
+from core.tools.base import Tool, ToolResult, tool_function
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 函数定义（OpenAI Function Calling 格式），注册时无需实例化工具即可读取
+FUNCTIONS = [
+    {
+        "name": "execute_python",
+        "description": "在Docker沙箱中执行Python代码，用于数据计算、文件处理等",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "code": {
+                    "type": "string",
+                    "description": "要执行的Python代码"
+                }
+            },
+            "required": ["code"]
+        }
+    }
+]
+
+
+class CodeExecutorTool(Tool):
+    """代码执行工具（Docker 客户端和镜像检查推迟到首次执行）"""
+    
+    def __init__(self, sandbox=None):
+        super().__init__("code_executor", "执行Python代码")
+        self._sandbox = sandbox
+        self._lock = threading.Lock()
+        
+        # 注册函数
+        self.register_function("execute_python", self.execute_python)
+    
+    def get_functions(self) -> List[dict]:
+        return FUNCTIONS
+    
+    @property
+    def sandbox(self):
+        """获取 Docker 沙箱（首次访问时连接 Docker 并确保镜像存在）"""
+        with self._lock:
+            if self._sandbox is None:
+                from core.sandbox import DockerSandbox
+                self._sandbox = DockerSandbox()
+            return self._sandbox
+    
+    @tool_function(timeout=300)
+    def execute_python(self, code: str) -> ToolResult:
+        """在沙箱中执行 Python 代码"""
+        try:
+            result = self.sandbox.execute_python(code)
+            return ToolResult(
+                success=result.success,
+                output=result.output,
+                error=result.error
+            )
+        except Exception as e:
+            logger.error("代码执行失败", error=str(e))
+            return ToolResult(success=False, output="", error=str(e))
+    
+    def warm(self):
+        """提前连接 Docker 并检查镜像"""
+        self.sandbox  # 访问属性即完成初始化
+    
+    def close(self):
+        """关闭 Docker 客户端"""
+        with self._lock:
+            sandbox, self._sandbox = self._sandbox, None
+        if sandbox is not None:
+            sandbox.cleanup()
@@ -0,0 +1,295 @@
+"""文档文本提取 - 按页/工作表流式提取 PDF、DOCX、XLSX，并按内容哈希缓存到磁盘"""
+from typing import Dict, Iterator, List, Optional
+from dataclasses import dataclass
+from pathlib import Path
+import json
+import os
+import shutil
+import tempfile
+import threading
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# DOCX 没有稳定的分页信息，按段落块划分提取单元
+DOCX_PARAGRAPHS_PER_UNIT = 50
+
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".xlsx", ".xlsm"}
+
+# 缓存格式版本（提取方式变化时递增，旧缓存视为不存在）
+CACHE_VERSION = 2
+
+
+@dataclass
+class DocumentPage:
+    """文档的一个提取单元（PDF 页 / DOCX 段落块 / XLSX 工作表）"""
+    number: int  # 从 1 开始
+    label: str
+    text: str
+
+
+def is_supported_document(path: Path) -> bool:
+    """是否为支持提取的文档格式"""
+    return Path(path).suffix.lower() in SUPPORTED_EXTENSIONS
+
+
+def parse_page_ranges(spec: Optional[str], total: int) -> List[int]:
+    """
+    解析页码范围
+    
+    Args:
+        spec: 如 "1-5,8,10-"；为空时表示全部
+        total: 总页数
+    
+    Returns:
+        升序去重的页码列表（从 1 开始）
+    """
+    if not spec or not str(spec).strip():
+        return list(range(1, total + 1))
+    
+    pages = set()
+    for part in str(spec).replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start = int(start_text) if start_text.strip() else 1
+            end = int(end_text) if end_text.strip() else total
+        else:
+            start = end = int(part)
+        if start < 1 or end < start:
+            raise ValueError(f"无效的页码范围: {part}")
+        pages.update(range(start, min(end, total) + 1))
+    return sorted(pages)
+
+
+class DocumentExtractor:
+    """
+    文档文本提取器
+    
+    缓存布局: <cache_dir>/documents/<sha256>/meta.json 及每个单元一个 <n>.txt。
+    PDF 按需提取并逐页缓存；DOCX/XLSX 首次读取时整体提取并缓存。
+    缓存的文档（内容版本）超过 max_entries 时，新建缓存时按最近访问时间淘汰。
+    """
+    
+    def __init__(self, cache_dir: str = "./data/cache", max_entries: int = 200):
+        """
+        Args:
+            cache_dir: 缓存根目录
+            max_entries: 最多缓存的文档内容版本数（0 表示不限）
+        """
+        self.cache_root = Path(cache_dir) / "documents"
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+    
+    def extract(self, path: Path, content_hash: Optional[str], pages: Optional[str] = None) -> Iterator[DocumentPage]:
+        """
+        流式提取文档文本
+        
+        Args:
+            path: 文档路径
+            content_hash: 文档内容哈希（作为缓存键）；为 None（无法计算哈希）时不使用缓存
+            pages: 页码范围，如 "1-5,8"
+        
+        Yields:
+            DocumentPage，按页码顺序
+        """
+        if content_hash is None:
+            with tempfile.TemporaryDirectory(prefix="kortix-document-") as tmp:
+                yield from self._extract(Path(path), Path(tmp), pages)
+            return
+        cache_dir = self.cache_root / content_hash
+        try:
+            os.utime(cache_dir)  # 记录访问时间，淘汰时保留最近使用的文档
+        except OSError:
+            pass
+        yield from self._extract(Path(path), cache_dir, pages)
+    
+    def _extract(self, path: Path, cache_dir: Path, pages: Optional[str]) -> Iterator[DocumentPage]:
+        meta = self._load_meta(cache_dir)
+        if path.suffix.lower() == ".pdf":
+            yield from self._extract_pdf(path, cache_dir, meta, pages)
+            return
+        
+        if meta is None or not meta.get("complete"):
+            units = self._units(path)
+            meta = self._store_units(cache_dir, units)
+            logger.info("文档已提取并缓存", path=str(path), units=len(units))
+        
+        for number in parse_page_ranges(pages, meta["total"]):
+            yield DocumentPage(number, meta["labels"][number - 1], self._read_unit(cache_dir, number))
+    
+    def page_count(self, path: Path, content_hash: Optional[str]) -> int:
+        """获取文档的单元总数（PDF 页数 / DOCX 段落块数 / XLSX 工作表数）"""
+        meta = self._load_meta(self.cache_root / content_hash) if content_hash else None
+        if meta is not None:
+            return meta["total"]
+        if Path(path).suffix.lower() == ".pdf":
+            return len(self._pdf_reader(path).pages)
+        if content_hash is None:
+            return len(self._units(Path(path)))
+        # DOCX/XLSX 整体提取后即可得到单元数
+        for _ in self.extract(path, content_hash, pages="1"):
+            pass
+        return self._load_meta(self.cache_root / content_hash)["total"]
+    
+    # ---------- PDF ----------
+    
+    @staticmethod
+    def _pdf_reader(path: Path):
+        try:
+            from PyPDF2 import PdfReader
+        except ImportError:
+            raise ValueError("读取 PDF 需要安装 PyPDF2")
+        return PdfReader(str(path))
+    
+    def _extract_pdf(self, path: Path, cache_dir: Path, meta: Optional[Dict], pages: Optional[str]) -> Iterator[DocumentPage]:
+        reader = None
+        if meta is None:
+            reader = self._pdf_reader(path)
+            total = len(reader.pages)
+            meta = {"total": total, "labels": [f"第 {i} 页" for i in range(1, total + 1)], "complete": False}
+            self._write_meta(cache_dir, meta)
+        
+        extracted = 0
+        for number in parse_page_ranges(pages, meta["total"]):
+            unit_path = cache_dir / f"{number}.txt"
+            if unit_path.exists():
+                text = unit_path.read_text(encoding="utf-8")
+            else:
+                if reader is None:
+                    reader = self._pdf_reader(path)
+                text = reader.pages[number - 1].extract_text() or ""
+                self._write_unit(cache_dir, number, text)
+                extracted += 1
+            yield DocumentPage(number, meta["labels"][number - 1], text)
+        
+        if extracted:
+            logger.info("PDF 页面已提取并缓存", path=str(path), pages=extracted)
+    
+    # ---------- DOCX / XLSX ----------
+    
+    def _units(self, path: Path) -> List[tuple]:
+        suffix = path.suffix.lower()
+        if suffix == ".docx":
+            return self._docx_units(path)
+        if suffix in (".xlsx", ".xlsm"):
+            return self._xlsx_units(path)
+        raise ValueError(f"不支持的文档格式: {suffix}")
+    
+    @staticmethod
+    def _docx_units(path: Path) -> List[tuple]:
+        try:
+            import docx
+        except ImportError:
+            raise ValueError("读取 DOCX 需要安装 python-docx")
+        
+        from docx.table import Table
+        from docx.text.paragraph import Paragraph
+        
+        # 按正文中的顺序提取段落和表格，表格与其标题、上下文留在同一单元
+        document = docx.Document(str(path))
+        blocks = []
+        for element in document.element.body.iterchildren():
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "p":
+                text = Paragraph(element, document).text
+                if text.strip():
+                    blocks.append(text)
+            elif tag == "tbl":
+                for row in Table(element, document).rows:
+                    blocks.append("\t".join(cell.text.strip() for cell in row.cells))
+        
+        units = []
+        for start in range(0, max(len(blocks), 1), DOCX_PARAGRAPHS_PER_UNIT):
+            chunk = blocks[start:start + DOCX_PARAGRAPHS_PER_UNIT]
+            end = start + len(chunk)
+            units.append((f"段落 {start + 1}-{max(end, start + 1)}", "\n".join(chunk)))
+        return units
+    
+    @staticmethod
+    def _xlsx_units(path: Path) -> List[tuple]:
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("读取 Excel 需要安装 openpyxl")
+        
+        workbook = load_workbook(str(path), read_only=True, data_only=True)
+        units = []
+        try:
+            for sheet in workbook.worksheets:
+                lines = []
+                for row in sheet.iter_rows(values_only=True):
+                    if row is None or all(cell is None for cell in row):
+                        continue
+                    lines.append("\t".join("" if cell is None else str(cell) for cell in row))
+                units.append((f"工作表 {sheet.title}", "\n".join(lines)))
+        finally:
+            workbook.close()
+        return units
+    
+    # ---------- 缓存 ----------
+    
+    @staticmethod
+    def _load_meta(cache_dir: Path) -> Optional[Dict]:
+        try:
+            meta = json.loads((cache_dir / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("version") == CACHE_VERSION else None
+    
+    def _write_meta(self, cache_dir: Path, meta: Dict):
+        self._ensure_dir(cache_dir)
+        meta["version"] = CACHE_VERSION
+        self._atomic_write(cache_dir / "meta.json", json.dumps(meta, ensure_ascii=False))
+    
+    def _ensure_dir(self, cache_dir: Path):
+        """创建缓存目录；新建文档的缓存时淘汰多余的旧缓存"""
+        if cache_dir.exists():
+            return
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        if cache_dir.parent == self.cache_root:
+            self._prune(keep=cache_dir)
+    
+    def _prune(self, keep: Path):
+        """缓存的文档超过 max_entries 时删除最久未访问的（文档每次修改都会产生新的缓存目录）"""
+        if not self.max_entries:
+            return
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_root):
+                if entry.is_dir() and entry.path != str(keep):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        continue
+            excess = len(entries) + 1 - self.max_entries
+            if excess <= 0:
+                return
+            entries.sort()
+            for _, path in entries[:excess]:
+                shutil.rmtree(path, ignore_errors=True)
+        logger.info("文档缓存已淘汰", removed=excess, max_entries=self.max_entries)
+    
+    def _write_unit(self, cache_dir: Path, number: int, text: str):
+        self._ensure_dir(cache_dir)
+        self._atomic_write(cache_dir / f"{number}.txt", text)
+    
+    @staticmethod
+    def _read_unit(cache_dir: Path, number: int) -> str:
+        return (cache_dir / f"{number}.txt").read_text(encoding="utf-8")
+    
+    def _store_units(self, cache_dir: Path, units: List[tuple]) -> Dict:
+        for number, (_, text) in enumerate(units, 1):
+            self._write_unit(cache_dir, number, text)
+        meta = {"total": len(units), "labels": [label for label, _ in units], "complete": True}
+        self._write_meta(cache_dir, meta)
+        return meta
+    
+    def _atomic_write(self, target: Path, text: str):
+        """先写临时文件再替换，避免并发读取到半截内容"""
+        with self._lock:
+            tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, target)
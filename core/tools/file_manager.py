@@ -1,138 +1,209 @@
-"""文件管理工具 - 读写编辑搜索文件"""
-from typing import Optional, List
+"""文件管理工具 - 读写编辑搜索文件，检索相关片段"""
+from typing import Optional, List, Tuple
 import os
 from pathlib import Path
 import re
-from core.tools.base import Tool, ToolResult
+from core.tools.base import Tool, ToolResult, tool_function, run_in_process
+from core.tools.chunk_index import ChunkIndex
+from core.tools.document_extractor import DocumentExtractor, is_supported_document, parse_page_ranges
+from core.tools.workspace_index import WorkspaceIndex
 from core.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+# 函数定义（OpenAI Function Calling 格式），注册时无需实例化工具即可读取
+FUNCTIONS = [
+    {
+        "name": "read_file",
+        "description": "读取文件内容（支持文本文件，以及 PDF、DOCX、XLSX 文档的文本提取）",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "文件路径（相对于workspace）"
+                },
+                "pages": {
+                    "type": "string",
+                    "description": "文档页码范围，如 '1-5,8'（PDF 为页，DOCX 为段落块，XLSX 为工作表）"
+                }
+            },
+            "required": ["path"]
+        }
+    },
+    {
+        "name": "write_file",
+        "description": "写入文件内容（会覆盖现有文件）",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "文件路径"
+                },
+                "content": {
+                    "type": "string",
+                    "description": "文件内容"
+                }
+            },
+            "required": ["path", "content"]
+        }
+    },
+    {
+        "name": "edit_file",
+        "description": "编辑文件（替换指定文本）",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "文件路径"
+                },
+                "old_text": {
+                    "type": "string",
+                    "description": "要替换的文本"
+                },
+                "new_text": {
+                    "type": "string",
+                    "description": "新文本"
+                }
+            },
+            "required": ["path", "old_text", "new_text"]
+        }
+    },
+    {
+        "name": "list_files",
+        "description": "列出目录中的文件",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "目录路径（默认为根目录）"
+                },
+                "recursive": {
+                    "type": "boolean",
+                    "description": "是否递归列出子目录"
+                }
+            },
+            "required": []
+        }
+    },
+    {
+        "name": "search_in_files",
+        "description": "在文件中搜索文本",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "pattern": {
+                    "type": "string",
+                    "description": "搜索模式（正则表达式）"
+                },
+                "path": {
+                    "type": "string",
+                    "description": "搜索路径"
+                }
+            },
+            "required": ["pattern"]
+        }
+    },
+    {
+        "name": "retrieve",
+        "description": (
+            "在工作区文件中检索与问题相关的片段（按代码和 Markdown 结构分块，BM25 排序），"
+            "返回文件路径、行号范围和片段内容。回答“X 在哪里配置/实现/说明”时优先使用，"
+            "一次调用即可定位，无需列出目录再逐个读取整个文件"
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "检索内容（关键词或问题，中英文均可）"
+                },
+                "top_k": {
+                    "type": "integer",
+                    "description": "返回的片段数（默认 5）"
+                },
+                "path": {
+                    "type": "string",
+                    "description": "只在该目录下检索（默认整个 workspace）"
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "delete_file",
+        "description": "删除文件",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "文件路径"
+                }
+            },
+            "required": ["path"]
+        }
+    }
+]
+
+
+def _count_matches(pattern: str, root: str, paths: List[str]) -> List[Tuple[str, int]]:
+    """
+    统计每个文件中正则的匹配数（通过 run_in_process 在进程池中执行）
+    
+    回溯失控的正则在 re 的 C 代码中持有 GIL，放在线程里既无法按时取消，也会拖住整个进程。
+    """
+    regex = re.compile(pattern)
+    counts = []
+    for path in paths:
+        try:
+            content = (Path(root) / path).read_text(encoding='utf-8')
+        except (OSError, UnicodeDecodeError):
+            continue
+        matches = regex.findall(content)
+        if matches:
+            counts.append((path, len(matches)))
+    return counts
+
+
 class FileManagerTool(Tool):
     """文件管理工具"""
     
-    def __init__(self, workspace_dir: str = "./workspace"):
+    def __init__(self, workspace_dir: str = "./workspace", cache_dir: str = "./data/cache",
+                 max_document_pages: int = 20, workspace_index: Optional[WorkspaceIndex] = None,
+                 chunk_index: Optional[ChunkIndex] = None, max_retrieve_chars: int = 6000,
+                 max_cached_documents: int = 200):
         super().__init__("file_manager", "文件读写、编辑、搜索")
         
         self.workspace_dir = Path(workspace_dir).absolute()
         self.workspace_dir.mkdir(parents=True, exist_ok=True)
         
+        # 工作区元数据索引（供 list/search 及 Shell 等工具共享）
+        self.index = workspace_index or WorkspaceIndex(self.workspace_dir)
+        
+        # PDF/DOCX/XLSX 文本提取（按内容哈希缓存）
+        self.extractor = DocumentExtractor(cache_dir, max_entries=max_cached_documents)
+        self.max_document_pages = max_document_pages
+        
+        # 片段检索索引（retrieve 调用时增量同步）
+        self.chunks = chunk_index or ChunkIndex(self.index)
+        self.max_retrieve_chars = max_retrieve_chars
+        
         # 注册函数
         self.register_function("read_file", self.read_file)
         self.register_function("write_file", self.write_file)
         self.register_function("edit_file", self.edit_file)
         self.register_function("list_files", self.list_files)
         self.register_function("search_in_files", self.search_in_files)
+        self.register_function("retrieve", self.retrieve)
         self.register_function("delete_file", self.delete_file)
     
     def get_functions(self) -> List[dict]:
-        return [
-            {
-                "name": "read_file",
-                "description": "读取文件内容",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "文件路径（相对于workspace）"
-                        }
-                    },
-                    "required": ["path"]
-                }
-            },
-            {
-                "name": "write_file",
-                "description": "写入文件内容（会覆盖现有文件）",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "文件路径"
-                        },
-                        "content": {
-                            "type": "string",
-                            "description": "文件内容"
-                        }
-                    },
-                    "required": ["path", "content"]
-                }
-            },
-            {
-                "name": "edit_file",
-                "description": "编辑文件（替换指定文本）",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "文件路径"
-                        },
-                        "old_text": {
-                            "type": "string",
-                            "description": "要替换的文本"
-                        },
-                        "new_text": {
-                            "type": "string",
-                            "description": "新文本"
-                        }
-                    },
-                    "required": ["path", "old_text", "new_text"]
-                }
-            },
-            {
-                "name": "list_files",
-                "description": "列出目录中的文件",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "目录路径（默认为根目录）"
-                        },
-                        "recursive": {
-                            "type": "boolean",
-                            "description": "是否递归列出子目录"
-                        }
-                    },
-                    "required": []
-                }
-            },
-            {
-                "name": "search_in_files",
-                "description": "在文件中搜索文本",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "pattern": {
-                            "type": "string",
-                            "description": "搜索模式（正则表达式）"
-                        },
-                        "path": {
-                            "type": "string",
-                            "description": "搜索路径"
-                        }
-                    },
-                    "required": ["pattern"]
-                }
-            },
-            {
-                "name": "delete_file",
-                "description": "删除文件",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "文件路径"
-                        }
-                    },
-                    "required": ["path"]
-                }
-            }
-        ]
+        return FUNCTIONS
     
     def _get_full_path(self, path: str) -> Path:
         """获取完整路径"""
@@ -142,13 +213,16 @@ class FileManagerTool(Tool):
             raise ValueError("路径必须在workspace目录内")
         return full_path
     
-    def read_file(self, path: str) -> ToolResult:
+    def read_file(self, path: str, pages: Optional[str] = None) -> ToolResult:
         """读取文件"""
         try:
             full_path = self._get_full_path(path)
             if not full_path.exists():
                 return ToolResult(success=False, output="", error=f"文件不存在: {path}")
             
+            if is_supported_document(full_path):
+                return self._read_document(path, full_path, pages)
+            
             content = full_path.read_text(encoding='utf-8')
             logger.info("读取文件", path=path, size=len(content))
             return ToolResult(success=True, output=content)
@@ -157,6 +231,25 @@ class FileManagerTool(Tool):
             logger.error("读取文件失败", path=path, error=str(e))
             return ToolResult(success=False, output="", error=str(e))
     
+    def _read_document(self, path: str, full_path: Path, pages: Optional[str]) -> ToolResult:
+        """提取文档文本，未指定页码时只返回前 max_document_pages 个单元"""
+        content_hash = self.index.content_hash(full_path)
+        total = self.extractor.page_count(full_path, content_hash)
+        
+        if not pages:
+            pages = f"1-{self.max_document_pages}"
+        selected = parse_page_ranges(pages, total)
+        
+        parts = [f"[{path}] 共 {total} 个单元"]
+        for page in self.extractor.extract(full_path, content_hash, pages):
+            parts.append(f"--- {page.label} ---\n{page.text}")
+        
+        if selected and selected[-1] < total:
+            parts.append(f"（还有后续内容，可使用 pages 参数读取，如 '{selected[-1] + 1}-{total}'）")
+        
+        logger.info("读取文档", path=path, pages=len(selected), total=total)
+        return ToolResult(success=True, output="\n\n".join(parts))
+    
     def write_file(self, path: str, content: str) -> ToolResult:
         """写入文件"""
         try:
@@ -164,6 +257,7 @@ class FileManagerTool(Tool):
             full_path.parent.mkdir(parents=True, exist_ok=True)
             
             full_path.write_text(content, encoding='utf-8')
+            self.index.update(full_path)
             logger.info("写入文件", path=path, size=len(content))
             return ToolResult(success=True, output=f"已写入 {len(content)} 字节到 {path}")
         
@@ -185,6 +279,7 @@ class FileManagerTool(Tool):
             
             new_content = content.replace(old_text, new_text, 1)
             full_path.write_text(new_content, encoding='utf-8')
+            self.index.update(full_path)
             
             logger.info("编辑文件", path=path)
             return ToolResult(success=True, output=f"已替换文本: {path}")
@@ -203,45 +298,24 @@ class FileManagerTool(Tool):
             if not full_path.is_dir():
                 return ToolResult(success=False, output="", error=f"不是目录: {path}")
             
-            files = []
-            if recursive:
-                for item in full_path.rglob("*"):
-                    rel_path = item.relative_to(self.workspace_dir)
-                    files.append(str(rel_path))
-            else:
-                for item in full_path.iterdir():
-                    rel_path = item.relative_to(self.workspace_dir)
-                    files.append(str(rel_path))
+            files = [str(Path(p)) for p in self.index.list(full_path, recursive=recursive)]
             
             logger.info("列出文件", path=path, count=len(files))
-            return ToolResult(success=True, output="\n".join(sorted(files)))
+            return ToolResult(success=True, output="\n".join(files))
         
         except Exception as e:
             logger.error("列出文件失败", path=path, error=str(e))
             return ToolResult(success=False, output="", error=str(e))
     
+    @tool_function(timeout=60)
     def search_in_files(self, pattern: str, path: str = ".") -> ToolResult:
         """搜索文件内容"""
         try:
             full_path = self._get_full_path(path)
-            regex = re.compile(pattern)
-            results = []
-            
-            if full_path.is_file():
-                files = [full_path]
-            else:
-                files = list(full_path.rglob("*"))
-            
-            for file in files:
-                if file.is_file():
-                    try:
-                        content = file.read_text(encoding='utf-8')
-                        matches = regex.findall(content)
-                        if matches:
-                            rel_path = file.relative_to(self.workspace_dir)
-                            results.append(f"{rel_path}: {len(matches)} 个匹配")
-                    except:
-                        pass
+            re.compile(pattern)  # 语法错误直接返回，不占用进程池
+            paths = [entry.path for entry in self.index.files(full_path)]
+            counts = run_in_process(_count_matches, pattern, str(self.workspace_dir), paths)
+            results = [f"{Path(rel)}: {count} 个匹配" for rel, count in counts]
             
             logger.info("搜索文件", pattern=pattern, matches=len(results))
             return ToolResult(success=True, output="\n".join(results) if results else "未找到匹配")
@@ -250,6 +324,40 @@ class FileManagerTool(Tool):
             logger.error("搜索失败", pattern=pattern, error=str(e))
             return ToolResult(success=False, output="", error=str(e))
     
+    @tool_function(timeout=60)
+    def retrieve(self, query: str, top_k: int = 5, path: str = ".") -> ToolResult:
+        """检索相关片段，总长度不超过 max_retrieve_chars"""
+        try:
+            full_path = self._get_full_path(path)
+            self.chunks.sync()
+            prefix = full_path.relative_to(self.workspace_dir).as_posix()
+            results = self.chunks.search(query, top_k=max(1, min(int(top_k), 20)), prefix=prefix)
+            if not results:
+                return ToolResult(success=True, output="未找到相关片段")
+            
+            parts = []
+            budget = self.max_retrieve_chars
+            for rank, (chunk, score) in enumerate(results, 1):
+                header = f"[{rank}] {Path(chunk.path)}:{chunk.start}-{chunk.end}"
+                if chunk.title:
+                    header += f"  {chunk.title}"
+                text = chunk.text
+                if len(header) + len(text) > budget:
+                    if parts:
+                        break
+                    text = text[:max(0, budget - len(header))] + "\n...（片段已截断）"
+                parts.append(f"{header}\n{text}")
+                budget -= len(header) + len(text)
+            
+            stats = self.chunks.stats
+            logger.info("检索片段", query=query, results=len(parts), **stats)
+            parts.append(f"（共索引 {stats['files']} 个文件、{stats['chunks']} 个片段；需要更多上下文时用 read_file 读取）")
+            return ToolResult(success=True, output="\n\n".join(parts))
+        
+        except Exception as e:
+            logger.error("检索失败", query=query, error=str(e))
+            return ToolResult(success=False, output="", error=str(e))
+    
     def delete_file(self, path: str) -> ToolResult:
         """删除文件"""
         try:
@@ -258,6 +366,7 @@ class FileManagerTool(Tool):
                 return ToolResult(success=False, output="", error=f"文件不存在: {path}")
             
             full_path.unlink()
+            self.index.remove(full_path)
             logger.info("删除文件", path=path)
             return ToolResult(success=True, output=f"已删除: {path}")
         
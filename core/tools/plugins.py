@@ -0,0 +1,316 @@
+"""工具插件 - 通过入口点或配置发现工具，按静态函数定义注册，首次调用时再实例化"""
+from typing import Any, Callable, Dict, List, Optional, Union
+from dataclasses import dataclass, field
+from importlib import import_module
+from pathlib import Path
+import os
+import threading
+import time
+from core.tools.base import Tool, ToolResult, ExecutionSpec, execution_specs
+from core.tools.workspace_index import WorkspaceIndex
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 第三方工具包通过该入口点组暴露 ToolSpec
+ENTRY_POINT_GROUP = "kortix.tools"
+
+
+class ToolContext:
+    """工具构建上下文：配置 + 工具之间共享的资源（按需创建）"""
+    
+    def __init__(self, config):
+        self.config = config
+        self._workspace_index: Optional[WorkspaceIndex] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def workspace_dir(self) -> str:
+        return self.config.get('tools.file_manager.workspace_dir', './workspace')
+    
+    @property
+    def workspace_index(self) -> WorkspaceIndex:
+        """文件管理、表格查询和 Shell 工具共享的工作区索引"""
+        with self._lock:
+            if self._workspace_index is None:
+                root = Path(self.workspace_dir).absolute()
+                root.mkdir(parents=True, exist_ok=True)
+                self._workspace_index = WorkspaceIndex(root)
+            return self._workspace_index
+
+
+@dataclass
+class ToolSpec:
+    """
+    工具的静态描述
+    
+    Attributes:
+        name: 工具名
+        description: 工具描述（用于系统提示词）
+        functions: 函数定义列表（OpenAI 格式），注册时直接使用，无需实例化工具
+        factory: 创建工具实例的函数 factory(context) -> Tool，或 "模块:属性" 形式的导入路径
+        executions: 函数名 -> 执行元数据
+        enabled: 根据配置判断是否启用（默认读取 tools.<name>.enabled）
+        warm: 是否在启动后于后台线程中预先创建实例
+    """
+    name: str
+    description: str
+    functions: List[Dict[str, Any]]
+    factory: Union[str, Callable[[ToolContext], Tool]]
+    executions: Dict[str, ExecutionSpec] = field(default_factory=dict)
+    enabled: Optional[Callable[[Any], bool]] = None
+    warm: bool = False
+
+
+def load_object(path: str) -> Any:
+    """按 "模块:属性" 导入对象"""
+    module_name, _, attr = path.partition(":")
+    obj = import_module(module_name)
+    for part in filter(None, attr.split(".")):
+        obj = getattr(obj, part)
+    return obj
+
+
+class LazyTool(Tool):
+    """
+    惰性工具代理
+    
+    注册时只暴露 ToolSpec 中的静态函数定义；首次执行（或后台预热）时才创建真正的工具实例。
+    """
+    
+    def __init__(self, spec: ToolSpec, context: ToolContext):
+        super().__init__(spec.name, spec.description)
+        self.spec = spec
+        self.context = context
+        self._instance: Optional[Tool] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def built(self) -> bool:
+        return self._instance is not None
+    
+    def get_functions(self) -> List[Dict[str, Any]]:
+        return self.spec.functions
+    
+    def get_execution_spec(self, function_name: str) -> ExecutionSpec:
+        return self.spec.executions.get(function_name) or ExecutionSpec()
+    
+    def instance(self) -> Tool:
+        """获取（必要时创建）真正的工具实例"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    factory = load_object(self.spec.factory) if isinstance(self.spec.factory, str) else self.spec.factory
+                    self._instance = factory(self.context)
+                    logger.info(
+                        "工具已初始化",
+                        tool=self.name,
+                        elapsed_ms=round((time.perf_counter() - started) * 1000)
+                    )
+        return self._instance
+    
+    def execute(self, function_name: str, **kwargs) -> ToolResult:
+        try:
+            tool = self.instance()
+        except Exception as e:
+            logger.error("工具初始化失败", tool=self.name, error=str(e))
+            return ToolResult(success=False, output="", error=f"工具 {self.name} 初始化失败: {str(e)}")
+        return tool.execute(function_name, **kwargs)
+    
+    def warm(self):
+        """在后台线程中创建实例并预热（如连接 Docker），不阻塞启动"""
+        def run():
+            try:
+                self.instance().warm()
+            except Exception as e:
+                logger.warning("工具预热失败", tool=self.name, error=str(e))
+        
+        threading.Thread(target=run, name=f"kortix-warm-{self.name}", daemon=True).start()
+    
+    def close(self):
+        if self._instance is not None:
+            self._instance.close()
+    
+    def __reduce__(self):
+        # 进程池执行时序列化真正的工具实例
+        return self.instance().__reduce__()
+
+
+# ---------- 内置工具 ----------
+
+def _build_file_manager(context: ToolContext) -> Tool:
+    from core.tools.chunk_index import ChunkIndex
+    from core.tools.file_manager import FileManagerTool
+    return FileManagerTool(
+        context.workspace_dir,
+        cache_dir=context.config.cache_dir,
+        max_document_pages=context.config.get('tools.file_manager.max_document_pages', 20),
+        max_cached_documents=context.config.get('tools.file_manager.max_cached_documents', 200),
+        workspace_index=context.workspace_index,
+        chunk_index=ChunkIndex(
+            context.workspace_index,
+            max_chunk_lines=context.config.get('tools.file_manager.retrieval.max_chunk_lines', 60),
+            max_chunk_chars=context.config.get('tools.file_manager.retrieval.max_chunk_chars', 3000),
+            max_file_bytes=context.config.get('tools.file_manager.retrieval.max_file_bytes', 1048576)
+        ),
+        max_retrieve_chars=context.config.get('tools.file_manager.retrieval.max_result_chars', 6000)
+    )
+
+
+def _build_table_query(context: ToolContext) -> Tool:
+    from core.tools.table_query import TableQueryTool
+    return TableQueryTool(
+        context.workspace_dir,
+        workspace_index=context.workspace_index,
+        chunk_size=context.config.get('tools.table_query.chunk_size', 200000)
+    )
+
+
+def _build_web_search(context: ToolContext) -> Tool:
+    from core.tools.web_search import WebSearchTool, SearchCache
+    config = context.config
+    search_cache = None
+    if config.get('tools.web_search.cache.enabled', True):
+        search_cache = SearchCache(
+            str(Path(config.cache_dir) / "search_cache.db"),
+            search_ttl=config.get('tools.web_search.cache.search_ttl', 86400),
+            news_ttl=config.get('tools.web_search.cache.news_ttl', 1800),
+            stale_ttl=config.get('tools.web_search.cache.stale_ttl', 3600),
+            max_entries=config.get('tools.web_search.cache.max_entries', 5000)
+        )
+    return WebSearchTool(
+        config.get('tools.web_search.api_key'),
+        base_url=config.get('tools.web_search.base_url'),
+        max_concurrency=config.get('tools.web_search.max_concurrency', 5),
+        cache=search_cache,
+        adaptive=config.get('tools.web_search.adaptive.enabled', True),
+        min_results=config.get('tools.web_search.adaptive.min_results', 3),
+        min_score=config.get('tools.web_search.adaptive.min_score', 0.5)
+    )
+
+
+def _build_web_fetch(context: ToolContext) -> Tool:
+    from core.tools.web_fetch import WebFetchTool, PageCache
+    config = context.config
+    page_cache = PageCache(
+        str(Path(config.cache_dir) / "web_fetch.db"),
+        max_entries=config.get('tools.web_fetch.cache_max_entries', 2000)
+    )
+    return WebFetchTool(
+        cache=page_cache,
+        max_bytes=config.get('tools.web_fetch.max_bytes', 2 * 1024 * 1024),
+        max_chars=config.get('tools.web_fetch.max_chars', 8000),
+        max_per_host=config.get('tools.web_fetch.max_per_host', 4),
+        max_age=config.get('tools.web_fetch.max_age', 0)
+    )
+
+
+def _build_shell(context: ToolContext) -> Tool:
+    from core.tools.shell import ShellTool
+    return ShellTool(context.workspace_dir, workspace_index=context.workspace_index)
+
+
+def _build_calculator(context: ToolContext) -> Tool:
+    from core.tools.calculator import CalculatorTool
+    return CalculatorTool()
+
+
+def _build_code_executor(context: ToolContext) -> Tool:
+    from core.tools.code_executor import CodeExecutorTool
+    return CodeExecutorTool()
+
+
+def builtin_tools() -> List[ToolSpec]:
+    """内置工具的静态描述（只导入轻量的工具模块，不创建实例）"""
+    from core.tools import file_manager, table_query, web_search, web_fetch, shell, calculator, code_executor
+    
+    def has_search_key(config) -> bool:
+        return config.get('tools.web_search.enabled', True) and bool(
+            config.get('tools.web_search.api_key') or os.getenv("TAVILY_API_KEY")
+        )
+    
+    def sandbox_enabled(config) -> bool:
+        return config.get('tools.code_executor.enabled', True) and config.sandbox_enabled
+    
+    return [
+        ToolSpec("file_manager", "文件读写、编辑、搜索", file_manager.FUNCTIONS, _build_file_manager,
+                 execution_specs(file_manager.FileManagerTool)),
+        ToolSpec("table_query", "查询 CSV/Excel/Parquet 表格（投影、过滤、分组、聚合），只返回结果摘要",
+                 table_query.FUNCTIONS, _build_table_query, execution_specs(table_query.TableQueryTool)),
+        ToolSpec("web_search", "搜索互联网获取最新信息", web_search.FUNCTIONS, _build_web_search,
+                 execution_specs(web_search.WebSearchTool), enabled=has_search_key),
+        ToolSpec("web_fetch", "抓取网页并提取正文", web_fetch.FUNCTIONS, _build_web_fetch,
+                 execution_specs(web_fetch.WebFetchTool)),
+        ToolSpec("shell", "执行 Shell 命令", shell.FUNCTIONS, _build_shell, execution_specs(shell.ShellTool)),
+        ToolSpec("calculator", "数学计算和实用工具", calculator.FUNCTIONS, _build_calculator,
+                 execution_specs(calculator.CalculatorTool)),
+        ToolSpec("code_executor", "执行Python代码", code_executor.FUNCTIONS, _build_code_executor,
+                 execution_specs(code_executor.CodeExecutorTool), enabled=sandbox_enabled, warm=True),
+    ]
+
+
+# ---------- 发现 ----------
+
+def _as_specs(obj: Any) -> List[ToolSpec]:
+    """入口点/配置项可以指向 ToolSpec、ToolSpec 列表，或返回它们的函数"""
+    if isinstance(obj, ToolSpec):
+        return [obj]
+    if isinstance(obj, (list, tuple)):
+        return [spec for item in obj for spec in _as_specs(item)]
+    if callable(obj):
+        return _as_specs(obj())
+    raise TypeError(f"无效的工具描述: {obj!r}")
+
+
+def _entry_point_specs() -> List[ToolSpec]:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return []
+    try:
+        eps = entry_points()
+        group = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, "select") else eps.get(ENTRY_POINT_GROUP, [])
+    except Exception as e:
+        logger.warning("读取工具入口点失败", error=str(e))
+        return []
+    
+    specs = []
+    for ep in group:
+        try:
+            specs.extend(_as_specs(ep.load()))
+        except Exception as e:
+            logger.warning("加载工具插件失败", entry_point=ep.name, error=str(e))
+    return specs
+
+
+def _config_specs(config) -> List[ToolSpec]:
+    specs = []
+    for path in config.get('tools.plugins', []) or []:
+        try:
+            specs.extend(_as_specs(load_object(path)))
+        except Exception as e:
+            logger.warning("加载工具插件失败", plugin=path, error=str(e))
+    return specs
+
+
+def discover_tools(config) -> List[ToolSpec]:
+    """
+    发现所有可用工具：内置工具 + 入口点（kortix.tools）+ 配置中的 tools.plugins
+    
+    同名工具以后发现的为准；按配置过滤掉未启用的工具。
+    """
+    specs: Dict[str, ToolSpec] = {}
+    for spec in builtin_tools() + _entry_point_specs() + _config_specs(config):
+        if spec.name in specs:
+            logger.info("工具插件覆盖同名工具", tool=spec.name)
+        specs[spec.name] = spec
+    
+    enabled = []
+    for spec in specs.values():
+        is_enabled = spec.enabled(config) if spec.enabled else config.get(f'tools.{spec.name}.enabled', True)
+        if not is_enabled:
+            continue
+        spec.warm = config.get(f'tools.{spec.name}.warm', spec.warm)
+        enabled.append(spec)
+    return enabled
@@ -1,17 +1,58 @@
-"""工具注册系统"""
-from typing import Dict, List, Any, Optional
-from core.tools.base import Tool, ToolResult
+"""工具注册系统 - 带超时、并发限制和线程/进程隔离的执行引擎"""
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeout
+import contextvars
+import multiprocessing
+import pickle
+import threading
+import time
+from core.tools.base import Tool, ToolResult, ExecutionSpec, current_cancel_event, current_process_runner
+from core.tools.validation import ArgumentValidator, ArgumentValidationError
 from core.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+def _execute_in_process(tool: Tool, function_name: str, kwargs: Dict[str, Any]) -> ToolResult:
+    """进程池中执行工具函数（工具实例随任务一起序列化）"""
+    return tool.execute(function_name, **kwargs)
+
+
 class ToolRegistry:
-    """工具注册中心"""
+    """
+    工具注册中心
+    
+    按函数的执行元数据（见 tool_function 装饰器）选择执行方式：
+    - inline: 在调用线程中直接执行，不受超时控制，只适合极快的函数
+    - thread: 在线程池中执行；超时后立即返回错误，并通过 is_cancelled() 通知函数尽快退出
+    - process: 在进程池中执行，不占用主进程 GIL；超时后改用新的进程池，
+      旧进程池中其他在途调用结束后再终止其工作进程
     
-    def __init__(self):
+    线程池中执行的函数可以通过 run_in_process() 把持有 GIL 的计算交给进程池，超时处理相同。
+    """
+    
+    def __init__(self, default_timeout: float = 120.0, max_in_flight: int = 8,
+                 thread_workers: int = 8, process_workers: int = 2):
         self.tools: Dict[str, Tool] = {}
         self._function_map: Dict[str, str] = {}  # function_name -> tool_name
+        self._specs: Dict[str, ExecutionSpec] = {}  # function_name -> 执行元数据
+        self._validators: Dict[str, ArgumentValidator] = {}  # function_name -> 参数校验器
+        self._picklable: Dict[str, bool] = {}  # tool_name -> 能否进入进程池
+        
+        self.default_timeout = default_timeout
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        
+        # 全局和按函数的在途调用限制（超时的调用在真正结束前仍占用名额）
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._function_limits: Dict[str, threading.BoundedSemaphore] = {}
+        
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._process_futures: Dict[Future, ProcessPoolExecutor] = {}  # 在途的进程池调用 -> 所在进程池
+        self._retired_pools: Dict[ProcessPoolExecutor, Set[Future]] = {}  # 待终止的进程池 -> 其中超时的调用
+        self._nested_calls: Dict[threading.Event, Future] = {}  # 线程池调用的取消事件 -> 其 run_in_process 调用
+        self._pool_lock = threading.Lock()
     
     def register(self, tool: Tool):
         """注册一个工具"""
@@ -21,13 +62,39 @@ class ToolRegistry:
         for func_def in tool.get_functions():
             func_name = func_def["name"]
             self._function_map[func_name] = tool.name
+            self._specs[func_name] = self._resolve_spec(tool, func_name)
+            self._validators[func_name] = ArgumentValidator(func_name, func_def.get("parameters"))
+            spec = self._specs[func_name]
+            if spec.max_concurrency:
+                self._function_limits[func_name] = threading.BoundedSemaphore(spec.max_concurrency)
         
         logger.info(f"注册工具", tool=tool.name, functions=len(tool.get_functions()))
     
+    @staticmethod
+    def _resolve_spec(tool: Tool, function_name: str) -> ExecutionSpec:
+        """读取函数的执行元数据"""
+        get_spec = getattr(tool, "get_execution_spec", None)
+        return get_spec(function_name) if get_spec else ExecutionSpec()
+    
+    def _can_pickle(self, tool: Tool) -> bool:
+        """工具能否进入进程池（首次使用时检查并缓存；惰性工具会在此时创建实例）"""
+        if tool.name not in self._picklable:
+            try:
+                pickle.dumps(tool)
+                self._picklable[tool.name] = True
+            except Exception as e:
+                logger.warning("工具无法序列化，改用线程池执行", tool=tool.name, error=str(e))
+                self._picklable[tool.name] = False
+        return self._picklable[tool.name]
+    
     def get_tool(self, name: str) -> Optional[Tool]:
         """获取工具"""
         return self.tools.get(name)
     
+    def get_function_tool(self, function_name: str) -> Optional[Tool]:
+        """获取函数所属的工具"""
+        return self.tools.get(self._function_map.get(function_name, ""))
+    
     def get_all_functions(self) -> List[Dict[str, Any]]:
         """获取所有工具的函数定义"""
         functions = []
@@ -35,6 +102,12 @@ class ToolRegistry:
             functions.extend(tool.get_functions())
         return functions
     
+    def get_spec(self, function_name: str) -> ExecutionSpec:
+        """获取函数的执行元数据"""
+        return self._specs.get(function_name) or ExecutionSpec()
+    
+    # ---------- 执行 ----------
+    
     def execute(self, function_name: str, **kwargs) -> ToolResult:
         """执行工具函数"""
         tool_name = self._function_map.get(function_name)
@@ -45,8 +118,202 @@ class ToolRegistry:
                 error=f"函数 {function_name} 未注册"
             )
         
+        # 参数校验在执行前完成，错误直接返回给模型
+        try:
+            kwargs, dropped = self._validators[function_name].validate(kwargs)
+        except ArgumentValidationError as e:
+            logger.warning("工具参数校验失败", function=function_name, errors=[str(err) for err in e.errors])
+            return ToolResult(success=False, output="", error=e.format())
+        if dropped:
+            logger.warning("忽略未声明的参数", function=function_name, arguments=dropped)
+        
         tool = self.tools[tool_name]
-        return tool.execute(function_name, **kwargs)
+        spec = self.get_spec(function_name)
+        timeout = spec.timeout or self.default_timeout
+        deadline = time.monotonic() + timeout
+        
+        # 申请在途名额（等待时间计入超时）
+        acquired = self._acquire(function_name, deadline)
+        if acquired is None:
+            logger.warning("工具并发已满", function=function_name)
+            return ToolResult(success=False, output="", error=f"工具 {function_name} 繁忙（并发数已满），请稍后重试")
+        
+        if spec.executor == "inline":
+            try:
+                return tool.execute(function_name, **kwargs)
+            finally:
+                self._release(acquired)
+        
+        cancel_event = threading.Event()
+        started = time.perf_counter()
+        executor = spec.executor
+        try:
+            if executor == "process" and not self._can_pickle(tool):
+                executor = "thread"
+            future = self._submit(executor, tool, function_name, kwargs, cancel_event)
+        except Exception as e:
+            self._release(acquired)
+            logger.error("工具提交失败", function=function_name, error=str(e))
+            return ToolResult(success=False, output="", error=f"执行失败: {str(e)}")
+        # 名额在任务真正结束时释放
+        future.add_done_callback(lambda _: self._release(acquired))
+        
+        try:
+            return future.result(max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            cancel_event.set()
+            if executor == "process":
+                self._abandon_process_call(future)
+            else:
+                future.cancel()
+                # 立即放弃其进程池计算，之后的调用不会排在卡住的工作进程后面
+                nested = self._nested_calls.get(cancel_event)
+                if nested is not None:
+                    self._abandon_process_call(nested)
+            logger.warning("工具执行超时", function=function_name, timeout=timeout, executor=executor)
+            return ToolResult(success=False, output="", error=f"执行超时（超过 {timeout:g} 秒），已取消")
+        except Exception as e:
+            logger.error(
+                "工具执行异常",
+                function=function_name,
+                executor=executor,
+                elapsed_ms=round((time.perf_counter() - started) * 1000),
+                error=str(e)
+            )
+            return ToolResult(success=False, output="", error=f"执行失败: {str(e)}")
+    
+    def _acquire(self, function_name: str, deadline: float) -> Optional[List[threading.BoundedSemaphore]]:
+        """按顺序获取全局和函数级名额；超时返回 None"""
+        semaphores = [self._in_flight]
+        if function_name in self._function_limits:
+            semaphores.append(self._function_limits[function_name])
+        
+        acquired = []
+        for semaphore in semaphores:
+            if not semaphore.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                self._release(acquired)
+                return None
+            acquired.append(semaphore)
+        return acquired
+    
+    @staticmethod
+    def _release(semaphores: List[threading.BoundedSemaphore]):
+        for semaphore in reversed(semaphores):
+            semaphore.release()
+    
+    def _submit(self, executor: str, tool: Tool, function_name: str, kwargs: Dict[str, Any],
+                cancel_event: threading.Event) -> Future:
+        if executor == "process":
+            return self._submit_process(_execute_in_process, (tool, function_name, kwargs))
+        
+        # 线程池任务继承调用方的上下文变量
+        context = contextvars.copy_context()
+        
+        def run() -> ToolResult:
+            current_cancel_event.set(cancel_event)
+            current_process_runner.set(lambda func, args: self._run_in_process(func, args, cancel_event))
+            return tool.execute(function_name, **kwargs)
+        
+        return self._get_thread_pool().submit(context.run, run)
+    
+    def _run_in_process(self, func: Callable, args: Tuple, cancel_event: threading.Event) -> Any:
+        """run_in_process() 的实现：等待进程池结果，调用被取消时放弃并终止执行它的工作进程"""
+        if cancel_event.is_set():
+            raise TimeoutError("工具调用已超时")
+        future = self._submit_process(func, args)
+        self._nested_calls[cancel_event] = future
+        try:
+            while True:
+                try:
+                    return future.result(timeout=0.05)
+                except FutureTimeout:
+                    if cancel_event.is_set():
+                        self._abandon_process_call(future)
+                        raise TimeoutError("工具调用已超时，进程池中的计算已终止")
+        finally:
+            self._nested_calls.pop(cancel_event, None)
+    
+    # ---------- 执行池 ----------
+    
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(self.thread_workers, thread_name_prefix="kortix-tool")
+            return self._thread_pool
+    
+    def _submit_process(self, func: Callable, args: Tuple) -> Future:
+        with self._pool_lock:
+            if self._process_pool is None:
+                # spawn：避免在持有锁的多线程进程中 fork
+                self._process_pool = ProcessPoolExecutor(
+                    self.process_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            pool = self._process_pool
+            future = pool.submit(func, *args)
+            self._process_futures[future] = pool
+        future.add_done_callback(self._process_call_done)
+        return future
+    
+    def _process_call_done(self, future: Future):
+        with self._pool_lock:
+            pool = self._process_futures.pop(future, None)
+        if pool is not None:
+            self._terminate_if_idle(pool)
+    
+    def _abandon_process_call(self, future: Future):
+        """
+        放弃超时的进程池调用
+        
+        还没开始的直接取消；已在执行的无法单独终止：之后的调用改用新的进程池，
+        旧进程池中其他在途调用结束后再终止其工作进程（不影响与超时无关的调用）。
+        """
+        if future.cancel():
+            return
+        with self._pool_lock:
+            pool = self._process_futures.get(future)
+            if pool is None:
+                return  # 已经结束
+            if self._process_pool is pool:
+                self._process_pool = None
+            self._retired_pools.setdefault(pool, set()).add(future)
+        self._terminate_if_idle(pool)
+    
+    def _terminate_if_idle(self, pool: ProcessPoolExecutor):
+        """待终止的进程池中只剩超时的调用时，终止其工作进程"""
+        with self._pool_lock:
+            stuck = self._retired_pools.get(pool)
+            if stuck is None:
+                return
+            running = [f for f, p in self._process_futures.items() if p is pool and f not in stuck]
+            if running:
+                logger.info("进程池有超时的调用，等待其他在途调用结束后终止", running=len(running))
+                return
+            del self._retired_pools[pool]
+        self._terminate_pool(pool)
+        logger.info("已终止超时调用所在的进程池")
+    
+    @staticmethod
+    def _terminate_pool(pool: ProcessPoolExecutor):
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    def shutdown(self):
+        """关闭执行池"""
+        with self._pool_lock:
+            thread_pool, self._thread_pool = self._thread_pool, None
+            process_pool, self._process_pool = self._process_pool, None
+            retired, self._retired_pools = list(self._retired_pools), {}
+        if thread_pool is not None:
+            thread_pool.shutdown(wait=False, cancel_futures=True)
+        for pool in retired:
+            self._terminate_pool(pool)
+        if process_pool is not None:
+            process_pool.shutdown(wait=True, cancel_futures=True)
     
     def list_tools(self) -> List[str]:
         """列出所有工具"""
@@ -0,0 +1,188 @@
+"""工具筛选 - 按与当前对话的相关度只发送部分函数定义，减少每次调用的 schema token"""
+from typing import Any, Dict, Iterable, List, Optional
+from dataclasses import dataclass
+import json
+import threading
+from core.tools.registry import ToolRegistry
+from core.utils.search_index import BM25Index, tokenize
+from core.utils.tokens import estimate_tokens
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class Selection:
+    """一次筛选的结果"""
+    functions: List[Dict[str, Any]]
+    full_set: bool
+    selected_tokens: int
+    total_tokens: int
+    
+    @property
+    def saved_tokens(self) -> int:
+        return self.total_tokens - self.selected_tokens
+    
+    @property
+    def names(self) -> List[str]:
+        return [func["name"] for func in self.functions]
+
+
+class ToolCatalog:
+    """
+    函数定义的检索索引（BM25 + 每个函数的 schema token 数）
+    
+    只依赖注册表中的函数定义，可以被多个会话的 ToolSelector 共享，只需建立一次。
+    """
+    
+    def __init__(self, registry: ToolRegistry):
+        self.registry = registry
+        self.index = BM25Index()
+        self.token_costs: Dict[str, int] = {}
+        self._signatures: Dict[str, str] = {}  # 函数名 -> 函数定义 JSON（用于增量更新索引）
+        self._lock = threading.Lock()
+    
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """同步注册表中的函数定义，只重建发生变化的函数"""
+        functions = {func["name"]: func for func in self.registry.get_all_functions()}
+        signatures = {name: json.dumps(func, ensure_ascii=False, sort_keys=True) for name, func in functions.items()}
+        if signatures == self._signatures:
+            return functions  # 未变化时不加锁，多个会话可以并发筛选
+        
+        with self._lock:
+            for name in list(self._signatures):
+                if name not in functions:
+                    self.index.remove(name)
+                    del self._signatures[name]
+                    del self.token_costs[name]
+            for name, func in functions.items():
+                signature = signatures[name]
+                if self._signatures.get(name) == signature:
+                    continue
+                self._signatures[name] = signature
+                self.token_costs[name] = estimate_tokens(json.dumps({"type": "function", "function": func}, ensure_ascii=False))
+                self.index.add(name, tokens=tokenize(self._document(name, func)))
+        return functions
+    
+    def _document(self, name: str, func: Dict[str, Any]) -> str:
+        """函数的检索文本：所属工具、函数名、描述、参数名及参数描述"""
+        tool = self.registry.get_function_tool(name)
+        parts = [name, func.get("description", "")]
+        if tool is not None:
+            parts.extend([tool.name, tool.description])
+        for param, schema in ((func.get("parameters") or {}).get("properties") or {}).items():
+            parts.extend([param, schema.get("description", "")])
+        return " ".join(parts)
+
+
+class ToolSelector:
+    """
+    工具筛选器
+    
+    用函数名、描述和参数说明建立本地 BM25 索引，结合最近使用情况打分：
+    - 固定发送核心函数集合和本轮已调用过的函数
+    - 其余函数按得分取前 top_k 个
+    - 没有任何函数命中时（或模型调用了未发送的函数后）退回完整集合
+    
+    索引（ToolCatalog）可以在多个会话间共享，筛选器本身只保存本会话的使用记录。
+    """
+    
+    def __init__(self, registry: ToolRegistry, top_k: int = 6, core_functions: Optional[Iterable[str]] = None,
+                 usage_boost: float = 0.5, recent_turns: int = 3, catalog: Optional[ToolCatalog] = None):
+        self.registry = registry
+        self.top_k = top_k
+        self.core_functions = list(core_functions or [])
+        self.usage_boost = usage_boost
+        self.recent_turns = recent_turns
+        
+        self.catalog = catalog or ToolCatalog(registry)
+        self._last_used: Dict[str, int] = {}  # 函数名 -> 最近使用的轮次
+        self._turn = 0
+        self._turn_full_set = False
+        
+        # 累计统计
+        self.total_saved_tokens = 0
+        self.selections = 0
+        self.misses = 0
+    
+    # ---------- 索引 ----------
+    
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """同步注册表中的函数定义（共享索引只会被重建一次）"""
+        return self.catalog.refresh()
+    
+    # ---------- 轮次和使用记录 ----------
+    
+    def start_turn(self):
+        """开始新一轮用户输入"""
+        self._turn += 1
+        self._turn_full_set = False
+    
+    def record_use(self, function_name: str, offered: Optional[List[str]] = None):
+        """
+        记录一次函数调用
+        
+        Args:
+            function_name: 被调用的函数
+            offered: 本次发送给模型的函数名；被调用的函数不在其中时视为未命中
+        """
+        self._last_used[function_name] = self._turn
+        if offered is not None and function_name not in offered:
+            self.misses += 1
+            self._turn_full_set = True
+            logger.info("工具筛选未命中，本轮改用完整函数集合", function=function_name)
+    
+    def _usage_score(self, name: str) -> float:
+        used = self._last_used.get(name)
+        if used is None:
+            return 0.0
+        age = self._turn - used
+        if age >= self.recent_turns:
+            return 0.0
+        return 1.0 / (1 + age)
+    
+    # ---------- 筛选 ----------
+    
+    def select(self, query: str) -> Selection:
+        """根据当前对话内容筛选函数"""
+        functions = self.refresh()
+        token_costs = self.catalog.token_costs
+        total_tokens = sum(token_costs.get(name, 0) for name in functions)
+        everything = Selection(list(functions.values()), True, total_tokens, total_tokens)
+        
+        if self._turn_full_set or len(functions) <= self.top_k + len(self.core_functions):
+            return everything
+        
+        lexical = self.catalog.index.scores(query)
+        best = max(lexical.values(), default=0.0)
+        used_this_turn = [name for name, turn in self._last_used.items() if turn == self._turn and name in functions]
+        if best <= 0 and not used_this_turn:
+            logger.debug("工具筛选无命中，发送完整函数集合")
+            return everything
+        
+        chosen = [name for name in self.core_functions if name in functions]
+        chosen += [name for name in used_this_turn if name not in chosen]
+        
+        ranked = []
+        for name in functions:
+            if name in chosen:
+                continue
+            score = (lexical.get(name, 0.0) / best if best else 0.0) + self.usage_boost * self._usage_score(name)
+            if score > 0:
+                ranked.append((score, name))
+        ranked.sort(reverse=True)
+        chosen += [name for _, name in ranked[:self.top_k]]
+        
+        selected = [functions[name] for name in functions if name in chosen]
+        selection = Selection(selected, False, sum(token_costs.get(name, 0) for name in chosen), total_tokens)
+        self.selections += 1
+        self.total_saved_tokens += selection.saved_tokens
+        logger.info(
+            "工具筛选",
+            selected=len(selected),
+            total=len(functions),
+            schema_tokens=selection.selected_tokens,
+            saved_tokens=selection.saved_tokens,
+            total_saved_tokens=self.total_saved_tokens
+        )
+        return selection
@@ -1,44 +1,52 @@
 """Shell 命令执行工具"""
-from typing import List
+from typing import List, Optional
 import subprocess
-from core.tools.base import Tool, ToolResult
+from core.tools.base import Tool, ToolResult, tool_function
+from core.tools.workspace_index import WorkspaceIndex
 from core.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+# 函数定义（OpenAI Function Calling 格式），注册时无需实例化工具即可读取
+FUNCTIONS = [
+    {
+        "name": "execute",
+        "description": "在workspace目录中执行Shell命令（如git、npm、pip等）",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "command": {
+                    "type": "string",
+                    "description": "要执行的命令"
+                },
+                "timeout": {
+                    "type": "integer",
+                    "description": "超时时间（秒），默认60"
+                }
+            },
+            "required": ["command"]
+        }
+    }
+]
+
+
 class ShellTool(Tool):
     """Shell 命令执行工具"""
     
-    def __init__(self, workspace_dir: str = "./workspace"):
+    def __init__(self, workspace_dir: str = "./workspace", workspace_index: Optional[WorkspaceIndex] = None):
         super().__init__("shell", "执行 Shell 命令")
         self.workspace_dir = workspace_dir
+        # 与文件管理工具共享的工作区索引（可选）
+        self.workspace_index = workspace_index
         
         # 注册函数
         self.register_function("execute", self.execute_command)
     
     def get_functions(self) -> List[dict]:
-        return [
-            {
-                "name": "execute",
-                "description": "在workspace目录中执行Shell命令（如git、npm、pip等）",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "command": {
-                            "type": "string",
-                            "description": "要执行的命令"
-                        },
-                        "timeout": {
-                            "type": "integer",
-                            "description": "超时时间（秒），默认60"
-                        }
-                    },
-                    "required": ["command"]
-                }
-            }
-        ]
+        return FUNCTIONS
     
+    @tool_function(name="execute", timeout=600)
     def execute_command(self, command: str, timeout: int = 60) -> ToolResult:
         """执行Shell命令"""
         try:
@@ -55,6 +63,11 @@ class ShellTool(Tool):
             
             output = result.stdout if result.stdout else result.stderr
             
+            # 命令可能修改了工作区，刷新共享索引并报告变更
+            changes = self._refresh_index()
+            if changes:
+                output = f"{output}\n[工作区变更]\n{changes.summary()}"
+            
             if result.returncode == 0:
                 logger.info("命令执行成功", command=command)
                 return ToolResult(success=True, output=output)
@@ -67,6 +80,7 @@ class ShellTool(Tool):
                 )
         
         except subprocess.TimeoutExpired:
+            self._refresh_index()
             logger.error("命令超时", command=command, timeout=timeout)
             return ToolResult(
                 success=False,
@@ -77,3 +91,14 @@ class ShellTool(Tool):
         except Exception as e:
             logger.error("命令执行失败", command=command, error=str(e))
             return ToolResult(success=False, output="", error=str(e))
+    
+    def _refresh_index(self):
+        """命令执行后刷新共享的工作区索引"""
+        if self.workspace_index is None:
+            return None
+        try:
+            self.workspace_index.invalidate()
+            return self.workspace_index.refresh()
+        except Exception as e:
+            logger.warning("工作区索引刷新失败", error=str(e))
+            return None
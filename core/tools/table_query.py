@@ -0,0 +1,451 @@
+"""表格查询工具 - 分块读取 CSV/Excel/Parquet，在进程内完成投影、过滤、分组和聚合"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+import os
+import threading
+from core.tools.base import Tool, ToolResult, tool_function, is_cancelled
+from core.tools.workspace_index import WorkspaceIndex
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CSV_EXTENSIONS = {".csv": ",", ".tsv": "\t"}
+EXCEL_EXTENSIONS = {".xlsx", ".xlsm", ".xls"}
+PARQUET_EXTENSIONS = {".parquet", ".pq"}
+
+FILTER_OPS = ["==", "!=", ">", ">=", "<", "<=", "in", "not_in", "contains", "isnull", "notnull"]
+AGG_FUNCS = ["count", "sum", "mean", "min", "max"]
+
+
+# 函数定义（OpenAI Function Calling 格式），注册时无需实例化工具即可读取
+FUNCTIONS = [
+    {
+        "name": "describe_table",
+        "description": "查看表格文件（CSV/TSV/Excel/Parquet）的列名、类型、行数和前几行样例",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "表格文件路径（相对于workspace）"
+                },
+                "sheet": {
+                    "type": "string",
+                    "description": "Excel 工作表名（默认第一个）"
+                }
+            },
+            "required": ["path"]
+        }
+    },
+    {
+        "name": "query_table",
+        "description": "在表格文件上执行查询（选择列、过滤、分组聚合、排序），适合对大文件求平均值、总和、计数等，不需要读取整个文件",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "表格文件路径（相对于workspace）"
+                },
+                "columns": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "要返回的列（无聚合时生效，默认全部）"
+                },
+                "filters": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "column": {"type": "string"},
+                            "op": {"type": "string", "enum": FILTER_OPS},
+                            "value": {}
+                        },
+                        "required": ["column", "op"]
+                    },
+                    "description": "过滤条件（AND 组合），如 [{\"column\": \"region\", \"op\": \"==\", \"value\": \"华东\"}]"
+                },
+                "group_by": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "分组列"
+                },
+                "aggregations": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "column": {"type": "string", "description": "列名，count 可用 '*'"},
+                            "func": {"type": "string", "enum": AGG_FUNCS}
+                        },
+                        "required": ["column", "func"]
+                    },
+                    "description": "聚合，如 [{\"column\": \"amount\", \"func\": \"mean\"}]"
+                },
+                "order_by": {
+                    "type": "string",
+                    "description": "结果排序列（聚合结果列名形如 'mean_amount'）"
+                },
+                "descending": {
+                    "type": "boolean",
+                    "description": "是否降序"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "最多返回的结果行数（默认20）"
+                },
+                "sheet": {
+                    "type": "string",
+                    "description": "Excel 工作表名（默认第一个）"
+                }
+            },
+            "required": ["path"]
+        }
+    }
+]
+
+
+class TableQueryTool(Tool):
+    """表格查询工具"""
+    
+    def __init__(self, workspace_dir: str = "./workspace", workspace_index: Optional[WorkspaceIndex] = None,
+                 chunk_size: int = 200_000, max_result_rows: int = 50):
+        super().__init__("table_query", "查询 CSV/Excel/Parquet 表格（投影、过滤、分组、聚合），只返回结果摘要")
+        
+        self.workspace_dir = Path(workspace_dir).absolute()
+        self.workspace_index = workspace_index
+        self.chunk_size = chunk_size
+        self.max_result_rows = max_result_rows
+        
+        # 表结构缓存: (路径, 大小, mtime, 工作表) -> {"columns": {...}, "sample": ..., "rows": int | None}
+        self._schema_cache: "OrderedDict[Tuple[str, int, int, str], Dict[str, Any]]" = OrderedDict()
+        self._schema_cache_size = 64
+        self._lock = threading.Lock()
+        
+        # 注册函数
+        self.register_function("describe_table", self.describe_table)
+        self.register_function("query_table", self.query_table)
+    
+    def get_functions(self) -> List[dict]:
+        return FUNCTIONS
+    
+    def _get_full_path(self, path: str) -> Path:
+        """获取完整路径"""
+        full_path = (self.workspace_dir / path).resolve()
+        # 安全检查：确保路径在workspace内
+        if not str(full_path).startswith(str(self.workspace_dir)):
+            raise ValueError("路径必须在workspace目录内")
+        return full_path
+    
+    def _file_version(self, full_path: Path) -> Tuple[str, int, int]:
+        """文件版本键（优先使用共享索引中的元数据）"""
+        if self.workspace_index is not None:
+            entry = self.workspace_index.get(full_path)
+            if entry is not None:
+                return (str(full_path), entry.size, entry.mtime_ns)
+        st = os.stat(full_path)
+        return (str(full_path), st.st_size, st.st_mtime_ns)
+    
+    # ---------- 分块读取 ----------
+    
+    @staticmethod
+    def _pandas():
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ValueError("表格查询需要安装 pandas")
+        return pd
+    
+    def _iter_chunks(self, full_path: Path, columns: Optional[List[str]] = None,
+                     sheet: Optional[str] = None, nrows: Optional[int] = None) -> Iterator[Any]:
+        """按块读取表格，只加载需要的列"""
+        pd = self._pandas()
+        suffix = full_path.suffix.lower()
+        
+        if suffix in CSV_EXTENSIONS:
+            reader = pd.read_csv(
+                full_path,
+                sep=CSV_EXTENSIONS[suffix],
+                usecols=columns,
+                chunksize=self.chunk_size if nrows is None else None,
+                nrows=nrows,
+                low_memory=False
+            )
+            if nrows is not None:
+                yield reader
+            else:
+                yield from reader
+        
+        elif suffix in PARQUET_EXTENSIONS:
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ValueError("查询 Parquet 需要安装 pyarrow")
+            # 列式格式：内存映射并按批次读取所需列
+            parquet = pq.ParquetFile(str(full_path), memory_map=True)
+            batch_size = self.chunk_size if nrows is None else nrows
+            for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+                yield batch.to_pandas()
+                if nrows is not None:
+                    break
+        
+        elif suffix in EXCEL_EXTENSIONS:
+            # Excel 不支持分块读取，整表读取所需列
+            yield pd.read_excel(full_path, sheet_name=sheet or 0, usecols=columns, nrows=nrows)
+        
+        else:
+            raise ValueError(f"不支持的表格格式: {suffix}（支持 CSV/TSV/Excel/Parquet）")
+    
+    def _get_schema(self, full_path: Path, sheet: Optional[str] = None, with_rows: bool = False) -> Dict[str, Any]:
+        """获取表结构（按文件版本缓存）"""
+        key = self._file_version(full_path) + ((sheet or ""),)
+        with self._lock:
+            schema = self._schema_cache.get(key)
+            if schema is not None:
+                self._schema_cache.move_to_end(key)
+        
+        if schema is None:
+            sample = next(self._iter_chunks(full_path, sheet=sheet, nrows=1000))
+            schema = {
+                "columns": {str(name): str(dtype) for name, dtype in sample.dtypes.items()},
+                "sample": sample.head(5),
+                "rows": None
+            }
+            with self._lock:
+                self._schema_cache[key] = schema
+                while len(self._schema_cache) > self._schema_cache_size:
+                    self._schema_cache.popitem(last=False)
+        
+        if with_rows and schema["rows"] is None:
+            first_column = next(iter(schema["columns"]), None)
+            columns = [first_column] if first_column is not None else None
+            schema["rows"] = sum(len(chunk) for chunk in self._iter_chunks(full_path, columns, sheet))
+        
+        return schema
+    
+    # ---------- 查询 ----------
+    
+    @staticmethod
+    def _apply_filters(df, filters: List[Dict[str, Any]]):
+        """应用过滤条件（AND）"""
+        if not filters:
+            return df
+        mask = None
+        for f in filters:
+            column, op, value = f["column"], f["op"], f.get("value")
+            series = df[column]
+            if op == "==":
+                cond = series == value
+            elif op == "!=":
+                cond = series != value
+            elif op == ">":
+                cond = series > value
+            elif op == ">=":
+                cond = series >= value
+            elif op == "<":
+                cond = series < value
+            elif op == "<=":
+                cond = series <= value
+            elif op == "in":
+                cond = series.isin(value if isinstance(value, list) else [value])
+            elif op == "not_in":
+                cond = ~series.isin(value if isinstance(value, list) else [value])
+            elif op == "contains":
+                cond = series.astype(str).str.contains(str(value), regex=False, na=False)
+            elif op == "isnull":
+                cond = series.isna()
+            elif op == "notnull":
+                cond = series.notna()
+            else:
+                raise ValueError(f"不支持的过滤操作: {op}")
+            mask = cond if mask is None else (mask & cond)
+        return df[mask]
+    
+    @staticmethod
+    def _validate_columns(schema: Dict[str, Any], names: List[str]):
+        unknown = [n for n in names if n != "*" and n not in schema["columns"]]
+        if unknown:
+            raise ValueError(f"列不存在: {', '.join(unknown)}；可用列: {', '.join(schema['columns'])}")
+    
+    @tool_function(timeout=120, max_concurrency=2)
+    def describe_table(self, path: str, sheet: Optional[str] = None) -> ToolResult:
+        """查看表结构"""
+        try:
+            full_path = self._get_full_path(path)
+            if not full_path.exists():
+                return ToolResult(success=False, output="", error=f"文件不存在: {path}")
+            
+            schema = self._get_schema(full_path, sheet, with_rows=True)
+            lines = [f"文件: {path}", f"行数: {schema['rows']}", "列:"]
+            lines += [f"  - {name}: {dtype}" for name, dtype in schema["columns"].items()]
+            lines += ["样例:", schema["sample"].to_string(index=False)]
+            
+            logger.info("查看表结构", path=path, rows=schema["rows"], columns=len(schema["columns"]))
+            return ToolResult(success=True, output="\n".join(lines))
+        
+        except Exception as e:
+            logger.error("查看表结构失败", path=path, error=str(e))
+            return ToolResult(success=False, output="", error=str(e))
+    
+    @tool_function(timeout=300, max_concurrency=2)
+    def query_table(
+        self,
+        path: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[List[Dict[str, Any]]] = None,
+        group_by: Optional[List[str]] = None,
+        aggregations: Optional[List[Dict[str, str]]] = None,
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        limit: int = 20,
+        sheet: Optional[str] = None
+    ) -> ToolResult:
+        """执行表格查询"""
+        try:
+            pd = self._pandas()
+            full_path = self._get_full_path(path)
+            if not full_path.exists():
+                return ToolResult(success=False, output="", error=f"文件不存在: {path}")
+            
+            filters = filters or []
+            group_by = group_by or []
+            aggregations = aggregations or []
+            limit = max(1, min(int(limit), self.max_result_rows))
+            
+            for agg in aggregations:
+                if agg["func"] not in AGG_FUNCS:
+                    raise ValueError(f"不支持的聚合函数: {agg['func']}（支持 {', '.join(AGG_FUNCS)}）")
+            
+            schema = self._get_schema(full_path, sheet)
+            agg_columns = [a["column"] for a in aggregations if a["column"] != "*"]
+            filter_columns = [f["column"] for f in filters]
+            if aggregations or group_by:
+                output_columns = group_by + agg_columns
+            else:
+                output_columns = columns or list(schema["columns"])
+            self._validate_columns(schema, output_columns + filter_columns)
+            if order_by is not None:
+                # 扫描前校验排序列：聚合查询按结果列排序，否则按表中的列排序（不输出时也要读取）
+                if aggregations or group_by:
+                    result_columns = group_by + [self._aggregate_name(a) for a in aggregations or [{"column": "*"}]]
+                    if order_by not in result_columns:
+                        raise ValueError(f"排序列不存在: {order_by}；可用列: {', '.join(result_columns)}")
+                else:
+                    self._validate_columns(schema, [order_by])
+            row_columns = output_columns
+            if order_by is not None and not (aggregations or group_by) and order_by not in output_columns:
+                row_columns = output_columns + [order_by]
+            
+            # 投影：只读取用到的列
+            needed = list(dict.fromkeys(row_columns + filter_columns))
+            if not needed:
+                needed = [next(iter(schema["columns"]))]
+            
+            scanned = 0
+            matched = 0
+            partials = []
+            head_rows = []
+            for chunk in self._iter_chunks(full_path, needed, sheet):
+                if is_cancelled():
+                    raise ValueError(f"查询已取消（已扫描 {scanned} 行）")
+                scanned += len(chunk)
+                chunk = self._apply_filters(chunk, filters)
+                matched += len(chunk)
+                if aggregations or group_by:
+                    partials.append(self._partial_aggregate(pd, chunk, group_by, aggregations))
+                elif sum(len(r) for r in head_rows) < limit and order_by is None:
+                    head_rows.append(chunk[output_columns].head(limit))
+                elif order_by is not None:
+                    # 排序需要看到所有匹配行，只保留每块的前 limit 行
+                    ordered = chunk[row_columns].sort_values(order_by, ascending=not descending)
+                    head_rows.append(ordered.head(limit))
+            
+            if not filters and schema["rows"] is None:
+                schema["rows"] = scanned
+            
+            if aggregations or group_by:
+                result = self._combine_partials(pd, partials, group_by, aggregations)
+            else:
+                result = pd.concat(head_rows) if head_rows else pd.DataFrame(columns=row_columns)
+            
+            if order_by is not None and len(result.columns):
+                result = result.sort_values(order_by, ascending=not descending)
+            if row_columns is not output_columns:
+                result = result[output_columns]
+            total_groups = len(result) if (aggregations or group_by) else matched
+            result = result.head(limit)
+            
+            lines = [
+                f"文件: {path}",
+                f"扫描行数: {scanned}，匹配行数: {matched}",
+                f"结果: {total_groups} 行" + (f"（显示前 {len(result)} 行）" if total_groups > len(result) else ""),
+                "",
+                result.to_string(index=False) if len(result) else "（无结果）"
+            ]
+            
+            logger.info("表格查询完成", path=path, scanned=scanned, matched=matched, result_rows=total_groups)
+            return ToolResult(success=True, output="\n".join(lines))
+        
+        except Exception as e:
+            logger.error("表格查询失败", path=path, error=str(e))
+            return ToolResult(success=False, output="", error=str(e))
+    
+    @staticmethod
+    def _partial_aggregate(pd, chunk, group_by: List[str], aggregations: List[Dict[str, str]]):
+        """计算一个数据块的部分聚合（sum/count/min/max 可跨块合并）"""
+        parts = {}
+        grouped = chunk.groupby(group_by, dropna=False) if group_by else None
+        for agg in aggregations:
+            column, func = agg["column"], agg["func"]
+            if column == "*":
+                count = grouped.size() if grouped is not None else len(chunk)
+                parts[("count", "*")] = count
+                continue
+            source = grouped[column] if grouped is not None else chunk[column]
+            if func in ("sum", "mean"):
+                parts[("sum", column)] = source.sum()
+            if func in ("count", "mean"):
+                parts[("count", column)] = source.count()
+            if func == "min":
+                parts[("min", column)] = source.min()
+            if func == "max":
+                parts[("max", column)] = source.max()
+        if not aggregations:
+            parts[("count", "*")] = grouped.size()
+        if grouped is not None:
+            return pd.DataFrame(parts)
+        return pd.DataFrame({key: [value] for key, value in parts.items()})
+    
+    @staticmethod
+    def _aggregate_name(agg: Dict[str, str]) -> str:
+        """聚合结果的列名"""
+        return f"{agg['func']}_{agg['column']}" if agg["column"] != "*" else "count"
+    
+    @staticmethod
+    def _combine_partials(pd, partials: List[Any], group_by: List[str], aggregations: List[Dict[str, str]]):
+        """合并各数据块的部分聚合结果"""
+        if not partials:
+            return pd.DataFrame()
+        combined = pd.concat(partials)
+        how = {key: ("sum" if key[0] in ("sum", "count") else key[0]) for key in combined.columns}
+        if group_by:
+            merged = combined.groupby(level=list(range(len(group_by))), dropna=False).agg(how)
+        else:
+            merged = combined.agg(how).to_frame().T
+        
+        result = pd.DataFrame(index=merged.index)
+        for agg in aggregations or [{"column": "*", "func": "count"}]:
+            column, func = agg["column"], agg["func"]
+            name = TableQueryTool._aggregate_name(agg)
+            if column == "*":
+                result[name] = merged[("count", "*")]
+            elif func == "mean":
+                result[name] = merged[("sum", column)] / merged[("count", column)].where(merged[("count", column)] != 0)
+            else:
+                result[name] = merged[(func, column)]
+        
+        if group_by:
+            result.index.names = group_by
+            return result.reset_index()
+        return result.reset_index(drop=True)
@@ -0,0 +1,352 @@
+"""工具参数校验 - 注册时把 JSON Schema 编译为校验函数，调用前校验并做简单类型转换"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+import json
+import math
+
+# 哨兵：表示类型转换失败
+_MISSING = object()
+
+TYPE_NAMES = {
+    "string": "字符串",
+    "integer": "整数",
+    "number": "数字",
+    "boolean": "布尔值",
+    "array": "数组",
+    "object": "对象",
+    "null": "null",
+}
+
+TRUE_STRINGS = {"true", "yes", "1", "是"}
+FALSE_STRINGS = {"false", "no", "0", "否"}
+
+
+@dataclass
+class ArgumentError:
+    """一条参数错误"""
+    path: str  # 参数路径，如 filters[0].op
+    message: str
+    
+    def __str__(self):
+        return f"{self.path}: {self.message}" if self.path else self.message
+
+
+class ArgumentValidationError(ValueError):
+    """参数校验失败"""
+    
+    def __init__(self, function_name: str, errors: List[ArgumentError]):
+        self.function_name = function_name
+        self.errors = errors
+        super().__init__(self.format())
+    
+    def format(self) -> str:
+        lines = [f"参数校验失败，函数 {self.function_name} 未执行："]
+        lines.extend(f"- {error}" for error in self.errors)
+        lines.append("请修正参数后重新调用。")
+        return "\n".join(lines)
+
+
+# 校验函数：(值, 路径, 错误列表) -> 转换后的值
+Checker = Callable[[Any, str, List[ArgumentError]], Any]
+
+
+def _describe(value: Any) -> str:
+    text = json.dumps(value, ensure_ascii=False, default=str)
+    return text if len(text) <= 60 else text[:57] + "..."
+
+
+def _join(path: str, key: str) -> str:
+    return f"{path}.{key}" if path else key
+
+
+# ---------- 标量类型转换 ----------
+
+def _to_string(value: Any) -> Any:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return _MISSING
+
+
+def _to_integer(value: Any) -> Any:
+    if isinstance(value, bool):
+        return _MISSING
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return int(text)
+        except ValueError:
+            try:
+                number = float(text)
+            except ValueError:
+                return _MISSING
+            return int(number) if number.is_integer() else _MISSING
+    return _MISSING
+
+
+def _to_number(value: Any) -> Any:
+    if isinstance(value, bool):
+        return _MISSING
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return int(text)
+        except ValueError:
+            pass
+        try:
+            number = float(text)
+        except ValueError:
+            return _MISSING
+        return number if math.isfinite(number) else _MISSING
+    return _MISSING
+
+
+def _to_boolean(value: Any) -> Any:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_STRINGS:
+            return True
+        if text in FALSE_STRINGS:
+            return False
+    return _MISSING
+
+
+def _to_null(value: Any) -> Any:
+    return None if value is None else _MISSING
+
+
+def _to_array(value: Any) -> Any:
+    if isinstance(value, list):
+        return value
+    if isinstance(value, tuple):
+        return list(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith("["):
+            try:
+                parsed = json.loads(text)
+            except ValueError:
+                return _MISSING
+            return parsed if isinstance(parsed, list) else _MISSING
+    # 单个值视为只有一个元素的数组（如 urls="https://..."）
+    if value is not None and not isinstance(value, dict):
+        return [value]
+    return _MISSING
+
+
+def _to_object(value: Any) -> Any:
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value.strip().startswith("{"):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return _MISSING
+        return parsed if isinstance(parsed, dict) else _MISSING
+    return _MISSING
+
+
+CONVERTERS = {
+    "string": _to_string,
+    "integer": _to_integer,
+    "number": _to_number,
+    "boolean": _to_boolean,
+    "null": _to_null,
+    "array": _to_array,
+    "object": _to_object,
+}
+
+
+# ---------- 编译 ----------
+
+def compile_schema(schema: Optional[Dict[str, Any]]) -> Checker:
+    """把一个 JSON Schema 节点编译为校验函数（只支持工具定义中用到的关键字）"""
+    schema = schema or {}
+    checks: List[Checker] = []
+    
+    types = schema.get("type")
+    if types is not None:
+        checks.append(_compile_type(types if isinstance(types, list) else [types]))
+    
+    if "enum" in schema:
+        checks.append(_compile_enum(list(schema["enum"])))
+    
+    if "minimum" in schema or "maximum" in schema:
+        checks.append(_compile_range(schema.get("minimum"), schema.get("maximum")))
+    
+    if "items" in schema or "minItems" in schema or "maxItems" in schema:
+        checks.append(_compile_array(schema.get("items"), schema.get("minItems"), schema.get("maxItems")))
+    
+    if "properties" in schema or "required" in schema:
+        checks.append(_compile_object(
+            schema.get("properties") or {},
+            schema.get("required") or [],
+            schema.get("additionalProperties", True)
+        ))
+    
+    def check(value: Any, path: str, errors: List[ArgumentError]) -> Any:
+        for step in checks:
+            count = len(errors)
+            value = step(value, path, errors)
+            if len(errors) > count:
+                break
+        return value
+    
+    return check
+
+
+def _compile_type(types: List[str]) -> Checker:
+    converters = [(name, CONVERTERS[name]) for name in types if name in CONVERTERS]
+    expected = " 或 ".join(TYPE_NAMES.get(name, name) for name in types)
+    
+    def check(value: Any, path: str, errors: List[ArgumentError]) -> Any:
+        # 先找不需要转换的精确匹配，再尝试转换
+        for name, convert in converters:
+            if _is_exact(name, value):
+                return value
+        for name, convert in converters:
+            converted = convert(value)
+            if converted is not _MISSING:
+                return converted
+        errors.append(ArgumentError(path, f"应为{expected}，实际为 {_describe(value)}"))
+        return value
+    
+    return check
+
+
+def _is_exact(name: str, value: Any) -> bool:
+    if name == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if name == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if name == "boolean":
+        return isinstance(value, bool)
+    if name == "string":
+        return isinstance(value, str)
+    if name == "array":
+        return isinstance(value, list)
+    if name == "object":
+        return isinstance(value, dict)
+    return value is None
+
+
+def _compile_enum(options: List[Any]) -> Checker:
+    allowed = ", ".join(_describe(option) for option in options)
+    
+    def check(value: Any, path: str, errors: List[ArgumentError]) -> Any:
+        if value in options:
+            return value
+        # 字符串大小写/空白不一致时自动修正
+        if isinstance(value, str):
+            for option in options:
+                if isinstance(option, str) and option.lower() == value.strip().lower():
+                    return option
+        errors.append(ArgumentError(path, f"取值 {_describe(value)} 无效，可选值: {allowed}"))
+        return value
+    
+    return check
+
+
+def _compile_range(minimum: Optional[float], maximum: Optional[float]) -> Checker:
+    def check(value: Any, path: str, errors: List[ArgumentError]) -> Any:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return value
+        if minimum is not None and value < minimum:
+            errors.append(ArgumentError(path, f"不能小于 {minimum}，实际为 {value}"))
+        elif maximum is not None and value > maximum:
+            errors.append(ArgumentError(path, f"不能大于 {maximum}，实际为 {value}"))
+        return value
+    
+    return check
+
+
+def _compile_array(items: Optional[Dict[str, Any]], min_items: Optional[int], max_items: Optional[int]) -> Checker:
+    item_check = compile_schema(items) if items else None
+    
+    def check(value: Any, path: str, errors: List[ArgumentError]) -> Any:
+        if not isinstance(value, list):
+            return value
+        if min_items is not None and len(value) < min_items:
+            errors.append(ArgumentError(path, f"至少需要 {min_items} 个元素，实际为 {len(value)} 个"))
+        if max_items is not None and len(value) > max_items:
+            errors.append(ArgumentError(path, f"最多 {max_items} 个元素，实际为 {len(value)} 个"))
+        if item_check is None:
+            return value
+        return [item_check(item, f"{path}[{i}]", errors) for i, item in enumerate(value)]
+    
+    return check
+
+
+def _compile_object(properties: Dict[str, Any], required: List[str], additional: Any) -> Checker:
+    property_checks = {name: compile_schema(sub) for name, sub in properties.items()}
+    required_set = list(required)
+    
+    def check(value: Any, path: str, errors: List[ArgumentError]) -> Any:
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for key, item in value.items():
+            sub_check = property_checks.get(key)
+            if sub_check is None:
+                if additional is False:
+                    errors.append(ArgumentError(_join(path, key), "未知参数"))
+                else:
+                    result[key] = item
+                continue
+            # 可选参数传 null 视为未提供
+            if item is None and key not in required_set:
+                continue
+            result[key] = sub_check(item, _join(path, key), errors)
+        for key in required_set:
+            if key not in result:
+                errors.append(ArgumentError(_join(path, key), "缺少必填参数"))
+        return result
+    
+    return check
+
+
+class ArgumentValidator:
+    """函数参数校验器（由函数定义的 parameters 编译而成）"""
+    
+    def __init__(self, function_name: str, parameters: Optional[Dict[str, Any]]):
+        self.function_name = function_name
+        parameters = dict(parameters or {"type": "object", "properties": {}})
+        # 顶层参数直接作为 Python 关键字参数传入，未声明的参数一律丢弃
+        self.known = set((parameters.get("properties") or {}).keys())
+        parameters["additionalProperties"] = True
+        self._check = compile_schema(parameters)
+    
+    def validate(self, arguments: Any) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        校验并转换参数
+        
+        Returns:
+            (转换后的参数, 被丢弃的未知参数名)
+        
+        Raises:
+            ArgumentValidationError: 参数不合法
+        """
+        if arguments is None:
+            arguments = {}
+        errors: List[ArgumentError] = []
+        if not isinstance(arguments, dict):
+            errors.append(ArgumentError("", f"参数应为 JSON 对象，实际为 {_describe(arguments)}"))
+            raise ArgumentValidationError(self.function_name, errors)
+        
+        dropped = [key for key in arguments if key not in self.known]
+        arguments = {key: value for key, value in arguments.items() if key in self.known}
+        result = self._check(arguments, "", errors)
+        if errors:
+            raise ArgumentValidationError(self.function_name, errors)
+        return result, dropped
@@ -0,0 +1,288 @@
+"""网页抓取工具 - 共享 keep-alive 连接池、流式下载、正文提取和条件缓存"""
+from typing import Any, Dict, List, Optional, Union
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from core.tools.base import Tool, ToolResult, tool_function
+from core.utils.http import get_http_pool
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (compatible; KortixCLI/2.0; +https://github.com/ForestAgentLab/kortix-cli)"
+
+# 提取正文前移除的元素
+NOISE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "nav", "header", "footer", "aside", "form"]
+
+
+@dataclass
+class FetchedPage:
+    """抓取结果"""
+    url: str
+    title: str
+    text: str
+    status: str  # fetched / not_modified / fresh
+    truncated: bool = False
+
+
+def extract_main_text(html: Union[str, bytes]) -> Dict[str, str]:
+    """
+    用 BeautifulSoup 提取网页标题和正文
+    
+    优先使用 <article>、<main> 或 role=main 的元素，否则使用 <body>。
+    """
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        raise ValueError("提取网页正文需要安装 beautifulsoup4")
+    
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+    
+    candidates = soup.find_all("article") or soup.find_all("main") or soup.find_all(attrs={"role": "main"})
+    if candidates:
+        root = max(candidates, key=lambda node: len(node.get_text(strip=True)))
+    else:
+        root = soup.body or soup
+    
+    text = root.get_text("\n")
+    lines = [re.sub(r"[ \t　\xa0]+", " ", line).strip() for line in text.splitlines()]
+    text = "\n".join(line for line in lines if line)
+    return {"title": title, "text": text}
+
+
+class PageCache:
+    """网页条件缓存（SQLite）：保存 ETag/Last-Modified 及提取后的正文"""
+    
+    def __init__(self, db_path: str, max_entries: int = 2000):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS page_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                title TEXT NOT NULL,
+                text TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+    
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, title, text, fetched_at FROM page_cache WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "title": row[2], "text": row[3], "fetched_at": row[4]}
+    
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], title: str, text: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_cache (url, etag, last_modified, title, text, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, title, text, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM page_cache WHERE url IN ("
+                "SELECT url FROM page_cache ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+    
+    def touch(self, url: str):
+        with self._lock:
+            self._conn.execute("UPDATE page_cache SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# 函数定义（OpenAI Function Calling 格式），注册时无需实例化工具即可读取
+FUNCTIONS = [
+    {
+        "name": "fetch_url",
+        "description": "抓取一个或多个网页（并发）并提取正文文本。搜索结果摘要不够时，用它阅读原文",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "urls": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "要抓取的网页 URL 列表"
+                },
+                "max_chars": {
+                    "type": "integer",
+                    "description": "每个网页返回的最大字符数（默认8000）"
+                }
+            },
+            "required": ["urls"]
+        }
+    }
+]
+
+
+class WebFetchTool(Tool):
+    """网页抓取工具"""
+    
+    def __init__(self, cache: Optional[PageCache] = None, max_bytes: int = 2 * 1024 * 1024,
+                 max_chars: int = 8000, max_per_host: int = 4, max_age: int = 0,
+                 request_timeout: float = 20.0):
+        super().__init__("web_fetch", "抓取网页并提取正文")
+        
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.max_per_host = max_per_host
+        # 缓存在 max_age 秒内视为新鲜，不发请求（0 表示总是条件请求）
+        self.max_age = max_age
+        self.request_timeout = request_timeout
+        
+        # 每个主机的并发连接限制（在共享事件循环中创建）
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        
+        # 注册函数
+        self.register_function("fetch_url", self.fetch_url)
+    
+    def get_functions(self) -> List[dict]:
+        return FUNCTIONS
+    
+    def _client(self):
+        import httpx
+        return get_http_pool().client(
+            "web_fetch",
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5"},
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            timeout=httpx.Timeout(self.request_timeout, connect=10.0)
+        )
+    
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_per_host)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+    
+    async def _fetch_one(self, url: str, max_chars: int) -> FetchedPage:
+        """抓取单个网页（流式读取，超过 max_bytes 时截断）"""
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and self.max_age and time.time() - cached["fetched_at"] < self.max_age:
+            return self._page(url, cached["title"], cached["text"], "fresh", max_chars)
+        
+        headers = {}
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        
+        client = self._client()
+        async with self._host_semaphore(url):
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached is not None:
+                    self.cache.touch(url)
+                    return self._page(url, cached["title"], cached["text"], "not_modified", max_chars)
+                response.raise_for_status()
+                
+                content_type = response.headers.get("content-type", "").lower()
+                if not any(kind in content_type for kind in ("html", "text/", "json", "xml")) and content_type:
+                    raise ValueError(f"不支持的内容类型: {content_type}")
+                
+                body = bytearray()
+                async for block in response.aiter_bytes():
+                    body.extend(block)
+                    if len(body) >= self.max_bytes:
+                        logger.info("网页超过大小上限，已截断", url=url, max_bytes=self.max_bytes)
+                        break
+                
+                etag = response.headers.get("etag")
+                last_modified = response.headers.get("last-modified")
+                encoding = response.charset_encoding
+        
+        body = bytes(body[:self.max_bytes])
+        if "html" in content_type or not content_type:
+            extracted = extract_main_text(body)
+            title, text = extracted["title"], extracted["text"]
+        else:
+            title, text = "", body.decode(encoding or "utf-8", errors="replace")
+        
+        if self.cache is not None and (etag or last_modified):
+            self.cache.put(url, etag, last_modified, title, text)
+        return self._page(url, title, text, "fetched", max_chars)
+    
+    @staticmethod
+    def _page(url: str, title: str, text: str, status: str, max_chars: int) -> FetchedPage:
+        truncated = len(text) > max_chars
+        return FetchedPage(url, title, text[:max_chars], status, truncated)
+    
+    async def _fetch_all(self, urls: List[str], max_chars: int) -> List[Any]:
+        return await asyncio.gather(*(self._fetch_one(url, max_chars) for url in urls), return_exceptions=True)
+    
+    @tool_function(timeout=90)
+    def fetch_url(self, urls: Union[List[str], str], max_chars: Optional[int] = None) -> ToolResult:
+        """并发抓取网页并提取正文"""
+        if isinstance(urls, str):
+            urls = [urls]
+        urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))
+        if not urls:
+            return ToolResult(success=False, output="", error="URL 列表为空")
+        
+        invalid = [u for u in urls if urlsplit(u).scheme not in ("http", "https")]
+        if invalid:
+            return ToolResult(success=False, output="", error=f"只支持 http/https URL: {', '.join(invalid)}")
+        
+        max_chars = max_chars or self.max_chars
+        try:
+            logger.info("抓取网页", urls=len(urls))
+            started = time.perf_counter()
+            outcomes = get_http_pool().run(self._fetch_all(urls, max_chars))
+            
+            sections, failed = [], 0
+            for url, outcome in zip(urls, outcomes):
+                if isinstance(outcome, Exception):
+                    failed += 1
+                    logger.warning("网页抓取失败", url=url, error=str(outcome))
+                    sections.append(f"## {url}\n❌ 抓取失败: {outcome}")
+                    continue
+                header = f"## {outcome.title or '无标题'}\n链接: {outcome.url}"
+                if outcome.status != "fetched":
+                    header += "（缓存）"
+                body = outcome.text or "（未提取到正文）"
+                if outcome.truncated:
+                    body += f"\n...(正文已截断，仅显示前 {max_chars} 字符)"
+                sections.append(f"{header}\n\n{body}")
+            
+            logger.info(
+                "网页抓取完成",
+                urls=len(urls),
+                failed=failed,
+                elapsed_ms=round((time.perf_counter() - started) * 1000)
+            )
+            
+            output = "\n\n".join(sections)
+            if failed == len(urls):
+                return ToolResult(success=False, output="", error=output)
+            return ToolResult(success=True, output=output)
+        
+        except Exception as e:
+            logger.error("网页抓取失败", urls=urls, error=str(e))
+            return ToolResult(success=False, output="", error=str(e))
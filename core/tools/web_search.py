@@ -1,20 +1,326 @@
 """Web 搜索工具 - 使用 Tavily API"""
-from typing import List, Optional
-from core.tools.base import Tool, ToolResult
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from core.tools.base import Tool, ToolResult, tool_function
+from core.utils.http import get_http_pool
 from core.utils.logger import get_logger
 from core.utils.config import get_config
 import os
 
 logger = get_logger(__name__)
 
+TAVILY_BASE_URL = "https://api.tavily.com"
+
+# RRF 融合排序常数
+RRF_K = 60
+
+# 归一化 URL 时丢弃的跟踪参数
+TRACKING_PARAMS = {"spm", "from", "ref", "fbclid", "gclid"}
+
+
+def normalize_url(url: str) -> str:
+    """归一化 URL 用于去重（忽略协议、大小写主机名、fragment、尾部斜杠和跟踪参数）"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not (k.lower().startswith("utm_") or k.lower() in TRACKING_PARAMS)
+    ))
+    return urlunsplit(("", host, path, query, ""))
+
+
+def merge_search_results(result_lists: List[List[Dict[str, Any]]], queries: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    合并多个查询的结果：按 URL 去重，并用倒数排名融合（RRF）排序
+    
+    Args:
+        result_lists: 每个查询的结果列表（按该查询内的排名排列）
+        queries: 与 result_lists 对应的查询词（用于标注来源）
+    
+    Returns:
+        去重并排序后的结果，每项额外包含 queries（命中的查询）和 fused_score
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    order: List[str] = []
+    for list_index, results in enumerate(result_lists):
+        query = queries[list_index] if queries else None
+        for rank, result in enumerate(results, 1):
+            url = result.get("url", "")
+            if not url:
+                continue
+            key = normalize_url(url)
+            item = merged.get(key)
+            if item is None:
+                item = dict(result)
+                item["queries"] = []
+                item["fused_score"] = 0.0
+                merged[key] = item
+                order.append(key)
+            elif len(result.get("content", "")) > len(item.get("content", "")):
+                # 保留信息量更多的摘要
+                item["content"] = result.get("content", "")
+            item["fused_score"] += 1.0 / (RRF_K + rank)
+            item["score"] = max(item.get("score") or 0.0, result.get("score") or 0.0)
+            if query is not None and query not in item["queries"]:
+                item["queries"].append(query)
+    
+    # 稳定排序：融合分数 -> 原始相关度 -> 首次出现顺序
+    position = {key: i for i, key in enumerate(order)}
+    ranked = sorted(
+        order,
+        key=lambda key: (-merged[key]["fused_score"], -(merged[key].get("score") or 0.0), position[key])
+    )
+    return [merged[key] for key in ranked]
+
+
+def normalize_query(query: str) -> str:
+    """归一化查询词：全角转半角、小写、去掉首尾及词间标点、合并空白"""
+    text = unicodedata.normalize("NFKC", query).lower()
+    tokens = []
+    for token in text.split():
+        # 保留词内及末尾的 + #（如 3.13、c++、c#），去掉其余首尾标点
+        token = re.sub(r"[^\w+#]+$", "", re.sub(r"^[^\w]+", "", token))
+        if token:
+            tokens.append(token)
+    return " ".join(tokens)
+
+
+class SearchCache:
+    """
+    搜索结果持久化缓存（SQLite）
+    
+    - 键: 归一化查询词 + topic + depth + max_results
+    - search 与 search_news 使用不同 TTL
+    - 超过 max_entries 时按最近访问时间淘汰
+    - stale_ttl > 0 时，过期不超过 stale_ttl 的结果仍会返回，并在后台刷新
+    """
+    
+    def __init__(self, db_path: str, search_ttl: int = 86400, news_ttl: int = 1800,
+                 stale_ttl: int = 3600, max_entries: int = 5000):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttls = {"general": search_ttl, "news": news_ttl}
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                results TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_accessed ON search_cache(accessed_at)")
+        self._conn.commit()
+        
+        self._revalidating = set()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0}
+    
+    @staticmethod
+    def make_key(query: str, topic: str, depth: str, max_results: int) -> str:
+        raw = json.dumps([normalize_query(query), topic, depth, int(max_results)], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    @property
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+        return (self.stats["hits"] + self.stats["stale_hits"]) / total if total else 0.0
+    
+    def get(self, query: str, topic: str, depth: str, max_results: int) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """
+        查询缓存
+        
+        Returns:
+            (结果列表, 是否已过期需要后台刷新)；未命中返回 None
+        """
+        key = self.make_key(query, topic, depth, max_results)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            age = now - row[1] if row else None
+            ttl = self.ttls.get(topic, self.ttls["general"])
+            
+            if row is None or age > ttl + self.stale_ttl:
+                self.stats["misses"] += 1
+                outcome = None
+            else:
+                stale = age > ttl
+                self.stats["stale_hits" if stale else "hits"] += 1
+                self._conn.execute("UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                outcome = (json.loads(row[0]), stale)
+        
+        logger.info(
+            "搜索缓存查询",
+            query=query,
+            topic=topic,
+            result="miss" if outcome is None else ("stale" if outcome[1] else "hit"),
+            hit_rate=round(self.hit_rate, 3),
+            **self.stats
+        )
+        return outcome
+    
+    def put(self, query: str, topic: str, depth: str, max_results: int, results: List[Dict[str, Any]]):
+        """写入缓存，并在超出容量时淘汰最久未访问的条目"""
+        key = self.make_key(query, topic, depth, max_results)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, query, topic, results, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_query(query), topic, json.dumps(results, ensure_ascii=False), now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM search_cache WHERE key IN ("
+                "SELECT key FROM search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+    
+    def revalidate(self, query: str, topic: str, depth: str, max_results: int,
+                   fetch: Callable[[], List[Dict[str, Any]]]):
+        """在后台线程中刷新一条过期缓存（同一键同时只刷新一次）"""
+        key = self.make_key(query, topic, depth, max_results)
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        
+        def _worker():
+            try:
+                self.put(query, topic, depth, max_results, fetch())
+                logger.debug("搜索缓存已后台刷新", query=query, topic=topic)
+            except Exception as e:
+                logger.warning("搜索缓存后台刷新失败", query=query, error=str(e))
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+        
+        threading.Thread(target=_worker, name="kortix-search-revalidate", daemon=True).start()
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# 函数定义（OpenAI Function Calling 格式），注册时无需实例化工具即可读取
+FUNCTIONS = [
+    {
+        "name": "search",
+        "description": "在网络上搜索信息，获取最新的资料和数据",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "搜索查询词"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "最大结果数（默认5）"
+                },
+                "depth": {
+                    "type": "string",
+                    "enum": ["auto", "basic", "advanced"],
+                    "description": "搜索深度：auto 先快速搜索、结果不理想时自动深入（默认）；需要深入调研时用 advanced"
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "search_news",
+        "description": "搜索最新新闻",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "新闻查询词"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "最大结果数（默认5）"
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "multi_search",
+        "description": "同时执行多个搜索查询（并发），合并去重并排序后一次返回。需要从多个角度调研时优先使用",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "queries": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "搜索查询词列表"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "每个查询的最大结果数（默认5）"
+                },
+                "topic": {
+                    "type": "string",
+                    "enum": ["general", "news"],
+                    "description": "搜索类型（默认general）"
+                },
+                "depth": {
+                    "type": "string",
+                    "enum": ["auto", "basic", "advanced"],
+                    "description": "搜索深度（默认auto，仅对general生效）"
+                }
+            },
+            "required": ["queries"]
+        }
+    }
+]
+
 
 class WebSearchTool(Tool):
     """Web 搜索工具（使用 Tavily）"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 max_concurrency: int = 5, request_timeout: float = 30.0,
+                 cache: Optional[SearchCache] = None, adaptive: bool = True,
+                 min_results: int = 3, min_score: float = 0.5):
         super().__init__("web_search", "网络搜索工具")
         
         self.api_key = api_key or os.getenv("TAVILY_API_KEY", "")
+        # Tavily REST 地址（multi_search 直接调用，可指向本地替身服务）
+        self.base_url = (base_url or TAVILY_BASE_URL).rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        # 搜索结果缓存（可选）
+        self.cache = cache
+        
+        # 自适应搜索深度：先 basic，结果不足或相关度偏低时升级到 advanced
+        self.adaptive = adaptive
+        self.min_results = min_results
+        self.min_score = min_score
+        self._depth_stats = {"queries": 0, "escalations": 0}
+        self._depth_lock = threading.Lock()
         
         # 只在有 API Key 时导入
         if self.api_key:
@@ -33,51 +339,40 @@ class WebSearchTool(Tool):
         # 注册函数
         self.register_function("search", self.search)
         self.register_function("search_news", self.search_news)
+        self.register_function("multi_search", self.multi_search)
     
     def get_functions(self) -> List[dict]:
-        if not self.enabled:
-            return []
-        
-        return [
-            {
-                "name": "search",
-                "description": "在网络上搜索信息，获取最新的资料和数据",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "搜索查询词"
-                        },
-                        "max_results": {
-                            "type": "integer",
-                            "description": "最大结果数（默认5）"
-                        }
-                    },
-                    "required": ["query"]
-                }
-            },
-            {
-                "name": "search_news",
-                "description": "搜索最新新闻",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "新闻查询词"
-                        },
-                        "max_results": {
-                            "type": "integer",
-                            "description": "最大结果数（默认5）"
-                        }
-                    },
-                    "required": ["query"]
-                }
-            }
-        ]
+        return FUNCTIONS if self.enabled else []
+    
+    @staticmethod
+    def _format_results(
+        results: List[Dict[str, Any]],
+        default_title: str = "无标题",
+        extra: Optional[Callable[[Dict[str, Any]], str]] = None
+    ) -> str:
+        """
+        格式化搜索结果
+        
+        Args:
+            results: 搜索结果
+            default_title: 没有标题时显示的文本
+            extra: 为每条结果追加一行（如并发搜索的来源查询）
+        """
+        formatted = []
+        for i, result in enumerate(results, 1):
+            title = result.get("title") or default_title
+            url = result.get("url", "")
+            snippet = result.get("content", "")[:200]
+            
+            item = f"{i}. **{title}**\n   {snippet}...\n   链接: {url}"
+            if extra is not None:
+                item += f"\n   {extra(result)}"
+            formatted.append(item)
+        
+        return "\n\n".join(formatted)
     
-    def search(self, query: str, max_results: int = 5) -> ToolResult:
+    @tool_function(timeout=60)
+    def search(self, query: str, max_results: int = 5, depth: str = "auto") -> ToolResult:
         """搜索网络"""
         if not self.enabled:
             return ToolResult(
@@ -89,26 +384,11 @@ class WebSearchTool(Tool):
         try:
             logger.info("执行网络搜索", query=query)
             
-            response = self.client.search(
-                query=query,
-                max_results=max_results,
-                search_depth="advanced"
-            )
-            
-            results = response.get("results", [])
+            results = self._adaptive_search(query, max_results, depth)
             if not results:
                 return ToolResult(success=True, output="未找到相关结果")
             
-            # 格式化结果
-            formatted = []
-            for i, result in enumerate(results, 1):
-                title = result.get("title", "无标题")
-                url = result.get("url", "")
-                snippet = result.get("content", "")[:200]
-                
-                formatted.append(f"{i}. **{title}**\n   {snippet}...\n   链接: {url}")
-            
-            output = "\n\n".join(formatted)
+            output = self._format_results(results)
             logger.info("搜索完成", results=len(results))
             return ToolResult(success=True, output=output)
         
@@ -116,6 +396,7 @@ class WebSearchTool(Tool):
             logger.error("搜索失败", query=query, error=str(e))
             return ToolResult(success=False, output="", error=str(e))
     
+    @tool_function(timeout=60)
     def search_news(self, query: str, max_results: int = 5) -> ToolResult:
         """搜索新闻"""
         if not self.enabled:
@@ -128,27 +409,231 @@ class WebSearchTool(Tool):
         try:
             logger.info("执行新闻搜索", query=query)
             
-            response = self.client.search(
-                query=query,
-                max_results=max_results,
-                topic="news"
-            )
-            
-            results = response.get("results", [])
+            results = self._cached_search(query, "news", "basic", max_results)
             if not results:
                 return ToolResult(success=True, output="未找到相关新闻")
             
-            formatted = []
-            for i, result in enumerate(results, 1):
-                title = result.get("title", "")
-                url = result.get("url", "")
-                snippet = result.get("content", "")[:200]
-                
-                formatted.append(f"{i}. **{title}**\n   {snippet}...\n   链接: {url}")
-            
-            output = "\n\n".join(formatted)
+            output = self._format_results(results, default_title="")
             return ToolResult(success=True, output=output)
         
         except Exception as e:
             logger.error("新闻搜索失败", query=query, error=str(e))
             return ToolResult(success=False, output="", error=str(e))
+    
+    def _fetch(self, query: str, topic: str, depth: str, max_results: int) -> List[Dict[str, Any]]:
+        """同步调用 Tavily"""
+        response = self.client.search(
+            query=query,
+            max_results=max_results,
+            search_depth=depth,
+            topic=topic
+        )
+        return response.get("results", [])
+    
+    def _cached_search(self, query: str, topic: str, depth: str, max_results: int) -> List[Dict[str, Any]]:
+        """先查缓存，未命中再调用 Tavily 并写入缓存"""
+        if self.cache is None:
+            return self._fetch(query, topic, depth, max_results)
+        
+        cached = self.cache.get(query, topic, depth, max_results)
+        if cached is not None:
+            results, stale = cached
+            if stale:
+                self.cache.revalidate(
+                    query, topic, depth, max_results,
+                    lambda: self._fetch(query, topic, depth, max_results)
+                )
+            return results
+        
+        results = self._fetch(query, topic, depth, max_results)
+        self.cache.put(query, topic, depth, max_results, results)
+        return results
+    
+    def _needs_escalation(self, results: List[Dict[str, Any]], max_results: int) -> bool:
+        """basic 结果数量不足或最高相关度低于阈值时需要升级"""
+        if len(results) < min(self.min_results, max_results):
+            return True
+        top_score = max(((r.get("score") or 0.0) for r in results), default=0.0)
+        return top_score < self.min_score
+    
+    def _record_depth(self, query: str, depth: str, escalated: Optional[bool], latency_ms: float):
+        """记录单次查询的延迟及自适应模式的累计升级率（escalated 为 None 表示显式指定深度，不计入）"""
+        with self._depth_lock:
+            if escalated is not None:
+                self._depth_stats["queries"] += 1
+                self._depth_stats["escalations"] += int(escalated)
+            queries = self._depth_stats["queries"]
+            rate = self._depth_stats["escalations"] / queries if queries else 0.0
+        logger.info(
+            "搜索深度",
+            query=query,
+            depth=depth,
+            escalated=escalated,
+            latency_ms=round(latency_ms),
+            escalation_rate=round(rate, 3)
+        )
+    
+    def _adaptive_search(self, query: str, max_results: int, depth: str = "auto") -> List[Dict[str, Any]]:
+        """按深度策略搜索：auto 时先 basic，必要时再 advanced"""
+        started = time.perf_counter()
+        if depth not in ("auto", "basic", "advanced"):
+            raise ValueError(f"无效的搜索深度: {depth}")
+        if depth == "auto" and not self.adaptive:
+            depth = "advanced"
+        
+        if depth != "auto":
+            results = self._cached_search(query, "general", depth, max_results)
+            self._record_depth(query, depth, None, (time.perf_counter() - started) * 1000)
+            return results
+        
+        results = self._cached_search(query, "general", "basic", max_results)
+        escalated = self._needs_escalation(results, max_results)
+        if escalated:
+            results = self._cached_search(query, "general", "advanced", max_results)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._record_depth(query, "advanced" if escalated else "basic", escalated, elapsed_ms)
+        return results
+    
+    async def _search_async(self, client, semaphore: asyncio.Semaphore, query: str, max_results: int,
+                            topic: str, depth: str, latencies: Dict[str, float]) -> List[Dict[str, Any]]:
+        """通过共享的异步客户端调用 Tavily REST 接口（请求耗时累加到 latencies[query]，不含排队时间）"""
+        payload = {
+            "query": query,
+            "max_results": max_results,
+            "topic": topic,
+            "search_depth": depth,
+        }
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    f"{self.base_url}/search",
+                    json=payload,
+                    headers={"Authorization": f"Bearer {self.api_key}"},
+                    timeout=self.request_timeout
+                )
+            finally:
+                latencies[query] = latencies.get(query, 0.0) + time.perf_counter() - started
+        response.raise_for_status()
+        return response.json().get("results", [])
+    
+    async def _multi_search_async(self, queries: List[str], max_results: int, topic: str, depth: str,
+                                  latencies: Dict[str, float]) -> List[Any]:
+        client = get_http_pool().client("tavily")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = [
+            self._search_async(client, semaphore, query, max_results, topic, depth, latencies)
+            for query in queries
+        ]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _multi_fetch(self, queries: List[str], max_results: int, topic: str, depth: str,
+                     latencies: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """
+        查缓存并并发请求未命中的查询，返回 {查询: 结果列表或异常}
+        
+        latencies: 每个查询各自的耗时（秒）累加到该字典（查缓存 + 请求，不含并发排队）
+        """
+        latencies = {} if latencies is None else latencies
+        outcomes: Dict[str, Any] = {}
+        if self.cache is not None:
+            for query in queries:
+                started = time.perf_counter()
+                cached = self.cache.get(query, topic, depth, max_results)
+                latencies[query] = latencies.get(query, 0.0) + time.perf_counter() - started
+                if cached is not None:
+                    outcomes[query] = cached[0]
+                    if cached[1]:
+                        self.cache.revalidate(
+                            query, topic, depth, max_results,
+                            lambda q=query: self._fetch(q, topic, depth, max_results)
+                        )
+        
+        pending = [q for q in queries if q not in outcomes]
+        if pending:
+            fetched = get_http_pool().run(self._multi_search_async(pending, max_results, topic, depth, latencies))
+            for query, outcome in zip(pending, fetched):
+                outcomes[query] = outcome
+                if self.cache is not None and not isinstance(outcome, Exception):
+                    self.cache.put(query, topic, depth, max_results, outcome)
+        return outcomes
+    
+    @tool_function(timeout=90)
+    def multi_search(self, queries: List[str], max_results: int = 5, topic: str = "general",
+                     depth: str = "auto") -> ToolResult:
+        """并发执行多个查询，合并去重后返回"""
+        if not self.enabled:
+            return ToolResult(
+                success=False,
+                output="",
+                error="Web搜索未启用。请设置 TAVILY_API_KEY 环境变量"
+            )
+        
+        # 去掉空查询和重复查询，保持顺序
+        queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+        if not queries:
+            return ToolResult(success=False, output="", error="查询列表为空")
+        
+        try:
+            logger.info("执行并发搜索", queries=len(queries), topic=topic)
+            started = time.perf_counter()
+            if depth not in ("auto", "basic", "advanced"):
+                return ToolResult(success=False, output="", error=f"无效的搜索深度: {depth}")
+            if topic == "news":
+                depth = "basic"
+            elif depth == "auto" and not self.adaptive:
+                depth = "advanced"
+            
+            if depth == "auto":
+                # 先全部 basic，再只对结果不理想的查询并发升级；延迟按查询分别统计
+                latencies: Dict[str, float] = {}
+                outcomes = self._multi_fetch(queries, max_results, topic, "basic", latencies)
+                weak = [
+                    q for q in queries
+                    if not isinstance(outcomes[q], Exception) and self._needs_escalation(outcomes[q], max_results)
+                ]
+                if weak:
+                    # 升级失败时保留 basic 结果
+                    escalated = self._multi_fetch(weak, max_results, topic, "advanced", latencies)
+                    outcomes.update({q: r for q, r in escalated.items() if not isinstance(r, Exception)})
+                for query in queries:
+                    self._record_depth(
+                        query, "advanced" if query in weak else "basic", query in weak,
+                        latencies.get(query, 0.0) * 1000
+                    )
+            else:
+                outcomes = self._multi_fetch(queries, max_results, topic, depth)
+            
+            result_lists, succeeded, failures = [], [], []
+            for query in queries:
+                outcome = outcomes[query]
+                if isinstance(outcome, Exception):
+                    failures.append(f"{query}: {outcome}")
+                    logger.warning("子查询失败", query=query, error=str(outcome))
+                else:
+                    result_lists.append(outcome)
+                    succeeded.append(query)
+            
+            if not succeeded:
+                return ToolResult(success=False, output="", error="所有查询均失败\n" + "\n".join(failures))
+            
+            merged = merge_search_results(result_lists, succeeded)
+            logger.info(
+                "并发搜索完成",
+                queries=len(queries),
+                failed=len(failures),
+                results=len(merged),
+                elapsed_ms=round((time.perf_counter() - started) * 1000)
+            )
+            
+            if not merged:
+                return ToolResult(success=True, output="未找到相关结果")
+            
+            output = self._format_results(merged, extra=lambda result: "来源查询: " + "、".join(result["queries"]))
+            if failures:
+                output += "\n\n⚠️ 部分查询失败:\n" + "\n".join(failures)
+            return ToolResult(success=True, output=output)
+        
+        except Exception as e:
+            logger.error("并发搜索失败", queries=queries, error=str(e))
+            return ToolResult(success=False, output="", error=str(e))
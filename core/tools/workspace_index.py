@@ -0,0 +1,333 @@
+"""工作区元数据索引 - 缓存路径、大小、修改时间和内容哈希"""
+from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from pathlib import Path
+import hashlib
+import os
+import threading
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class FileEntry:
+    """索引中的文件条目"""
+    path: str  # 相对 workspace 的 POSIX 路径
+    size: int
+    mtime_ns: int
+    sha256: Optional[str] = None
+
+
+@dataclass
+class IndexChanges:
+    """一次刷新检测到的变更"""
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    
+    def __bool__(self):
+        return bool(self.added or self.modified or self.removed)
+    
+    def summary(self, limit: int = 20) -> str:
+        """生成简短的变更说明"""
+        lines = []
+        for label, paths in (("新增", self.added), ("修改", self.modified), ("删除", self.removed)):
+            if paths:
+                shown = ", ".join(sorted(paths)[:limit])
+                more = f" 等 {len(paths)} 个" if len(paths) > limit else ""
+                lines.append(f"{label}: {shown}{more}")
+        return "\n".join(lines)
+
+
+class WorkspaceIndex:
+    """
+    工作区元数据索引
+    
+    - 通过比较目录 mtime 增量刷新，只重新扫描发生变化的目录
+    - 内容哈希按需计算，文件大小和 mtime 不变时复用
+    - 通过工具写入的文件应调用 update()/remove() 立即更新索引
+    - 工具之外的修改（如 Shell 命令）应调用 invalidate()，下次刷新时重新 stat 所有文件
+    """
+    
+    def __init__(self, root: Path):
+        self.root = Path(root).absolute()
+        self._files: Dict[str, FileEntry] = {}
+        self._dirs: Dict[str, int] = {}  # 相对目录路径 -> mtime_ns（根目录为 "."）
+        self._lock = threading.RLock()
+        self._scanned = False
+        self._files_stale = False
+    
+    # ---------- 路径辅助 ----------
+    
+    def _rel(self, full_path: Path) -> str:
+        rel = Path(full_path).relative_to(self.root).as_posix()
+        return rel or "."
+    
+    def _abs(self, rel: str) -> Path:
+        return self.root if rel == "." else self.root / rel
+    
+    @staticmethod
+    def _join(parent: str, name: str) -> str:
+        return name if parent == "." else f"{parent}/{name}"
+    
+    @staticmethod
+    def _is_under(rel: str, prefix: str) -> bool:
+        return prefix == "." or rel == prefix or rel.startswith(prefix + "/")
+    
+    # ---------- 刷新 ----------
+    
+    def refresh(self, full: bool = False) -> IndexChanges:
+        """
+        刷新索引
+        
+        Args:
+            full: 是否重新 stat 所有文件（检测工具之外的内容修改）
+        
+        Returns:
+            本次刷新检测到的变更
+        """
+        with self._lock:
+            changes = IndexChanges()
+            if not self._scanned:
+                self._files.clear()
+                self._dirs.clear()
+                self._scan_tree(".", changes)
+                self._scanned = True
+                self._files_stale = False
+                logger.debug("工作区索引已建立", files=len(self._files), dirs=len(self._dirs))
+                return IndexChanges()
+            
+            restat = full or self._files_stale
+            for rel_dir, old_mtime in list(self._dirs.items()):
+                if rel_dir not in self._dirs:
+                    continue  # 已随父目录一起移除
+                try:
+                    mtime = os.stat(self._abs(rel_dir)).st_mtime_ns
+                except OSError:
+                    self._drop_dir(rel_dir, changes)
+                    continue
+                if mtime != old_mtime:
+                    self._rescan_dir(rel_dir, mtime, changes)
+            
+            if restat:
+                self._restat_files(changes)
+                self._files_stale = False
+            
+            if changes:
+                logger.debug(
+                    "工作区索引已刷新",
+                    added=len(changes.added),
+                    modified=len(changes.modified),
+                    removed=len(changes.removed)
+                )
+            return changes
+    
+    def invalidate(self):
+        """标记文件内容可能在工具之外被修改"""
+        with self._lock:
+            self._files_stale = True
+    
+    def _scan_tree(self, rel_dir: str, changes: IndexChanges):
+        """完整扫描一个目录子树"""
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            try:
+                mtime = os.stat(self._abs(current)).st_mtime_ns
+                entries = list(os.scandir(self._abs(current)))
+            except OSError:
+                continue
+            self._dirs[current] = mtime
+            for entry in entries:
+                rel = self._join(current, entry.name)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(rel)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        self._files[rel] = FileEntry(rel, st.st_size, st.st_mtime_ns)
+                        changes.added.append(rel)
+                except OSError:
+                    continue
+    
+    def _rescan_dir(self, rel_dir: str, mtime: int, changes: IndexChanges):
+        """重新扫描目录的直接子项"""
+        try:
+            entries = list(os.scandir(self._abs(rel_dir)))
+        except OSError:
+            self._drop_dir(rel_dir, changes)
+            return
+        self._dirs[rel_dir] = mtime
+        
+        seen_files = set()
+        seen_dirs = set()
+        for entry in entries:
+            rel = self._join(rel_dir, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    seen_dirs.add(rel)
+                    if rel not in self._dirs:
+                        self._scan_tree(rel, changes)
+                elif entry.is_file():
+                    seen_files.add(rel)
+                    st = entry.stat()
+                    self._update_entry(rel, st.st_size, st.st_mtime_ns, changes)
+            except OSError:
+                continue
+        
+        # 移除已不存在的直接子项
+        for rel in [p for p in self._files if self._parent(p) == rel_dir and p not in seen_files]:
+            del self._files[rel]
+            changes.removed.append(rel)
+        for rel in [d for d in self._dirs if d != rel_dir and self._parent(d) == rel_dir and d not in seen_dirs]:
+            self._drop_dir(rel, changes)
+    
+    def _restat_files(self, changes: IndexChanges):
+        """重新 stat 所有已知文件"""
+        for rel in list(self._files):
+            try:
+                st = os.stat(self._abs(rel))
+            except OSError:
+                del self._files[rel]
+                changes.removed.append(rel)
+                continue
+            self._update_entry(rel, st.st_size, st.st_mtime_ns, changes)
+    
+    def _update_entry(self, rel: str, size: int, mtime_ns: int, changes: Optional[IndexChanges] = None):
+        entry = self._files.get(rel)
+        if entry is None:
+            self._files[rel] = FileEntry(rel, size, mtime_ns)
+            if changes is not None:
+                changes.added.append(rel)
+        elif entry.size != size or entry.mtime_ns != mtime_ns:
+            entry.size = size
+            entry.mtime_ns = mtime_ns
+            entry.sha256 = None
+            if changes is not None:
+                changes.modified.append(rel)
+    
+    def _drop_dir(self, rel_dir: str, changes: IndexChanges):
+        for rel in [p for p in self._files if self._is_under(p, rel_dir)]:
+            del self._files[rel]
+            changes.removed.append(rel)
+        for rel in [d for d in self._dirs if self._is_under(d, rel_dir)]:
+            del self._dirs[rel]
+    
+    @staticmethod
+    def _parent(rel: str) -> str:
+        return rel.rsplit("/", 1)[0] if "/" in rel else "."
+    
+    # ---------- 写入通知 ----------
+    
+    def update(self, full_path: Path):
+        """通知索引某个文件已被写入"""
+        with self._lock:
+            if not self._scanned:
+                return
+            rel = self._rel(full_path)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                self.remove(full_path)
+                return
+            # 确保父目录已被索引
+            parent = self._parent(rel)
+            if parent not in self._dirs:
+                self._scan_tree(parent, IndexChanges())
+            self._update_entry(rel, st.st_size, st.st_mtime_ns)
+            self._sync_dir_mtime(parent)
+    
+    def remove(self, full_path: Path):
+        """通知索引某个文件已被删除"""
+        with self._lock:
+            if not self._scanned:
+                return
+            rel = self._rel(full_path)
+            self._files.pop(rel, None)
+            self._sync_dir_mtime(self._parent(rel))
+    
+    def _sync_dir_mtime(self, rel_dir: str):
+        """
+        写入后同步目录及其上级目录的 mtime
+        
+        mtime 变化的目录立即重新扫描直接子项，而不是直接记录新的 mtime：
+        上次刷新之后工具之外在这些目录中新增或删除的文件也会被发现，不会被本次写入掩盖。
+        """
+        while True:
+            old_mtime = self._dirs.get(rel_dir)
+            try:
+                mtime = os.stat(self._abs(rel_dir)).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is not None and old_mtime is not None and mtime != old_mtime:
+                self._rescan_dir(rel_dir, mtime, IndexChanges())
+            if rel_dir == ".":
+                break
+            rel_dir = self._parent(rel_dir)
+    
+    # ---------- 查询 ----------
+    
+    def get(self, full_path: Path) -> Optional[FileEntry]:
+        """获取文件条目"""
+        self.refresh()
+        with self._lock:
+            return self._files.get(self._rel(full_path))
+    
+    def files(self, full_path: Path) -> List[FileEntry]:
+        """列出目录下（递归）的所有文件条目"""
+        self.refresh()
+        with self._lock:
+            prefix = self._rel(full_path)
+            return [e for rel, e in sorted(self._files.items()) if self._is_under(rel, prefix)]
+    
+    def list(self, full_path: Path, recursive: bool = False) -> List[str]:
+        """列出目录下的文件和子目录（相对 workspace 的路径）"""
+        self.refresh()
+        with self._lock:
+            prefix = self._rel(full_path)
+            if recursive:
+                paths = [p for p in self._files if self._is_under(p, prefix) and p != prefix]
+                paths += [d for d in self._dirs if d != prefix and self._is_under(d, prefix)]
+            else:
+                paths = [p for p in self._files if self._parent(p) == prefix]
+                paths += [d for d in self._dirs if d != "." and d != prefix and self._parent(d) == prefix]
+            return sorted(paths)
+    
+    def content_hash(self, full_path: Path) -> Optional[str]:
+        """
+        获取文件内容的 SHA-256（缓存到大小或 mtime 变化为止）
+        
+        先重新 stat 该文件：工具之外原地覆盖的文件不会改变目录 mtime，不能只依赖刷新。
+        文件不存在或不可读时返回 None。
+        """
+        self.refresh()
+        with self._lock:
+            rel = self._rel(full_path)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                return None
+            self._update_entry(rel, st.st_size, st.st_mtime_ns)
+            entry = self._files[rel]
+        return self.entry_hash(entry)
+    
+    def entry_hash(self, entry: FileEntry) -> Optional[str]:
+        """获取 files() 返回的条目的内容 SHA-256（批量处理时避免逐个文件刷新索引）"""
+        with self._lock:
+            if entry.sha256 is not None:
+                return entry.sha256
+            size, mtime_ns = entry.size, entry.mtime_ns
+        # 读文件不持有锁；期间条目被更新（大小或 mtime 变化）时不缓存旧内容的哈希
+        digest = hashlib.sha256()
+        try:
+            with open(self._abs(entry.path), 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        except OSError:
+            return None
+        sha256 = digest.hexdigest()
+        with self._lock:
+            if entry.size == size and entry.mtime_ns == mtime_ns:
+                entry.sha256 = sha256
+        return sha256
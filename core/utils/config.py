@@ -1,15 +1,14 @@
 """配置加载和管理"""
 import os
-import yaml
 from pathlib import Path
 from typing import Dict, Any, Optional
-from dotenv import load_dotenv
 
 class Config:
     """配置管理类"""
     
     def __init__(self, config_path: str = "config.yaml"):
         # 加载环境变量
+        from dotenv import load_dotenv
         load_dotenv()
         
         # 加载配置文件
@@ -24,6 +23,7 @@ class Config:
         if not self.config_path.exists():
             raise FileNotFoundError(f"配置文件不存在: {self.config_path}")
         
+        import yaml
         with open(self.config_path, 'r', encoding='utf-8') as f:
             return yaml.safe_load(f) or {}
     
@@ -107,6 +107,10 @@ class Config:
     def history_max_messages(self) -> int:
         return int(self.get('history.max_messages', 50))
     
+    @property
+    def cache_dir(self) -> str:
+        return self.get('cache.dir', './data/cache')
+    
     @property
     def log_level(self) -> str:
         return self.get('logging.level', 'INFO')
@@ -0,0 +1,96 @@
+"""共享 HTTP 连接池 - 后台事件循环 + 复用的 httpx.AsyncClient"""
+from typing import Any, Awaitable, Dict, Optional
+import asyncio
+import threading
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncHttpPool:
+    """
+    在后台线程中运行一个事件循环，并按名称复用 httpx.AsyncClient
+    
+    同步代码通过 run() 提交协程；同一名称的客户端在整个进程内共享连接（keep-alive）。
+    """
+    
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+    
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="kortix-http-pool",
+                    daemon=True
+                )
+                self._thread.start()
+                self._clients.clear()
+            return self._loop
+    
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """在后台事件循环中执行协程并等待结果"""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return future.result(timeout)
+    
+    def client(self, name: str = "default", **kwargs) -> Any:
+        """
+        获取（或创建）一个命名的共享客户端
+        
+        Args:
+            name: 客户端名称，不同用途使用不同连接池
+            **kwargs: 首次创建时传给 httpx.AsyncClient 的参数
+        """
+        self._ensure_loop()
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                import httpx
+                kwargs.setdefault("limits", httpx.Limits(max_connections=20, max_keepalive_connections=10))
+                kwargs.setdefault("timeout", httpx.Timeout(30.0, connect=10.0))
+                client = httpx.AsyncClient(**kwargs)
+                self._clients[name] = client
+                logger.debug("创建共享 HTTP 客户端", name=name)
+            return client
+    
+    def close(self):
+        """关闭所有客户端并停止事件循环"""
+        with self._lock:
+            loop, clients = self._loop, list(self._clients.values())
+            self._clients.clear()
+            self._loop = None
+        if loop is None:
+            return
+        
+        async def _close_all():
+            for client in clients:
+                try:
+                    await client.aclose()
+                except Exception:
+                    pass
+        
+        try:
+            asyncio.run_coroutine_threadsafe(_close_all(), loop).result(5)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+
+
+# 全局连接池实例
+_http_pool: Optional[AsyncHttpPool] = None
+_http_pool_lock = threading.Lock()
+
+
+def get_http_pool() -> AsyncHttpPool:
+    """获取全局 HTTP 连接池"""
+    global _http_pool
+    with _http_pool_lock:
+        if _http_pool is None:
+            _http_pool = AsyncHttpPool()
+        return _http_pool
@@ -1,11 +1,11 @@
 """日志配置"""
-import structlog
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
 def setup_logging(level: str = "INFO", log_file: Optional[str] = None):
     """配置 structlog 日志系统"""
+    import structlog
     
     # 配置标准库 logging
     logging.basicConfig(
@@ -39,6 +39,21 @@ def setup_logging(level: str = "INFO", log_file: Optional[str] = None):
         cache_logger_on_first_use=True,
     )
 
+
+class _LazyLogger:
+    """logger 代理：第一次记录日志时才导入 structlog（导入约需 50ms，不应拖慢启动）"""
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._logger = None
+    
+    def __getattr__(self, attr: str) -> Any:
+        if self._logger is None:
+            import structlog
+            self._logger = structlog.get_logger(self._name)
+        return getattr(self._logger, attr)
+
+
 def get_logger(name: str = "kortix"):
     """获取 logger 实例"""
-    return structlog.get_logger(name)
+    return _LazyLogger(name)
@@ -0,0 +1,114 @@
+"""本地词法检索 - 中英文分词 + 可增量更新的 BM25 倒排索引"""
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+from collections import Counter
+import math
+import re
+import threading
+
+# 英文/数字词；CJK 连续字符段
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:[._'-][a-z0-9]+)*|[㐀-䶿一-鿿豈-﫿]+")
+CJK_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+
+# 高频但几乎不携带信息的英文词
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "is", "are", "be",
+    "with", "by", "as", "at", "it", "this", "that", "from", "if", "not",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词：英文按单词（snake_case/点号分隔的标识符额外拆出各部分），中文按相邻二字组
+    
+    例如 "search_in_files 搜索文件" -> ["search_in_files", "search", "files", "搜索", "索文", "文件"]
+    """
+    if not text:
+        return []
+    tokens = []
+    for match in WORD_PATTERN.finditer(text.lower().replace("_", "-")):
+        word = match.group()
+        if CJK_PATTERN.match(word):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+            continue
+        parts = re.split(r"[._'-]", word)
+        if len(parts) > 1:
+            tokens.append(word.replace("-", "_"))
+        tokens.extend(part for part in parts if part and part not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    BM25 倒排索引（线程安全，支持增量添加/更新/删除文档）
+    
+    文档长度和词频按文档保存，删除或更新只影响该文档的倒排项。
+    """
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, int]] = {}  # 词 -> {文档: 词频}
+        self._doc_terms: Dict[Hashable, Counter] = {}
+        self._doc_lengths: Dict[Hashable, int] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+    
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+    
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._doc_lengths
+    
+    def add(self, doc_id: Hashable, text: str = "", tokens: Optional[Iterable[str]] = None):
+        """添加（或替换）一个文档"""
+        counts = Counter(tokens if tokens is not None else tokenize(text))
+        with self._lock:
+            if doc_id in self._doc_lengths:
+                self.remove(doc_id)
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            length = sum(counts.values())
+            self._doc_terms[doc_id] = counts
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+    
+    def remove(self, doc_id: Hashable):
+        """删除一个文档（不存在时忽略）"""
+        with self._lock:
+            counts = self._doc_terms.pop(doc_id, None)
+            if counts is None:
+                return
+            for term in counts:
+                docs = self._postings.get(term)
+                if docs is not None:
+                    docs.pop(doc_id, None)
+                    if not docs:
+                        del self._postings[term]
+            self._total_length -= self._doc_lengths.pop(doc_id)
+    
+    def scores(self, query: str = "", tokens: Optional[Iterable[str]] = None) -> Dict[Hashable, float]:
+        """计算所有命中文档的 BM25 分数"""
+        terms = set(tokens if tokens is not None else tokenize(query))
+        with self._lock:
+            total_docs = len(self._doc_lengths)
+            if not total_docs or not terms:
+                return {}
+            avg_length = self._total_length / total_docs or 1.0
+            scores: Dict[Hashable, float] = {}
+            for term in terms:
+                docs = self._postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            return scores
+    
+    def search(self, query: str = "", limit: int = 10, tokens: Optional[Iterable[str]] = None) -> List[Tuple[Hashable, float]]:
+        """返回得分最高的文档 [(文档, 分数)]"""
+        scores = self.scores(query, tokens)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
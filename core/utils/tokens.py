@@ -0,0 +1,16 @@
+"""Token 数量估算（不依赖具体模型的分词器）"""
+import re
+
+CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿豈-﫿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数
+    
+    中文字符（含全角标点）约 1 个字符 1 个 token，其余字符约 4 个字符 1 个 token。
+    """
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
@@ -6,26 +6,47 @@ Kortix CLI - 轻量级 AI Agent 命令行工具
     python run.py                 # 启动交互式对话
     python run.py --config path   # 使用自定义配置文件
     python run.py --help          # 显示帮助信息
+    python run.py serve           # 启动多会话 HTTP/WebSocket 服务器
+    python run.py daemon start    # 启动常驻守护进程
+    python run.py ask "问题"      # 通过守护进程一次性提问（瘦客户端）
+    python run.py sessions list   # 列出历史会话（search / resume 搜索、恢复）
+    python run.py batch --input prompts.jsonl --output results.jsonl  # 批量处理
 """
 
 import sys
 import os
+from datetime import datetime
+from typing import Optional
+import threading
 from pathlib import Path
 
 # 添加当前目录到 Python 路径
 sys.path.insert(0, str(Path(__file__).parent))
 
 import click
-from rich.console import Console
-from rich.markdown import Markdown
-from rich.panel import Panel
-from rich import print as rprint
-from rich.prompt import Prompt
 
-from core.agent import Agent
-from core.utils import init_config, setup_logging, get_config
+# 启动路径上只导入 click；rich、Agent（dashscope/structlog 等）在真正需要时才导入，
+# 这样 --help 和脚本化调用不必承担这些开销（见 benchmarks/startup_bench.py）
 
-console = Console()
+
+class _LazyConsole:
+    """Rich Console 代理：第一次输出时才导入 rich"""
+    
+    def __init__(self):
+        self._console = None
+    
+    def get(self):
+        """真正的 Console 实例（Live 等需要上下文管理协议的场合使用）"""
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console()
+        return self._console
+    
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+
+console = _LazyConsole()
 
 
 def print_banner():
@@ -49,6 +70,7 @@ def print_help():
 
 - `help` - 显示此帮助信息
 - `reset` - 重置对话历史
+- `tools` - 展开上一轮工具调用的完整结果
 - `save` - 保存当前对话历史
 - `exit` 或 `quit` - 退出程序
 
@@ -66,11 +88,14 @@ You: 请分析这段数据: [1, 2, 3, 4, 5]
 You: 生成一个随机密码
 ```
 """
+    from rich.markdown import Markdown
     console.print(Markdown(help_text))
 
 
 def print_status():
     """打印系统状态"""
+    from rich.markdown import Markdown
+    from core.utils import get_config
     config = get_config()
     
     status_text = f"""
@@ -83,13 +108,10 @@ def print_status():
     console.print(Markdown(status_text))
 
 
-@click.command()
-@click.option('--config', default='config.yaml', help='配置文件路径')
-@click.option('--debug', is_flag=True, help='启用调试模式')
-def main(config: str, debug: bool):
-    """Kortix AI Agent CLI - 命令行 AI 助手"""
+def init_runtime(config: str, debug: bool):
+    """加载配置并设置日志，失败时打印提示并退出"""
+    from core.utils import init_config, setup_logging, get_config
     
-    # 初始化配置
     try:
         init_config(config)
         cfg = get_config()
@@ -98,6 +120,7 @@ def main(config: str, debug: bool):
         log_level = "DEBUG" if debug else cfg.log_level
         log_file = cfg.get('logging.file_path') if cfg.get('logging.save_to_file') else None
         setup_logging(level=log_level, log_file=log_file)
+        return cfg
     
     except FileNotFoundError as e:
         console.print(f"[red]错误: {e}[/red]")
@@ -106,18 +129,62 @@ def main(config: str, debug: bool):
     except Exception as e:
         console.print(f"[red]初始化失败: {e}[/red]")
         sys.exit(1)
+
+
+@click.group(invoke_without_command=True)
+@click.option('--config', default='config.yaml', help='配置文件路径')
+@click.option('--debug', is_flag=True, help='启用调试模式')
+@click.pass_context
+def main(ctx: click.Context, config: str, debug: bool):
+    """Kortix AI Agent CLI - 命令行 AI 助手（不带子命令时进入交互式对话）"""
+    ctx.obj = {"config": config, "debug": debug}
+    if ctx.invoked_subcommand is None:
+        interactive(config, debug)
+
+
+def interactive(config: str, debug: bool, resume: bool = False, session: Optional[str] = None):
+    """
+    交互式对话
+    
+    Args:
+        resume: 是否恢复已有会话（session 为 ID 或前缀，不传时恢复最近的会话）
+    """
+    cfg = init_runtime(config, debug)
+    
+    record = None
+    if resume:
+        record = resolve_session(cfg, session)
     
     # 打印欢迎信息
     print_banner()
     print_status()
     
-    # 初始化 Agent
+    # 初始化 Agent（dashscope 导入等在后台预热，与用户输入重叠）
     try:
+        from core.agent import Agent
+        from core.catalog import attach_history, open_catalog
         agent = Agent()
+        if record is not None:
+            attach_history(agent, cfg, record["id"], resume_turns=cfg.get('history.journal.resume_turns', 20))
+            from rich.markup import escape
+            console.print(
+                f"[green]✅ 已恢复会话 {record['id']}：{escape(record['title'])}"
+                f"（{len(agent.messages) - 1} 条消息）[/green]"
+            )
+        else:
+            attach_history(agent, cfg, f"cli_{datetime.now():%Y%m%d_%H%M%S}")
+        agent.warm_up()
         console.print("[green]✅ Agent 初始化成功[/green]")
         
+        # 后台执行会话保留策略（压缩、删除旧会话）
+        catalog = open_catalog(cfg)
+        if catalog is not None:
+            threading.Thread(
+                target=apply_retention, args=(catalog, cfg), name="kortix-retention", daemon=True
+            ).start()
+        
         if cfg.sandbox_enabled:
-            console.print("[green]✅ Docker 沙箱已就绪[/green]")
+            console.print("[green]✅ Docker 沙箱后台准备中（首次执行代码时就绪）[/green]")
         
         console.print("\n[dim]输入 'help' 查看帮助，'exit' 退出[/dim]\n")
     
@@ -133,6 +200,15 @@ def main(config: str, debug: bool):
             traceback.print_exc()
         sys.exit(1)
     
+    from rich.prompt import Prompt
+    from core.render import TurnRenderer
+    
+    renderer = TurnRenderer(
+        console.get(),
+        fps=cfg.get('cli.fps', 12),
+        show_usage=cfg.get('cli.show_usage', False)
+    )
+    
     # 主循环
     try:
         while True:
@@ -169,17 +245,16 @@ def main(config: str, debug: bool):
                 print_status()
                 continue
             
+            elif user_input.lower() == 'tools':
+                renderer.render_tools()
+                continue
+            
             # 与 Agent 对话
             try:
-                console.print("\n[bold green]Agent[/bold green]: ", end='')
+                console.print("\n[bold green]Agent[/bold green]:")
                 
-                # 流式输出
-                response = ""
-                for chunk in agent.chat(user_input, stream=True):
-                    console.print(chunk, end='', style="")
-                    response += chunk
-                
-                console.print()  # 换行
+                # 按固定帧率渲染事件流（Markdown 回复 + 折叠的工具状态行）
+                renderer.render(agent.run_turn(user_input))
             
             except KeyboardInterrupt:
                 console.print("\n[yellow]⚠️ 对话已中断[/yellow]")
@@ -192,9 +267,10 @@ def main(config: str, debug: bool):
                     traceback.print_exc()
     
     finally:
-        # 保存对话历史
+        # 保存对话历史（启用对话日志时已逐条保存）
         try:
-            agent.save_history()
+            if agent.journal is None:
+                agent.save_history()
         except Exception:
             pass
         
@@ -207,5 +283,377 @@ def main(config: str, debug: bool):
         console.print("\n[dim]感谢使用 Kortix AI Agent![/dim]")
 
 
+@main.command()
+@click.option('--host', default=None, help='监听地址（默认读取 server.host）')
+@click.option('--port', default=None, type=int, help='监听端口（默认读取 server.port）')
+@click.option('--workers', default=None, type=int, help='worker 进程数（默认读取 server.workers，>1 时需要 sqlite 会话存储）')
+@click.pass_obj
+def serve(obj, host, port, workers):
+    """启动多会话 HTTP/WebSocket 服务器"""
+    cfg = init_runtime(obj["config"], obj["debug"])
+    host = host or cfg.get('server.host', '127.0.0.1')
+    port = port or cfg.get('server.port', 8765)
+    workers = workers or cfg.get('server.workers', 1)
+    
+    if workers > 1 and cfg.get('server.store.backend', 'memory') == 'memory':
+        console.print("[red]错误: 多 worker 模式需要共享会话存储，请设置 server.store.backend: sqlite[/red]")
+        sys.exit(1)
+    
+    def build_server():
+        from core.server import AgentServer
+        from core.session_store import open_session_store
+        return AgentServer(
+            max_sessions=cfg.get('server.max_sessions', 32),
+            idle_timeout=cfg.get('server.idle_timeout', 1800),
+            token=cfg.get('server.token'),
+            store=open_session_store(cfg),
+            lease_ttl=cfg.get('server.store.lease_ttl', 60)
+        )
+    
+    if workers <= 1:
+        try:
+            server = build_server()
+        except Exception as e:
+            console.print(f"[red]服务器初始化失败: {e}[/red]")
+            sys.exit(1)
+        console.print(f"[green]✅ 服务器监听 http://{host}:{port}[/green]")
+        server.run(host, port)
+        return
+    
+    # 多 worker：主进程预先导入依赖（fork 后写时复制共享），再监听端口并 fork
+    from core.llm import load_dashscope
+    from core.prefork import bind_listener, serve_prefork
+    import core.server  # noqa: F401
+    load_dashscope()
+    
+    sock = bind_listener(host, port)
+    console.print(f"[green]✅ 服务器监听 http://{host}:{port}（{workers} 个 worker）[/green]")
+    serve_prefork(lambda listener: build_server().run(sock=listener), sock, workers)
+
+
+@main.command()
+@click.option('--input', 'input_path', required=True, type=click.Path(exists=True, dir_okay=False), help='提示词文件（JSONL，每行 {"id": ..., "prompt": ...}）')
+@click.option('--output', 'output_path', required=True, type=click.Path(dir_okay=False), help='结果文件（JSONL，逐条追加；重新运行时跳过已成功的条目）')
+@click.option('--concurrency', default=None, type=int, help='并发数（默认读取 batch.concurrency）')
+@click.option('--retries', default=None, type=int, help='失败重试次数（默认读取 batch.retries）')
+@click.pass_obj
+def batch(obj, input_path, output_path, concurrency, retries):
+    """并发处理 JSONL 文件中的提示词，每行一个独立会话"""
+    import json
+    
+    cfg = init_runtime(obj["config"], obj["debug"])
+    
+    try:
+        from core.batch import BatchRunner, read_items
+        from core.factory import AgentFactory
+        items = read_items(input_path)
+        factory = AgentFactory()
+    except ValueError as e:
+        console.print(f"[red]错误: {e}[/red]")
+        sys.exit(1)
+    except Exception as e:
+        console.print(f"[red]Agent 初始化失败: {e}[/red]")
+        sys.exit(1)
+    
+    factory.warm_up()
+    runner = BatchRunner(
+        factory,
+        concurrency=concurrency or cfg.get('batch.concurrency', 4),
+        retries=cfg.get('batch.retries', 2) if retries is None else retries,
+        retry_backoff=cfg.get('batch.retry_backoff', 2.0)
+    )
+    
+    def on_result(result, done, total):
+        mark = "[green]✓[/green]" if result.status == "ok" else f"[red]✗ {result.error}[/red]"
+        console.print(f"[dim][{done}/{total}][/dim] {result.id} {result.elapsed_ms}ms {mark}")
+    
+    try:
+        summary = runner.run(items, output_path, on_result=on_result)
+    finally:
+        factory.close()
+    
+    summary_path = f"{output_path}.summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    
+    latency, tokens = summary["latency_ms"], summary["tokens"]
+    console.print(
+        f"\n共 {summary['total']} 条：成功 {summary['ok']}，失败 {summary['failed']}，"
+        f"跳过（已完成）{summary['skipped']}"
+    )
+    console.print(
+        f"耗时 {summary['wall_seconds']}s（{summary['items_per_second']} 条/秒），"
+        f"延迟 p50 {latency['p50']}ms / p95 {latency['p95']}ms，"
+        f"token 输入 {tokens['input']} / 输出 {tokens['output']}"
+    )
+    console.print(f"[dim]结果: {output_path}  汇总: {summary_path}[/dim]")
+    
+    if summary["interrupted"]:
+        console.print("[yellow]⚠️ 已中断，重新运行同一命令即可从断点继续[/yellow]")
+        sys.exit(130)
+    if summary["failed"]:
+        console.print("[yellow]部分条目失败，重新运行同一命令会只重试失败的条目[/yellow]")
+        sys.exit(1)
+
+
+# ---------- 会话目录 ----------
+
+def resolve_session(cfg, session: Optional[str]):
+    """按 ID 或前缀查找会话（不传时为最近的会话），找不到时退出"""
+    from core.catalog import open_catalog
+    
+    catalog = open_catalog(cfg)
+    if catalog is None:
+        console.print("[red]错误: 会话目录未启用（history.catalog.enabled）[/red]")
+        sys.exit(1)
+    try:
+        record = catalog.resolve(session)
+    except ValueError as e:
+        console.print(f"[red]错误: {e}[/red]")
+        sys.exit(1)
+    if record is None:
+        console.print(f"[red]错误: 找不到会话 {session or ''}[/red]")
+        sys.exit(1)
+    return record
+
+
+def apply_retention(catalog, cfg) -> dict:
+    """按 history.catalog.retention 配置压缩、删除旧会话（及其长期记忆）"""
+    from core.memory import open_memory
+    
+    try:
+        result = catalog.apply_retention(
+            compress_after_days=cfg.get('history.catalog.retention.compress_after_days', 7),
+            delete_after_days=cfg.get('history.catalog.retention.delete_after_days', 180),
+            max_sessions=cfg.get('history.catalog.retention.max_sessions', 0)
+        )
+        memory = open_memory(cfg)
+        if memory is not None and result["deleted"]:
+            memory.prune()
+        return result
+    except Exception as e:
+        console.print(f"[yellow]会话保留策略执行失败: {e}[/yellow]")
+        return {"compressed": 0, "deleted": 0}
+
+
+def format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+
+@main.group()
+def sessions():
+    """列出、搜索、恢复历史会话"""
+
+
+@sessions.command('list')
+@click.option('--limit', default=20, help='显示的会话数')
+@click.pass_obj
+def sessions_list(obj, limit):
+    """按最近更新时间列出会话"""
+    from rich.markup import escape
+    from rich.table import Table
+    from core.catalog import open_catalog
+    
+    cfg = init_runtime(obj["config"], obj["debug"])
+    catalog = open_catalog(cfg)
+    records = catalog.list(limit=limit) if catalog is not None else []
+    if not records:
+        console.print("[dim]没有会话记录[/dim]")
+        return
+    
+    table = Table(box=None, header_style="bold")
+    for column in ("ID", "标题", "更新时间", "轮数", "tokens", "工具"):
+        table.add_column(column)
+    for record in records:
+        tools = ", ".join(f"{name}×{count}" for name, count in
+                          sorted(record["tools"].items(), key=lambda item: -item[1])[:3])
+        table.add_row(
+            record["id"],
+            escape(record["title"]),
+            format_time(record["updated_at"]),
+            str(record["turns"]),
+            str(record["input_tokens"] + record["output_tokens"]),
+            tools
+        )
+    console.print(table)
+
+
+@sessions.command('search')
+@click.argument('query', nargs=-1, required=True)
+@click.option('--limit', default=10, help='最多显示的会话数')
+@click.pass_obj
+def sessions_search(obj, query, limit):
+    """全文搜索会话内容"""
+    from rich.markup import escape
+    from core.catalog import open_catalog
+    
+    cfg = init_runtime(obj["config"], obj["debug"])
+    catalog = open_catalog(cfg)
+    results = catalog.search(" ".join(query), limit=limit) if catalog is not None else []
+    if not results:
+        console.print("[dim]没有匹配的会话[/dim]")
+        return
+    for result in results:
+        console.print(
+            f"[bold cyan]{result['id']}[/bold cyan]  {escape(result['title'])}  "
+            f"[dim]{format_time(result['updated_at'])} · {result['hits']} 处命中[/dim]"
+        )
+        console.print(f"    [dim]{result['role']}:[/dim] {escape(result['snippet'])}", highlight=False)
+
+
+@sessions.command('resume')
+@click.argument('session', required=False)
+@click.pass_obj
+def sessions_resume(obj, session):
+    """恢复会话继续对话（SESSION 为 ID 或唯一前缀，省略时恢复最近的会话）"""
+    interactive(obj["config"], obj["debug"], resume=True, session=session)
+
+
+@sessions.command('prune')
+@click.pass_obj
+def sessions_prune(obj):
+    """立即执行保留策略（history.catalog.retention）"""
+    from core.catalog import open_catalog
+    
+    cfg = init_runtime(obj["config"], obj["debug"])
+    catalog = open_catalog(cfg)
+    if catalog is None:
+        console.print("[dim]会话目录未启用[/dim]")
+        return
+    result = apply_retention(catalog, cfg)
+    console.print(f"压缩 {result['compressed']} 个会话，删除 {result['deleted']} 个会话")
+
+
+@sessions.command('import')
+@click.option('--dir', 'directory', default=None, help='旧版 conversation_*.json 所在目录（默认 history.file_path）')
+@click.pass_obj
+def sessions_import(obj, directory):
+    """把旧版对话历史文件导入会话目录（之后可搜索和恢复）"""
+    from core.catalog import import_history_files, open_catalog
+    from core.memory import open_memory
+    
+    cfg = init_runtime(obj["config"], obj["debug"])
+    catalog = open_catalog(cfg)
+    if catalog is None:
+        console.print("[dim]会话目录未启用[/dim]")
+        return
+    count = import_history_files(catalog, cfg, directory or cfg.history_file_path, memory=open_memory(cfg))
+    console.print(f"导入 {count} 个会话")
+
+
+# ---------- 守护进程与瘦客户端 ----------
+
+@main.group()
+def daemon():
+    """常驻守护进程：保持 Agent、连接池和沙箱常驻，供 ask 命令复用"""
+
+
+@daemon.command('start')
+@click.option('--socket', 'socket_path', default=None, help='Unix 套接字路径（默认 $KORTIX_SOCKET 或 ./data/kortix.sock）')
+@click.pass_obj
+def daemon_start(obj, socket_path):
+    """在前台启动守护进程（Ctrl+C 或 daemon stop 停止）"""
+    from core.client import default_socket_path
+    
+    cfg = init_runtime(obj["config"], obj["debug"])
+    socket_path = socket_path or default_socket_path()
+    
+    try:
+        from core.daemon import AgentDaemon
+        server = AgentDaemon(
+            socket_path,
+            max_sessions=cfg.get('daemon.max_sessions', 16),
+            idle_timeout=cfg.get('daemon.idle_timeout', 1800)
+        )
+    except Exception as e:
+        console.print(f"[red]守护进程初始化失败: {e}[/red]")
+        sys.exit(1)
+    
+    console.print(f"[green]✅ 守护进程监听 {socket_path}（pid {os.getpid()}）[/green]")
+    try:
+        server.serve_forever()
+    except Exception as e:
+        console.print(f"[red]错误: {e}[/red]")
+        sys.exit(1)
+
+
+@daemon.command('stop')
+@click.option('--socket', 'socket_path', default=None, help='Unix 套接字路径')
+def daemon_stop(socket_path):
+    """停止守护进程（会话历史会先保存）"""
+    from core.client import DaemonClient, DaemonNotRunning
+    
+    try:
+        DaemonClient(socket_path).shutdown()
+        click.echo("守护进程已停止")
+    except DaemonNotRunning as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+
+
+@daemon.command('status')
+@click.option('--socket', 'socket_path', default=None, help='Unix 套接字路径')
+def daemon_status(socket_path):
+    """查看守护进程状态"""
+    from core.client import DaemonClient, DaemonNotRunning
+    
+    try:
+        status = DaemonClient(socket_path).status()
+    except DaemonNotRunning as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+    
+    click.echo(f"pid: {status['pid']}  运行时间: {status['uptime_seconds']}s  工具: {', '.join(status['tools'])}")
+    for session in status['sessions']:
+        state = "忙碌" if session['busy'] else f"空闲 {session['idle_seconds']}s"
+        click.echo(f"  {session['id']}: {session['messages']} 条消息，{state}")
+
+
+@main.command()
+@click.argument('message', nargs=-1)
+@click.option('--session', default='default', help='会话名（同名会话共享对话历史）')
+@click.option('--socket', 'socket_path', default=None, help='Unix 套接字路径')
+@click.option('--reset', is_flag=True, help='提问前清空该会话的历史')
+@click.option('--autostart', is_flag=True, help='守护进程未运行时在后台启动它')
+@click.option('--output', 'output_format', type=click.Choice(['text', 'jsonl']), default='text',
+              help='输出格式：text 为回复文本，jsonl 为每行一个类型化事件（见 core/events.py）')
+@click.pass_obj
+def ask(obj, message, session, socket_path, reset, autostart, output_format):
+    """通过守护进程提问并流式输出回复（MESSAGE 省略时读取标准输入）"""
+    import json
+    from core.client import DaemonClient, DaemonError, DaemonNotRunning, default_socket_path, spawn_daemon
+    
+    text = " ".join(message) if message else sys.stdin.read()
+    if not text.strip():
+        click.echo("错误: 消息为空", err=True)
+        sys.exit(2)
+    
+    socket_path = socket_path or default_socket_path()
+    client = DaemonClient(socket_path)
+    try:
+        if autostart and not client.ping():
+            argv = [__file__, '--config', obj["config"], 'daemon', 'start', '--socket', socket_path]
+            client = spawn_daemon(argv, socket_path)
+        if reset:
+            client.reset(session)
+        if output_format == 'jsonl':
+            for event in client.chat_events(text, session=session):
+                sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+                sys.stdout.flush()
+        else:
+            for chunk in client.chat(text, session=session):
+                sys.stdout.write(chunk)
+                sys.stdout.flush()
+            sys.stdout.write("\n")
+    except DaemonNotRunning as e:
+        click.echo(f"{e}（先运行 python run.py daemon start，或加 --autostart）", err=True)
+        sys.exit(1)
+    except DaemonError as e:
+        click.echo(f"\n错误: {e}", err=True)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
 if __name__ == "__main__":
     main()